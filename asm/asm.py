@@ -14,113 +14,28 @@
 #  DB 12   ; a decimal byte
 #  DB 0b0001 ; a binary byte
 
+import os
 import sys
 import re
 
-# Opcodes
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from ls8.cpu__constants import ProcessorConstants    # noqa: E402
+from ls8.cpu__masks import ProcessorMasks    # noqa: E402
+from ls8.cpu__operations import ProcessorOperations    # noqa: E402
+from ls8.sourcemap import format_source_map, source_map_path    # noqa: E402
+
+# Opcodes, generated from the same table the CPU dispatches on.
+# "type" is the number of register operands, or 8 for LDI (register, immediate).
+CONSTANTS = ProcessorConstants(8)
+OPERATIONS = ProcessorOperations(CONSTANTS, ProcessorMasks(CONSTANTS))
+
 OPCODES = {
-    "ADD": {
-        "type": 2, "code": "10100000"
-    },
-    "AND": {
-        "type": 2, "code": "10101000"
-    },
-    "CALL": {
-        "type": 1, "code": "01010000"
-    },
-    "CMP": {
-        "type": 2, "code": "10100111"
-    },
-    "DEC": {
-        "type": 1, "code": "01100110"
-    },
-    "DIV": {
-        "type": 2, "code": "10100011"
-    },
-    "HLT": {
-        "type": 0, "code": "00000001"
-    },
-    "INC": {
-        "type": 1, "code": "01100101"
-    },
-    "INT": {
-        "type": 1, "code": "01010010"
-    },
-    "IRET": {
-        "type": 0, "code": "00010011"
-    },
-    "JEQ": {
-        "type": 1, "code": "01010101"
-    },
-    "JGE": {
-        "type": 1, "code": "01011010"
-    },
-    "JGT": {
-        "type": 1, "code": "01010111"
-    },
-    "JLE": {
-        "type": 1, "code": "01011001"
-    },
-    "JLT": {
-        "type": 1, "code": "01011000"
-    },
-    "JMP": {
-        "type": 1, "code": "01010100"
-    },
-    "JNE": {
-        "type": 1, "code": "01010110"
-    },
-    "LD": {
-        "type": 2, "code": "10000011"
-    },
-    "LDI": {
-        "type": 8, "code": "10000010"
-    },
-    "MOD": {
-        "type": 2, "code": "10100100"
-    },
-    "MUL": {
-        "type": 2, "code": "10100010"
-    },
-    "NOP": {
-        "type": 0, "code": "00000000"
-    },
-    "NOT": {
-        "type": 1, "code": "01101001"
-    },
-    "OR": {
-        "type": 2, "code": "10101010"
-    },
-    "POP": {
-        "type": 1, "code": "01000110"
-    },
-    "PRA": {
-        "type": 1, "code": "01001000"
-    },
-    "PRN": {
-        "type": 1, "code": "01000111"
-    },
-    "PUSH": {
-        "type": 1, "code": "01000101"
-    },
-    "RET": {
-        "type": 0, "code": "00010001"
-    },
-    "SHL": {
-        "type": 2, "code": "10101100"
-    },
-    "SHR": {
-        "type": 2, "code": "10101101"
-    },
-    "ST": {
-        "type": 2, "code": "10000100"
-    },
-    "SUB": {
-        "type": 2, "code": "10100001"
-    },
-    "XOR": {
-        "type": 2, "code": "10101011"
-    },
+    OPERATIONS.CODE_NAME[code]: {
+        "type": 8 if OPERATIONS.CODE_NAME[code] == "LDI" else OPERATIONS.ARGS[code],
+        "code": "{:08b}".format(code),
+    }
+    for code in OPERATIONS
 }
 
 # Regex for matching lines
@@ -134,9 +49,27 @@ REGEX_DB = r"(?:(\w+?):)?\s*DB\s*(.+)"    # insensitive
 
 def parse_commandline(argv):
     """
-    Usage: asm.py [inputfile] [outputfile]
+    Usage: asm.py [--wide] [--map mapfile] [inputfile] [outputfile]
+
+    The source map goes next to the output file (`outputfile.map`), unless
+    `--map` puts it elsewhere; with output to stdout, only `--map` writes one.
     """
 
+    width = 8
+    mapfile = None
+
+    if "--wide" in argv:
+        argv = [arg for arg in argv if arg != "--wide"]
+        width = 16
+
+    if "--map" in argv:
+        index = argv.index("--map")
+        if index + 1 >= len(argv):
+            print("asm.py: --map needs a file name", file=sys.stderr)
+            sys.exit(1)
+        mapfile = argv[index + 1]
+        argv = argv[:index] + argv[(index + 2):]
+
     if len(argv) == 1:
         inputfile = "-"
         outputfile = "-"
@@ -150,10 +83,13 @@ def parse_commandline(argv):
         outputfile = argv[2]
 
     else:
-        print("usage: asm.py [infile.asm] [outfile.ls8]", file=sys.stderr)
+        print("usage: asm.py [--wide] [--map outfile.ls8.map] [infile.asm] [outfile.ls8]", file=sys.stderr)
         sys.exit(1)
 
-    return inputfile, outputfile
+    if mapfile is None and outputfile != "-":
+        mapfile = source_map_path(outputfile)
+
+    return inputfile, outputfile, width, mapfile
 
 
 def open_files(inputfile, outputfile):
@@ -191,20 +127,24 @@ def normalize_line(groups):
     return result
 
 
-def p8(v):
-    return "{:08b}".format(v)
+def pw(v, width=8):
+    """Format `v` as a `width`-bit word, e.g. 8 for LS-8 or 16 for wide mode"""
+    return "{:0{}b}".format(v, width)
 
 
-def pass1(inputfile, sym, code):
+def pass1(inputfile, sym, code, width=8, lines=None):
     """
     Pass 1
 
     * Read the source code lines
     * Parse labels, opcodes, and operands
     * Record label offsets
-    * Emit machine code
+    * Emit machine code (as `width`-bit words)
+    * Record the first address of each line that emits words, in `lines`
     """
 
+    word_mask = (1 << width) - 1
+
     # Source line number
     line_num = 0
 
@@ -232,7 +172,7 @@ def pass1(inputfile, sym, code):
 
         nonlocal addr
 
-        code.append(f"{machine_code} # {opcode}")
+        code.append(f"{pw(int(machine_code, 2), width)} # {opcode}")
         addr += 1
 
     def out1(opcode, op_a, op_b, machine_code):
@@ -241,8 +181,8 @@ def pass1(inputfile, sym, code):
         nonlocal addr
 
         reg_a = get_reg(op_a)
-        code.append(f"{machine_code} # {opcode} {op_a}")
-        code.append(p8(reg_a))
+        code.append(f"{pw(int(machine_code, 2), width)} # {opcode} {op_a}")
+        code.append(pw(reg_a, width))
         addr += 2
 
     def out2(opcode, op_a, op_b, machine_code):
@@ -253,9 +193,9 @@ def pass1(inputfile, sym, code):
         reg_a = get_reg(op_a)
         reg_b = get_reg(op_b)
 
-        code.append(f"{machine_code} # {opcode} {op_a},{op_b}")
-        code.append(p8(reg_a))
-        code.append(p8(reg_b))
+        code.append(f"{pw(int(machine_code, 2), width)} # {opcode} {op_a},{op_b}")
+        code.append(pw(reg_a, width))
+        code.append(pw(reg_b, width))
 
         addr += 3
 
@@ -267,15 +207,16 @@ def pass1(inputfile, sym, code):
         reg_a = get_reg(op_a)
 
         try:
-            val_b = int(op_b, 0)
-            out_b = p8(val_b)
+            # Force to word size
+            val_b = int(op_b, 0) & word_mask
+            out_b = pw(val_b, width)
 
         except ValueError:
             # If it's not a value, it might be a symbol
             out_b = f"sym:{op_b}"
 
-        code.append(f"{machine_code} # {opcode} {op_a},{op_b}")
-        code.append(p8(reg_a))
+        code.append(f"{pw(int(machine_code, 2), width)} # {opcode} {op_a},{op_b}")
+        code.append(pw(reg_a, width))
         code.append(out_b)
 
         addr += 3
@@ -301,7 +242,7 @@ def pass1(inputfile, sym, code):
             if print_char == " ":
                 print_char = "[space]"
 
-            code.append(f"{p8(ord(data[i]))} # {print_char}")
+            code.append(f"{pw(ord(data[i]) & word_mask, width)} # {print_char}")
 
         addr += len(data)
 
@@ -327,10 +268,10 @@ def pass1(inputfile, sym, code):
             print(f"line {line_num}: invalid integer argument to DB", file=sys.stderr)
             sys.exit(2)
 
-        # Force to byte size
-        val &= 0xFF
+        # Force to word size
+        val &= word_mask
 
-        code.append(f"{p8(val)} # {data}")
+        code.append(f"{pw(val, width)} # {data}")
 
         addr += 1
 
@@ -408,6 +349,8 @@ def pass1(inputfile, sym, code):
                 code.append(f"# {label} (address {addr}):")
 
             if opcode is not None:
+                start_addr = addr
+
                 if opcode == "DS":
                     handle_ds(line)
                 elif opcode == "DB":
@@ -420,12 +363,15 @@ def pass1(inputfile, sym, code):
                     op_info = OPCODES[opcode]
                     handler = type_f[op_info["type"]]
                     handler(opcode, op_a, op_b, op_info["code"])
+
+                if lines is not None and addr > start_addr:
+                    lines.append((start_addr, line_num))
         else:
             print(f"No match: {input}", file=sys.stderr)
             sys.exit(3)
 
 
-def pass2(outputfile, sym, code):
+def pass2(outputfile, sym, code, width=8):
     """
     Output the code, substituting in any symbols.
     """
@@ -436,7 +382,7 @@ def pass2(outputfile, sym, code):
             s = c[4:].strip()
 
             if s in sym:
-                c = p8(sym[s])
+                c = pw(sym[s], width)
 
             else:
                 print(f"unknown symbol: {s}", file=sys.stderr)
@@ -445,9 +391,20 @@ def pass2(outputfile, sym, code):
         outputfile.write(f"{c}\n")
 
 
+def write_map(mapfile, source, sym, lines, size, width=8):
+    """
+    Write the source map: the source line of each address, and the symbols.
+    """
+
+    with open(mapfile, "w") as file:
+        file.write(format_source_map(source, width, size, lines, sym))
+        file.write("\n")
+
+
 def main(argv):
     # Parse command line
-    inputfile, outputfile = parse_commandline(argv)
+    inputfile, outputfile, width, mapfile = parse_commandline(argv)
+    source = "<stdin>" if inputfile == "-" else inputfile
 
     # Open files
     inputfile, outputfile = open_files(inputfile, outputfile)
@@ -458,9 +415,16 @@ def main(argv):
     # Set up the machine code output
     code = []
 
+    # Source line of each address
+    lines = []
+
     # Assemble
-    pass1(inputfile, sym, code)
-    pass2(outputfile, sym, code)
+    pass1(inputfile, sym, code, width, lines)
+    pass2(outputfile, sym, code, width)
+
+    if mapfile is not None:
+        size = sum(1 for c in code if not c.startswith("#"))
+        write_map(mapfile, source, sym, lines, size, width)
 
     return 0
 
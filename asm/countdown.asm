@@ -0,0 +1,43 @@
+; Count down from 250 to 0, 200 times, calling a subroutine each step
+;
+; A branch-heavy workload: every step is a CALL, a CMP and a conditional
+; jump, and each round ends with an unconditional jump.
+;
+; Expected output:
+; 200
+
+	LDI R0,0             ; rounds completed
+	LDI R2,0             ; zero, for CMP
+	LDI R3,200           ; rounds to run
+
+Round:
+
+	LDI R1,250           ; steps left in this round
+
+Step:
+
+	LDI R4,Decrement
+	CALL R4              ; R1 -= 1
+	CMP R1,R2
+	LDI R4,Step
+	JNE R4               ; next step until R1 == 0
+
+	INC R0
+	CMP R0,R3
+	LDI R4,Done
+	JEQ R4               ; stop after the last round
+	LDI R4,Round
+	JMP R4               ; next round
+
+Done:
+
+	PRN R0
+	HLT
+
+; Subroutine: Decrement
+; R1 the number to decrement
+
+Decrement:
+
+	DEC R1
+	RET
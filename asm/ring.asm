@@ -0,0 +1,64 @@
+; Passes a token once around a ring of cluster nodes
+;
+; Node 0 sends the token, 1, to node 1. Each node that receives it prints
+; it, and sends it on to the next node, plus 1, until it is back at node 0.
+; Each node takes the token on the network interrupt (I2), and halts.
+;
+; The network device is at its default place: NET_ID at 0xC0, NET_NODES at
+; 0xC1, NET_DEST at 0xC2, NET_SEND at 0xC3, the send buffer at 0xC6, and the
+; receive buffer at 0xCE.
+;
+; Run on a cluster: python -m ls8.ls8 cluster ls8/examples/ring.ls8 --nodes 8
+;
+; Expected output: node N prints N, and node 0 prints the number of nodes.
+
+	LDI R0,0xFA          ; R0 holds the interrupt vector for I2 (network)
+	LDI R1,Received      ; R1 holds the address of the handler
+	ST R0,R1             ; Store handler address in interrupt vector
+	LDI R5,4             ; Enable network interrupts
+
+	LDI R2,Wait
+	LDI R0,0xC0
+	LD R0,R0             ; R0: the ID of this node
+	LDI R1,0
+	CMP R0,R1
+	JNE R2               ; only node 0 starts the token
+
+	LDI R0,1
+	LDI R1,0xC6
+	ST R1,R0             ; the token is 1
+	LDI R1,0xC2
+	ST R1,R0             ; to node 1
+	LDI R1,0xC3
+	ST R1,R0             ; send 1 word
+
+Wait:
+	JMP R2               ; spin until the token comes
+
+Received:
+	LDI R0,0xCE
+	LD R0,R0             ; R0: the token
+	PRN R0
+
+	LDI R1,0xC0
+	LD R1,R1             ; R1: the ID of this node
+	LDI R2,0
+	CMP R1,R2
+	LDI R3,Done
+	JEQ R3               ; the token is back at node 0
+
+	LDI R2,1
+	ADD R1,R2
+	LDI R3,0xC1
+	LD R3,R3
+	MOD R1,R3            ; R1: the next node
+	LDI R3,0xC2
+	ST R3,R1             ; to the next node
+	ADD R0,R2
+	LDI R3,0xC6
+	ST R3,R0             ; the token, plus 1
+	LDI R3,0xC3
+	ST R3,R2             ; send 1 word
+
+Done:
+	HLT
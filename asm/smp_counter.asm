@@ -0,0 +1,78 @@
+; Adds to a counter shared by every core, under a spin lock
+;
+; Each core adds 1 to Counter 25 times, taking Lock around each addition
+; with TAS. The last core to finish prints the total: 25 times the number
+; of cores, which each core finds in R0 when it starts.
+;
+; Run on several cores: python -m ls8.ls8 --cores 4 -e smp_counter
+;
+; Expected output (4 cores): 100
+
+	LDI R1,Cores
+	ST R1,R0             ; save the number of cores
+	LDI R1,Lock          ; R1: address of the lock
+	LDI R2,Counter       ; R2: address of the counter
+	LDI R3,25            ; R3: additions left
+	LDI R4,0             ; R4: 0, to compare with
+
+Loop:
+
+	TAS R0,R1            ; take the lock: it was free if TAS loaded 0
+	CMP R0,R4
+	LDI R0,Loop
+	JNE R0               ; held by another core: try again
+
+	LD R0,R2             ; add 1 to the counter
+	INC R0
+	ST R2,R0
+
+	ST R1,R4             ; release the lock
+
+	DEC R3
+	CMP R3,R4
+	LDI R0,Loop
+	JNE R0
+
+Done:
+
+	TAS R0,R1            ; take the lock, to count this core as done
+	CMP R0,R4
+	LDI R0,Done
+	JNE R0
+
+	LDI R2,Finished
+	LD R0,R2
+	INC R0
+	ST R2,R0
+
+	ST R1,R4             ; release the lock
+
+	LDI R2,Cores         ; print the total if this core was the last
+	LD R1,R2
+	CMP R0,R1
+	LDI R0,End
+	JNE R0
+
+	LDI R2,Counter
+	LD R0,R2
+	PRN R0
+
+End:
+
+	HLT
+
+Lock:
+
+	db 0
+
+Counter:
+
+	db 0
+
+Finished:
+
+	db 0
+
+Cores:
+
+	db 0
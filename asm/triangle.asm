@@ -0,0 +1,56 @@
+; Sum the triangle numbers of 24 down to 1, 100 times over
+;
+; A call-heavy workload: every call runs a loop in a pure subroutine, with
+; inputs that repeat from round to round.
+;
+; Expected output:
+; 160
+
+	LDI R2,0             ; the sum, modulo 256
+	LDI R4,100           ; rounds left
+
+Round:
+
+	LDI R0,24            ; the next number
+
+Next:
+
+	LDI R3,Triangle
+	CALL R3              ; R1 = 1 + 2 + ... + R0
+	ADD R2,R1
+	DEC R0
+	LDI R3,0
+	CMP R0,R3
+	LDI R3,Next
+	JNE R3               ; next number until R0 == 0
+
+	DEC R4
+	LDI R3,0
+	CMP R4,R3
+	LDI R3,Round
+	JNE R3               ; next round until R4 == 0
+
+	PRN R2
+	HLT
+
+; Subroutine: Triangle
+; R0 the number, at least 1 (kept)
+; R1 the sum of 1 up to the number (returned)
+; R3 (clobbered)
+
+Triangle:
+
+	PUSH R0
+	LDI R1,0
+
+TriangleStep:
+
+	ADD R1,R0
+	DEC R0
+	LDI R3,0
+	CMP R0,R3
+	LDI R3,TriangleStep
+	JNE R3               ; add the next number until R0 == 0
+
+	POP R0
+	RET
@@ -0,0 +1,618 @@
+"""
+Static analysis of loaded LS-8 memory images.
+
+`build_cfg` recovers the control-flow graph of an image: instructions,
+basic blocks, `LDI`-resolved jump and call targets, subroutines, interrupt
+handlers hooked through the vector table, and the data regions in between.
+"""
+
+############################################################
+
+from .cpu import CPU
+
+############################################################
+
+JUMPS = frozenset(("JMP", ))
+CONDITIONAL_JUMPS = frozenset(("JEQ", "JNE", "JGT", "JLT", "JLE", "JGE"))
+TERMINATORS = frozenset(("HLT", "RET", "IRET"))
+
+# operations that write their first register operand
+WRITES_REGISTER = frozenset((
+    "LDI",
+    "LD",
+    "TAS",
+    "CID",
+    "POP",
+    "INC",
+    "DEC",
+    "NOT",
+    "ADD",
+    "SUB",
+    "MUL",
+    "DIV",
+    "MOD",
+    "AND",
+    "OR",
+    "XOR",
+    "SHL",
+    "SHR",
+))
+
+# operations that move the stack pointer
+MOVES_STACK = frozenset(("PUSH", "POP", "CALL", "RET", "INT", "IRET"))
+
+MAX_ITERATIONS = 16
+
+#-----------------------------------------------------------
+
+
+class Instruction:
+
+    def __init__(self, address, code, code_name, operands):
+
+        self.address = address
+        self.code = code
+        self.code_name = code_name
+        self.operands = operands
+        self.width = 1 + len(operands)
+        self.target = None    # resolved jump / call target, if any
+
+        return
+
+    def __str__(self):
+
+        if self.code_name == "LDI":
+            operands = "R{},{}".format(*self.operands)
+        else:
+            operands = ",".join(f"R{operand}" for operand in self.operands)
+
+        return f"{self.code_name} {operands}".strip()
+
+
+class BasicBlock:
+
+    def __init__(self, start):
+
+        self.start = start
+        self.end = start    # exclusive
+        self.instructions = []
+        self.successors = []
+        self.calls = []
+
+        return
+
+    def __str__(self):
+
+        return str(self.__dict__)
+
+    @property
+    def last(self):
+
+        return self.instructions[-1]
+
+
+class ControlFlowGraph:
+
+    def __init__(self, memory, size, constants):
+
+        self.memory = memory
+        self.size = size
+        self.constants = constants
+
+        self.instructions = {}    # address -> Instruction
+        self.blocks = {}    # start -> BasicBlock
+        self.subroutines = {}    # entry -> set of block starts
+        self.interrupt_handlers = {}    # vector address -> handler entry
+        self.data_regions = []    # (start, end, kind)
+        self.data_references = set()    # addresses read or written by LD / ST
+        self.warnings = []
+
+        return
+
+    def __str__(self):
+
+        return format_cfg(self)
+
+    def block_at(self, address):
+        """
+        Get the basic block containing `address`, or `None`.
+        """
+
+        for block in self.blocks.values():
+            if block.start <= address < block.end:
+                return block
+
+        return None
+
+    @property
+    def code_addresses(self):
+        """
+        Get every address covered by a reachable instruction.
+        """
+
+        covered = set()
+
+        for instruction in self.instructions.values():
+            covered.update(range(instruction.address, instruction.address + instruction.width))
+
+        return covered
+
+
+############################################################
+#   ANALYSIS
+############################################################
+
+
+def image_size(memory, limit=None):
+    """
+    Get the size of the image in `memory`: one past the last non-zero word.
+    """
+
+    limit = len(memory) if limit is None else limit
+
+    for address in range(limit - 1, -1, -1):
+        if memory[address]:
+            return address + 1
+
+    return 0
+
+
+def decode(memory, address, operations=None):
+    """
+    Decode the instruction at `address`, or return `None` if it is unknown
+    or runs past the end of `memory`.
+    """
+
+    operations = CPU.OPERATIONS if operations is None else operations
+
+    code = memory[address]
+
+    if code not in operations:
+        return None
+
+    width = operations.WIDTH[code]
+
+    if address + width > len(memory):
+        return None
+
+    return Instruction(
+        address,
+        code,
+        operations.CODE_NAME[code],
+        tuple(memory[(address + 1):(address + width)]),
+    )
+
+
+def _meet(state_a, state_b):
+
+    if state_a is None:
+        return state_b
+
+    return tuple((a if a == b else None) for (a, b) in zip(state_a, state_b))
+
+
+def _step(instruction, state, clobbers, constants):
+    """
+    Abstractly execute `instruction` on the register-constant `state`.
+    Returns `(successors, out_state)`; each successor is `(address, state)`.
+    """
+
+    name = instruction.code_name
+    operands = instruction.operands
+    registers = list(state)
+    fall = instruction.address + instruction.width
+
+    if name in WRITES_REGISTER:
+        registers[operands[0]] = operands[1] if name == "LDI" else None
+
+    if name in MOVES_STACK:
+        registers[constants.REGISTER_OF_STACK_POINTER] = None
+
+    registers = tuple(registers)
+
+    if name in JUMPS or name in CONDITIONAL_JUMPS or name == "CALL":
+        instruction.target = state[operands[0]]
+
+    if name in TERMINATORS:
+        return ([], registers)
+
+    if name in JUMPS:
+        return (([(instruction.target, registers)] if instruction.target is not None else []), registers)
+
+    if name in CONDITIONAL_JUMPS:
+        successors = [(fall, registers)]
+        if instruction.target is not None:
+            successors.insert(0, (instruction.target, registers))
+        return (successors, registers)
+
+    if name == "CALL":
+        clobbered = clobbers.get(instruction.target)
+        if clobbered is None:
+            # unknown callee: assume every register is clobbered
+            successors = [(fall, (None, ) * len(registers))]
+        else:
+            after = tuple((None if r in clobbered else value) for (r, value) in enumerate(registers))
+            successors = [(fall, after)]
+        if instruction.target is not None:
+            successors.insert(0, (instruction.target, registers))
+        return (successors, registers)
+
+    return ([(fall, registers)], registers)
+
+
+def _valid_registers(instruction, constants):
+    """
+    Test if every register operand of `instruction` names a register.
+    """
+
+    registers = instruction.operands[:1] if instruction.code_name == "LDI" else instruction.operands
+
+    return all(operand < constants.REGISTER_COUNT for operand in registers)
+
+
+def _explore(cfg, entries, clobbers, operations):
+    """
+    Walk every path from `entries`, propagating `LDI` constants through
+    registers until the states settle.
+    """
+
+    constants = cfg.constants
+    vectors = range(constants.ADDRESS_OF_INTERRUPT_VECTORS, constants.WORD_SIZE)
+
+    initial = [0] * constants.REGISTER_COUNT
+    initial[constants.REGISTER_OF_STACK_POINTER] = constants.ADDRESS_OF_STACK_START
+    initial = tuple(initial)
+
+    states = {}
+    worklist = []
+
+    for entry in entries:
+        states[entry] = _meet(states.get(entry), initial)
+        worklist.append(entry)
+
+    instructions = {}
+    invalid = set()
+
+    while worklist:
+
+        address = worklist.pop()
+
+        if not (0 <= address < len(cfg.memory)):
+            invalid.add(address)
+            continue
+
+        instruction = instructions.get(address) or decode(cfg.memory, address, operations)
+
+        if instruction is None or not _valid_registers(instruction, constants):
+            invalid.add(address)
+            continue
+
+        instructions[address] = instruction
+
+        (successors, out_state) = _step(instruction, states[address], clobbers, constants)
+
+        if instruction.code_name == "ST":
+            (reg_a, reg_b) = instruction.operands
+            (target, value) = (out_state[reg_a], out_state[reg_b])
+            if target is not None:
+                cfg.data_references.add(target)
+                if target in vectors and value is not None:
+                    cfg.interrupt_handlers[target] = value
+                    successors.append((value, initial))
+
+        if instruction.code_name == "LD":
+            source = states[address][instruction.operands[1]]
+            if source is not None:
+                cfg.data_references.add(source)
+
+        for (successor, state) in successors:
+
+            merged = _meet(states.get(successor), state)
+
+            if merged != states.get(successor):
+                states[successor] = merged
+                worklist.append(successor)
+
+    return (instructions, invalid)
+
+
+def _subroutine_bodies(instructions, entries):
+    """
+    Collect the instruction addresses of each subroutine, following jumps
+    and fall-through but not calls (which return) or `RET`.
+    """
+
+    bodies = {}
+
+    for entry in entries:
+
+        body = set()
+        worklist = [entry]
+
+        while worklist:
+
+            address = worklist.pop()
+
+            if address in body or address not in instructions:
+                continue
+
+            body.add(address)
+            instruction = instructions[address]
+            name = instruction.code_name
+            fall = address + instruction.width
+
+            if name in TERMINATORS:
+                continue
+
+            if name in JUMPS or name in CONDITIONAL_JUMPS:
+                if instruction.target is not None:
+                    worklist.append(instruction.target)
+                if name in JUMPS:
+                    continue
+
+            worklist.append(fall)
+
+        bodies[entry] = body
+
+    return bodies
+
+
+def _clobbers(instructions, bodies):
+    """
+    Get the registers each subroutine (and everything it calls) may write.
+    """
+
+    clobbers = {
+        entry: {
+            instructions[address].operands[0]
+            for address in body
+            if instructions[address].code_name in WRITES_REGISTER
+        }
+        for (entry, body) in bodies.items()
+    }
+
+    changed = True
+
+    while changed:
+
+        changed = False
+
+        for (entry, body) in bodies.items():
+            for address in body:
+                instruction = instructions[address]
+                if instruction.code_name == "CALL" and instruction.target in clobbers:
+                    extra = clobbers[instruction.target] - clobbers[entry]
+                    if extra:
+                        clobbers[entry] |= extra
+                        changed = True
+
+    return clobbers
+
+
+def _build_blocks(cfg, leaders):
+
+    for start in sorted(leaders):
+
+        if start in cfg.blocks or start not in cfg.instructions:
+            continue
+
+        block = BasicBlock(start)
+        address = start
+
+        while address in cfg.instructions:
+
+            instruction = cfg.instructions[address]
+            block.instructions.append(instruction)
+            address += instruction.width
+            name = instruction.code_name
+
+            if name == "CALL" and instruction.target is not None:
+                block.calls.append(instruction.target)
+
+            if name in TERMINATORS:
+                break
+
+            if name in JUMPS or name in CONDITIONAL_JUMPS or name == "CALL":
+                if instruction.target is not None and name != "CALL":
+                    block.successors.append(instruction.target)
+                if name not in JUMPS:
+                    block.successors.append(address)
+                break
+
+            if address in leaders:
+                block.successors.append(address)
+                break
+
+        block.end = address
+        cfg.blocks[start] = block
+
+    return
+
+
+def _is_text(words):
+
+    return all((32 <= word < 127) or word in (9, 10, 13) for word in words)
+
+
+def _find_data_regions(cfg):
+
+    covered = cfg.code_addresses
+    start = None
+
+    for address in range(cfg.size + 1):
+
+        is_data = (address < cfg.size) and (address not in covered)
+
+        if is_data and start is None:
+            start = address
+
+        elif not is_data and start is not None:
+            words = cfg.memory[start:address]
+            kind = "text" if _is_text(words) else "bytes"
+            cfg.data_regions.append((start, address, kind))
+            start = None
+
+    return
+
+
+def build_cfg(memory, entry=0, size=None, operations=None, constants=None):
+    """
+    Build the control-flow graph of the image loaded in `memory`.
+    `size` limits the image (by default: up to the last non-zero word below
+    the stack); `operations` and `constants` default to the CPU's.
+    """
+
+    constants = CPU.CONSTANTS if constants is None else constants
+    size = image_size(memory, limit=constants.ADDRESS_OF_STACK_START) if size is None else size
+
+    cfg = ControlFlowGraph(memory, size, constants)
+
+    # Calls are resolved from constants that may have to survive other
+    # calls, so iterate until the callees' clobbered registers settle.
+
+    clobbers = {}
+
+    for _ in range(MAX_ITERATIONS):
+
+        cfg.interrupt_handlers = {}
+        cfg.data_references = set()
+
+        entries = [entry]
+        (instructions, invalid) = _explore(cfg, entries, clobbers, operations)
+
+        call_targets = {
+            instruction.target
+            for instruction in instructions.values()
+            if instruction.code_name == "CALL" and instruction.target is not None
+        }
+
+        bodies = _subroutine_bodies(instructions, call_targets)
+        new_clobbers = _clobbers(instructions, bodies)
+
+        if new_clobbers == clobbers:
+            break
+
+        clobbers = new_clobbers
+
+    cfg.instructions = instructions
+
+    # leaders: entries, targets, and whatever follows a control transfer
+
+    leaders = {entry}
+    leaders.update(call_targets)
+    leaders.update(cfg.interrupt_handlers.values())
+
+    for instruction in instructions.values():
+        name = instruction.code_name
+        if name in JUMPS or name in CONDITIONAL_JUMPS or name == "CALL" or name in TERMINATORS:
+            if instruction.target is not None:
+                leaders.add(instruction.target)
+            leaders.add(instruction.address + instruction.width)
+
+    _build_blocks(cfg, leaders)
+
+    cfg.subroutines = {
+        target: {block.start for block in cfg.blocks.values() if block.start in bodies[target]}
+        for target in sorted(call_targets)
+    }
+
+    _find_data_regions(cfg)
+
+    # warnings
+
+    for instruction in sorted(instructions.values(), key=lambda i: i.address):
+        name = instruction.code_name
+        if (name in JUMPS or name in CONDITIONAL_JUMPS or name == "CALL") and instruction.target is None:
+            cfg.warnings.append(f"0x{instruction.address:02X}: unresolved {name} target")
+
+    for address in sorted(invalid):
+        cfg.warnings.append(f"0x{address:02X}: execution reaches an invalid instruction")
+
+    covered = cfg.code_addresses
+    starts = set(instructions)
+
+    for address in sorted(cfg.data_references & covered):
+        cfg.warnings.append(f"0x{address:02X}: data access into code")
+
+    for instruction in instructions.values():
+        for operand_address in range(instruction.address + 1, instruction.address + instruction.width):
+            if operand_address in starts:
+                cfg.warnings.append(f"0x{operand_address:02X}: overlapping instructions")
+
+    for instruction in instructions.values():
+        if instruction.address + instruction.width > size and instruction.address < size:
+            cfg.warnings.append(f"0x{instruction.address:02X}: execution runs past the image")
+        elif instruction.address >= size:
+            cfg.warnings.append(f"0x{instruction.address:02X}: execution outside the image")
+            break
+
+    return cfg
+
+
+############################################################
+#   FORMATTING
+############################################################
+
+
+def format_cfg(cfg, source_map=None):
+    """
+    Format `cfg` as a human-readable listing. With a `SourceMap`, blocks
+    take the names of the source's labels, and instructions name their
+    source lines.
+    """
+
+    def label(address):
+
+        if source_map is not None and source_map.name[address] is not None:
+            return source_map.name[address]
+        if address in cfg.subroutines:
+            return f"SUB_{address:02X}"
+        if address in cfg.interrupt_handlers.values():
+            return f"INT_{address:02X}"
+        return f"L_{address:02X}"
+
+    lines = []
+
+    for start in sorted(cfg.blocks):
+
+        block = cfg.blocks[start]
+
+        lines.append(f"{label(start)}:    ; block 0x{block.start:02X}-0x{block.end:02X}")
+
+        for instruction in block.instructions:
+            notes = []
+            if instruction.target is not None:
+                notes.append(f"-> {label(instruction.target)}")
+            if source_map is not None and source_map.line[instruction.address]:
+                notes.append(source_map.where(instruction.address))
+            comment = f"    ; {', '.join(notes)}" if notes else ""
+            lines.append(f"    0x{instruction.address:02X}  {str(instruction):<12}{comment}".rstrip())
+
+        successors = ", ".join(label(successor) for successor in block.successors)
+        lines.append(f"    ; successors: {successors or '-'}")
+        lines.append("")
+
+    sections = [
+        [
+            f"DATA 0x{start:02X}-0x{end:02X}    ; {end - start} words, {kind}"
+            for (start, end, kind) in cfg.data_regions
+        ],
+        [
+            "SUBROUTINE {}: {}".format(
+                label(entry),
+                ", ".join(label(block) for block in sorted(blocks)),
+            ) for (entry, blocks) in cfg.subroutines.items()
+        ],
+        [
+            f"INTERRUPT 0x{vector:02X}: {label(handler)}"
+            for (vector, handler) in sorted(cfg.interrupt_handlers.items())
+        ],
+        [f"WARNING {warning}" for warning in cfg.warnings],
+    ]
+
+    for section in sections:
+        if section:
+            lines.extend(section)
+            lines.append("")
+
+    return "\n".join(lines).rstrip()
@@ -0,0 +1,595 @@
+"""
+Ahead-of-time translation of LS-8 images into Python.
+
+`translate` turns a loaded image into the source of a Python module with one
+function, `run(cpu, limit)`. It keeps the registers and flags in locals,
+runs straight-line code as straight-line Python, and only dispatches on the
+program pointer where control can arrive from elsewhere: the basic-block
+starts that `build_cfg` finds.
+
+`run_aot` runs a CPU through its translation, caching the generated module
+on disk by image hash. It falls back to the interpreter one instruction at a
+time wherever the translation cannot go (an unknown entry, `INT`, `IRET`,
+an invalid instruction), and for the rest of the run once a store hits the
+translated code.
+"""
+
+############################################################
+
+import hashlib
+import importlib.util
+import os
+import time
+import types
+
+from .analysis import build_cfg
+from .cpu__results import ProcessorRunResult, REASON__MAX_INSTRUCTIONS
+
+############################################################
+
+# bump when the generated code changes
+TRANSLATOR_VERSION = 3
+
+CACHE_DIR = os.environ.get("LS8_AOT_CACHE") or os.path.join(
+    os.path.expanduser("~"), ".cache", "ls8", "aot",
+)
+
+# how `run` returned
+STATUS__LIMIT = 0    # ran `limit` instructions, or `should_continue` was cleared
+STATUS__MISS = 1    # the program pointer is not a translated entry
+STATUS__EXIT = 2    # the next instruction must run on the interpreter
+STATUS__HALTED = 3    # the CPU halted
+STATUS__STORE_INTO_CODE = 4    # a store hit translated code, so the translation is stale
+
+# the longest straight-line run translated in one piece, in instructions
+MAX_REGION_LENGTH = 256
+
+# `fl` bits tested by each conditional jump: `(mask, jump if set)`
+CONDITIONS = {
+    "JEQ": ("FLAG_EQ", True),
+    "JNE": ("FLAG_EQ", False),
+    "JGT": ("FLAG_GT", True),
+    "JLT": ("FLAG_LT", True),
+    "JLE": ("FLAG_GT", False),
+    "JGE": ("FLAG_LT", False),
+}
+
+# `r{a}` and `r{b}` are the operands' registers; results are masked to a word
+BINARY = {
+    "ADD": "(r{a} + r{b}) & {word}",
+    "SUB": "(r{a} - r{b}) & {word}",
+    "MUL": "(r{a} * r{b}) & {word}",
+    "AND": "r{a} & r{b}",
+    "OR": "r{a} | r{b}",
+    "XOR": "r{a} ^ r{b}",
+    "SHL": "(r{a} << r{b}) & {word}",
+    "SHR": "r{a} >> r{b}",
+}
+
+UNARY = {
+    "INC": "(r{a} + 1) & {word}",
+    "DEC": "(r{a} - 1) & {word}",
+    "NOT": "{word} - r{a}",
+}
+
+DIVIDE = {
+    "DIV": "r{a} // r{b}",
+    "MOD": "r{a} % r{b}",
+}
+
+############################################################
+#   TRANSLATION
+############################################################
+
+
+class _Writer:
+
+    def __init__(self):
+
+        self.lines = []
+        self.depth = 0
+
+        return
+
+    def __call__(self, line):
+
+        self.lines.append(("    " * self.depth + line) if line else "")
+
+        return
+
+    def indent(self):
+
+        self.depth += 1
+
+        return self
+
+    def dedent(self):
+
+        self.depth -= 1
+
+        return self
+
+
+class _Region:
+    """
+    Translate the straight-line run starting at one entry.
+    """
+
+    def __init__(self, cpu_class, memory, start, emit, code):
+
+        self.operations = cpu_class.OPERATIONS
+        self.constants = cpu_class.CONSTANTS
+        self.masks = cpu_class.MASKS
+        self.memory = memory
+        self.start = start
+        self.emit = emit
+        self.code = code    # marks every word of translated code
+
+        self.pending = 0    # instructions run but not yet counted
+
+        return
+
+    def count(self):
+        """
+        Emit the count of the instructions run since the last count.
+        """
+
+        if self.pending:
+            self.emit(f"count += {self.pending}")
+            self.pending = 0
+
+        return
+
+    def leave(self, pc, status=None):
+        """
+        Emit a transfer to `pc`: back to dispatch, or out with `status`.
+        """
+
+        self.count()
+        self.emit(f"pc = {pc}")
+
+        if status is None:
+            self.emit("continue")
+        else:
+            self.emit(f"status = {status}")
+            self.emit("break")
+
+        return
+
+    def store(self, address, value, next_pc):
+        """
+        Emit a store, leaving the translation if it hits translated code.
+        """
+
+        pending = self.pending
+
+        self.emit(f"write_memory({address}, {value})")
+        self.emit(f"if code[{address} & {self.masks.WORD}]:")
+        self.emit.indent()
+        self.pending += 1
+        self.leave(next_pc, STATUS__STORE_INTO_CODE)
+        self.emit.dedent()
+
+        self.pending = pending
+
+        return
+
+    def translate(self):
+
+        operations = self.operations
+        interrupt_registers = (
+            self.constants.REGISTER_OF_INTERRUPT_MASK,
+            self.constants.REGISTER_OF_INTERRUPT_STATUS,
+        )
+        word = self.masks.WORD
+
+        address = self.start
+
+        for _ in range(MAX_REGION_LENGTH):
+
+            if address >= len(self.memory):
+                self.leave(address, STATUS__EXIT)
+                return
+
+            op = self.memory[address]
+
+            if op not in operations or address + operations.WIDTH[op] > len(self.memory):
+                self.leave(address, STATUS__EXIT)
+                return
+
+            width = operations.WIDTH[op]
+            name = operations.CODE_NAME[op]
+            operands = list(self.memory[address + 1:address + width])
+            next_pc = address + width
+
+            # operands past the register file fail on the interpreter
+            registers = operands[:1] if name == "LDI" else operands
+            if any(operand >= self.constants.REGISTER_COUNT for operand in registers):
+                self.leave(address, STATUS__EXIT)
+                return
+
+            # IM and IS are only written by the interpreter, since devices
+            # may raise interrupts while the translation runs
+            if name in _WRITES_REGISTER and operands[0] in interrupt_registers:
+                self.leave(address, STATUS__EXIT)
+                return
+
+            if not self.instruction(name, operands, address, next_pc, word):
+                self.leave(address, STATUS__EXIT)
+                return
+
+            self.code[address:next_pc] = b"\x01" * width
+
+            if self.ends:
+                return
+
+            address = next_pc
+
+        self.leave(address)
+
+        return
+
+    def instruction(self, name, operands, address, next_pc, word):
+        """
+        Emit one instruction. Returns `False` if it cannot be translated.
+        """
+
+        emit = self.emit
+        a = operands[0] if operands else None
+        b = operands[1] if len(operands) > 1 else None
+        sp = self.constants.REGISTER_OF_STACK_POINTER
+
+        self.ends = False
+        emit(f"# {address:#04x}: {name} {','.join(str(operand) for operand in operands)}".rstrip())
+
+        if name == "NOP":
+            self.pending += 1
+
+        elif name == "HLT":
+            self.pending += 1
+            emit("cpu.stop()")
+            self.leave(next_pc, STATUS__HALTED)
+            self.ends = True
+
+        elif name == "LDI":
+            emit(f"r{a} = {b}")
+            self.pending += 1
+
+        elif name == "LD":
+            emit(f"r{a} = memory[r{b}]")
+            self.pending += 1
+
+        elif name == "ST":
+            self.store(f"r{a}", f"r{b}", next_pc)
+            self.pending += 1
+
+        elif name == "PRN":
+            emit(f"print(r{a}, file=cpu.output)")
+            emit(f"cpu.output_bytes += len(str(r{a})) + 1")
+            self.pending += 1
+
+        elif name == "PRA":
+            emit(f"print(chr(r{a}), file=cpu.output)")
+            emit(f"cpu.output_bytes += len(chr(r{a}).encode('utf-8', 'surrogatepass')) + 1")
+            self.pending += 1
+
+        elif name in UNARY:
+            emit(f"r{a} = " + UNARY[name].format(a=a, word=word))
+            self.pending += 1
+
+        elif name in BINARY:
+            emit(f"r{a} = " + BINARY[name].format(a=a, b=b, word=word))
+            self.pending += 1
+
+        elif name in DIVIDE:
+            # `divide_by_zero` reports the instruction, then the CPU steps over it
+            pending = self.pending
+            emit(f"if r{b} == 0:")
+            emit.indent()
+            self.count()
+            emit(f"pc = {address}")
+            emit("status = None")
+            emit("break")
+            emit.dedent()
+            self.pending = pending
+            emit(f"r{a} = " + DIVIDE[name].format(a=a, b=b))
+            self.pending += 1
+
+        elif name == "CMP":
+            emit(
+                f"fl = (fl & {word - self.masks.FLAG_COMPARE}) | ("
+                f"{self.masks.FLAG_LT} if r{a} < r{b} else "
+                f"{self.masks.FLAG_GT} if r{a} > r{b} else {self.masks.FLAG_EQ})"
+            )
+            self.pending += 1
+
+        elif name == "PUSH":
+            emit(f"value = r{a}")
+            emit(f"r{sp} = (r{sp} - 1) & {word}")
+            self.store(f"r{sp}", "value", next_pc)
+            self.pending += 1
+
+        elif name == "POP":
+            emit(f"value = memory[r{sp}]")
+            emit(f"r{sp} = (r{sp} + 1) & {word}")
+            emit(f"r{a} = value")
+            self.pending += 1
+
+        elif name == "JMP":
+            self.pending += 1
+            self.leave(f"r{a}")
+            self.ends = True
+
+        elif name in CONDITIONS:
+            (mask, when_set) = CONDITIONS[name]
+            self.pending += 1
+            self.count()
+            emit(f"if {'' if when_set else 'not '}fl & {getattr(self.masks, mask)}:")
+            emit.indent()
+            emit(f"pc = r{a}")
+            emit("continue")
+            emit.dedent()
+
+        elif name == "CALL":
+            emit(f"target = r{a}")
+            emit(f"r{sp} = (r{sp} - 1) & {word}")
+            self.store(f"r{sp}", next_pc, "target")
+            self.pending += 1
+            self.leave("target")
+            self.ends = True
+
+        elif name == "RET":
+            emit(f"pc = memory[r{sp}]")
+            emit(f"r{sp} = (r{sp} + 1) & {word}")
+            self.pending += 1
+            self.leave("pc")
+            self.ends = True
+
+        else:
+            return False
+
+        return True
+
+
+# operations that write their first register operand
+_WRITES_REGISTER = frozenset(("LDI", "LD", "POP")) | frozenset(UNARY) | frozenset(BINARY) | frozenset(DIVIDE)
+
+#-----------------------------------------------------------
+
+
+def _dispatch(emit, entries, bodies):
+    """
+    Emit a binary search over the sorted `entries` for the program pointer.
+    """
+
+    if len(entries) <= 4:
+
+        for (i, entry) in enumerate(entries):
+            emit(f"{'if' if i == 0 else 'elif'} pc == {entry}:")
+            emit.indent()
+            emit.lines.extend("    " * emit.depth + line for line in bodies[entry])
+            emit.dedent()
+
+        emit("else:")
+        emit.indent()
+        emit(f"status = {STATUS__MISS}")
+        emit("break")
+        emit.dedent()
+
+        return
+
+    middle = len(entries) // 2
+
+    emit(f"if pc < {entries[middle]}:")
+    emit.indent()
+    _dispatch(emit, entries[:middle], bodies)
+    emit.dedent()
+    emit("else:")
+    emit.indent()
+    _dispatch(emit, entries[middle:], bodies)
+    emit.dedent()
+
+    return
+
+
+def translate(cpu):
+    """
+    Translate the image loaded in `cpu` into the source of a Python module.
+    """
+
+    cpu_class = type(cpu)
+    constants = cpu_class.CONSTANTS
+
+    cfg = build_cfg(cpu.memory, entry=cpu.program_pointer, operations=cpu_class.OPERATIONS, constants=constants)
+
+    entries = sorted(set(cfg.blocks) | {cpu.program_pointer})
+    code = bytearray(constants.WORD_SIZE)
+    bodies = {}
+
+    for entry in entries:
+        emit = _Writer()
+        _Region(cpu_class, cpu.memory, entry, emit, code).translate()
+        bodies[entry] = emit.lines
+
+    registers = ", ".join(f"r{i}" for i in range(constants.REGISTER_COUNT))
+
+    emit = _Writer()
+
+    emit('"""')
+    emit(f"LS-8 image {image_hash(cpu)}, translated by `ls8.aot`; do not edit.")
+    emit('"""')
+    emit("")
+    emit(f"CODE = {bytes(code)!r}")
+    emit("")
+    emit(f"CODE_WORDS = {tuple((address, cpu.memory[address]) for address in range(len(code)) if code[address])!r}")
+    emit("")
+    emit("")
+    emit("def run(cpu, limit):")
+    emit.indent()
+    emit("memory = cpu.memory")
+    emit("write_memory = cpu.write_memory")
+    emit("code = CODE")
+    emit(f"({registers}, ) = cpu.register")
+    emit("fl = cpu.flags")
+    emit("pc = cpu.program_pointer")
+    emit("count = 0")
+    emit("status = None")
+    emit("")
+    emit("while True:")
+    emit.indent()
+    emit("if count >= limit or not cpu.should_continue:")
+    emit.indent()
+    emit(f"status = {STATUS__LIMIT}")
+    emit("break")
+    emit.dedent()
+    _dispatch(emit, entries, bodies)
+    emit.dedent()
+    emit("")
+    emit("register = cpu.register")
+    for i in range(constants.REGISTER_COUNT):
+        if i not in (constants.REGISTER_OF_INTERRUPT_MASK, constants.REGISTER_OF_INTERRUPT_STATUS):
+            emit(f"register[{i}] = r{i}")
+    emit("cpu.flags = fl")
+    emit("cpu.program_pointer = pc")
+    emit("cpu.instruction_count += count")
+    emit("cpu.dispatch_count += count")
+    emit("")
+    emit("return status")
+
+    return "\n".join(emit.lines) + "\n"
+
+
+############################################################
+#   CACHE
+############################################################
+
+
+def image_hash(cpu):
+    """
+    Hash the image loaded in `cpu`, with what its translation depends on.
+    """
+
+    digest = hashlib.sha256()
+
+    digest.update(f"{TRANSLATOR_VERSION}:{type(cpu).__name__}:{cpu.CONSTANTS.BIT_COUNT}:".encode())
+    digest.update(f"{cpu.program_pointer}:".encode())
+    digest.update(",".join(map(str, cpu.memory)).encode())
+
+    return digest.hexdigest()[:24]
+
+
+def load(cpu, cache_dir=None, cache=True):
+    """
+    Get the translation of the image loaded in `cpu`, as a module: imported
+    from the cache if it is there, otherwise translated and cached first.
+    Without `cache`, the module is translated in memory.
+    """
+
+    if not cache:
+        module = types.ModuleType(f"ls8_aot_{image_hash(cpu)}")
+        exec(compile(translate(cpu), module.__name__, "exec"), module.__dict__)
+        return module
+
+    cache_dir = CACHE_DIR if cache_dir is None else cache_dir
+    path = os.path.join(cache_dir, f"ls8_aot_{image_hash(cpu)}.py")
+
+    if not os.path.exists(path):
+
+        source = translate(cpu)
+
+        os.makedirs(cache_dir, exist_ok=True)
+
+        # write then rename, so a concurrent run never imports half a module
+        temporary = f"{path}.{os.getpid()}.tmp"
+        with open(temporary, "w") as file:
+            file.write(source)
+        os.replace(temporary, path)
+
+    spec = importlib.util.spec_from_file_location(os.path.basename(path)[:-3], path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+
+    return module
+
+
+############################################################
+#   RUNNING
+############################################################
+
+
+def run_aot(cpu, cache_dir=None, module=None, max_instructions=None):
+    """
+    Run `cpu` until it halts, on the translation of its image where possible.
+    Interrupts are serviced between calls into the translation, as `run`
+    services them between slices. `max_instructions` is only checked between
+    those calls, so a run may go a little past it. Returns a
+    `ProcessorRunResult`, as `run` does.
+    """
+
+    if "read_memory" in cpu.__dict__ or cpu.watches or any(device.read is not None for device in cpu.devices):
+        # a device read hook is mapped, or an execution hook or watchpoint
+        # is registered, which the translation would miss
+        return cpu.run(max_instructions=max_instructions)
+
+    module = load(cpu, cache_dir) if module is None else module
+
+    started = time.perf_counter()
+
+    instruction_count = cpu.instruction_count
+    dispatch_count = cpu.dispatch_count
+
+    stop_count = None if max_instructions is None else instruction_count + max_instructions
+    limit = cpu.RUN__CHECK_INTERVAL
+
+    reason = None
+
+    cpu.start()
+
+    while not cpu.halted:
+
+        if stop_count is not None:
+            limit = stop_count - cpu.instruction_count
+            if limit <= 0:
+                reason = REASON__MAX_INSTRUCTIONS
+                break
+
+        cpu.should_continue = True
+
+        if cpu.interrupts_enabled and (cpu.interrupt_mask & cpu.interrupt_status or any(cpu.interrupts_raised)):
+            cpu.service_interrupts()
+            if not _code_intact(cpu, module):
+                break
+
+        status = module.run(cpu, min(limit, cpu.RUN__CHECK_INTERVAL))
+
+        if status == STATUS__STORE_INTO_CODE:
+            break
+
+        # `None` is a division by zero, which the interpreter reports
+        if status is None or status == STATUS__MISS or status == STATUS__EXIT:
+            cpu.step(1)
+            if not _code_intact(cpu, module):
+                break
+
+    # the translation is stale: finish on the interpreter
+    if not (cpu.halted or reason is not None):
+        reason = cpu.run_limited(stop_count, None, None)
+
+    return ProcessorRunResult(
+        cpu,
+        cpu.halt_reason if reason is None else reason,
+        cpu.instruction_count - instruction_count,
+        cpu.dispatch_count - dispatch_count,
+        time.perf_counter() - started,
+    )
+
+
+def _code_intact(cpu, module):
+    """
+    Test if the translated code is still what is in memory, after work the
+    translation did not see.
+    """
+
+    memory = cpu.memory
+
+    return all(memory[address] == word for (address, word) in module.CODE_WORDS)
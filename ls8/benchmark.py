@@ -0,0 +1,654 @@
+#!/usr/bin/env python3
+"""
+Benchmarks for the LS-8 CPU.
+
+Usage: python -m ls8.benchmark [example ...] [--repeat N] [--suite NAME ...]
+"""
+
+############################################################
+
+import argparse
+import contextlib
+import io
+import os
+import subprocess
+import sys
+import time
+
+from tools.printers import print_heading, print_line
+
+from .cpu import CPU
+
+############################################################
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+EXAMPLES_DIR = os.path.join(PROJECT_DIR, "ls8", "examples")
+EXAMPLES_EXT = ".ls8"
+
+DEFAULT__EXAMPLES = (
+    "countdown",
+    "triangle",
+    "sctest",
+    "printstr",
+    "call",
+    "stack",
+    "mult",
+    "print8",
+)
+DEFAULT__REPEAT = 20
+DEFAULT__STEP = 1000
+DEFAULT__SERVE_JOBS = 1000
+DEFAULT__SMP_LOOPS = 50000    # per core
+DEFAULT__CLUSTER_NODES = 200
+DEFAULT__CLUSTER_LATENCIES = (1, 4, 16)    # rounds
+
+# startup budgets, in milliseconds, with bytecode caching enabled
+STARTUP_BUDGET__IMPORT = 5.0    # `import ls8.ls8`, from `-X importtime`
+STARTUP_BUDGET__FIRST_INSTRUCTION = 5.0    # imports + CPU() + load(), in-process
+STARTUP_BUDGET__OVERHEAD = 10.0    # `python -m ls8.ls8 -e print8` over `python -c "import runpy"`
+
+FIRST_INSTRUCTION_SCRIPT = """
+import time
+start = time.perf_counter()
+from ls8.cpu import CPU
+cpu = CPU()
+cpu.load({program_file!r})
+print((time.perf_counter() - start) * 1000)
+"""
+
+#-----------------------------------------------------------
+
+
+def example_path(name):
+
+    return os.path.join(EXAMPLES_DIR, name + EXAMPLES_EXT)
+
+
+def time_run(program_file, repeat, **cpu_kwargs):
+    """
+    Run `program_file` on a fresh CPU `repeat` times, with output discarded.
+    Returns `(best_seconds, instruction_count, dispatch_count)` for one run.
+    """
+
+    best = None
+    cpu = None
+
+    for _ in range(repeat):
+
+        cpu = CPU(**cpu_kwargs)
+        cpu.load(program_file)
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            cpu.run()
+            elapsed = time.perf_counter() - start
+
+        best = elapsed if best is None else min(best, elapsed)
+
+    return (best, cpu.instruction_count, cpu.dispatch_count)
+
+
+#-----------------------------------------------------------
+
+
+def bench_fusion(examples, repeat):
+    """
+    Compare plain dispatch against superinstruction fusion.
+    """
+
+    print_heading("superinstruction fusion", width=80)
+    print(
+        "{:<12} {:>10} {:>10} {:>10} {:>7} {:>10} {:>10} {:>8}".format(
+            "example",
+            "instrs",
+            "disp.off",
+            "disp.on",
+            "saved",
+            "us.off",
+            "us.on",
+            "speedup",
+        )
+    )
+    print_line(width=80)
+
+    for name in examples:
+
+        program_file = example_path(name)
+
+        (time_off, instructions, dispatches_off) = time_run(program_file, repeat, fuse=False)
+        (time_on, _, dispatches_on) = time_run(program_file, repeat, fuse=True)
+
+        print(
+            "{:<12} {:>10} {:>10} {:>10} {:>6.1%} {:>10.1f} {:>10.1f} {:>7.2f}x".format(
+                name,
+                instructions,
+                dispatches_off,
+                dispatches_on,
+                1 - (dispatches_on / dispatches_off),
+                time_off * 1e6,
+                time_on * 1e6,
+                time_off / time_on,
+            )
+        )
+
+    print()
+
+    return
+
+
+def bench_alu(examples, repeat):
+    """
+    Compare the reference ALU against the table-driven ALU.
+    """
+
+    print_heading("table-driven ALU", width=80)
+    print("{:<12} {:>10} {:>10} {:>10} {:>10}".format("example", "instrs", "us.ref", "us.table", "speedup"))
+    print_line(width=80)
+
+    for name in examples:
+
+        program_file = example_path(name)
+
+        (time_ref, instructions, _) = time_run(program_file, repeat)
+        (time_table, _, _) = time_run(program_file, repeat, table_alu=True)
+
+        print(
+            "{:<12} {:>10} {:>10.1f} {:>10.1f} {:>9.2f}x".format(
+                name,
+                instructions,
+                time_ref * 1e6,
+                time_table * 1e6,
+                time_ref / time_table,
+            )
+        )
+
+    print()
+
+    return
+
+
+def time_aot(program_file, repeat):
+    """
+    Like `time_run`, but on the image's translation, made before timing.
+    """
+
+    from . import aot
+
+    best = None
+    module = None
+
+    for _ in range(repeat):
+
+        cpu = CPU()
+        cpu.load(program_file)
+
+        if module is None:
+            module = aot.load(cpu, cache=False)
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            aot.run_aot(cpu, module=module)
+            elapsed = time.perf_counter() - start
+
+        best = elapsed if best is None else min(best, elapsed)
+
+    return best
+
+
+def bench_aot(examples, repeat):
+    """
+    Compare the interpreter against ahead-of-time translation.
+    """
+
+    print_heading("ahead-of-time translation", width=80)
+    print("{:<12} {:>10} {:>10} {:>10} {:>10}".format("example", "instrs", "us.run", "us.aot", "speedup"))
+    print_line(width=80)
+
+    for name in examples:
+
+        program_file = example_path(name)
+
+        (time_interpreted, instructions, _) = time_run(program_file, repeat)
+        time_translated = time_aot(program_file, repeat)
+
+        print(
+            "{:<12} {:>10} {:>10.1f} {:>10.1f} {:>9.2f}x".format(
+                name,
+                instructions,
+                time_interpreted * 1e6,
+                time_translated * 1e6,
+                time_interpreted / time_translated,
+            )
+        )
+
+    print()
+
+    return
+
+
+def bench_memo(examples, repeat):
+    """
+    Compare plain calls against memoized calls of pure subroutines.
+    """
+
+    print_heading("memoized subroutines", width=80)
+    print(
+        "{:<12} {:>10} {:>10} {:>10} {:>10} {:>10} {:>10}".format(
+            "example",
+            "instrs",
+            "disp.off",
+            "disp.on",
+            "us.off",
+            "us.on",
+            "speedup",
+        )
+    )
+    print_line(width=80)
+
+    for name in examples:
+
+        program_file = example_path(name)
+
+        (time_off, instructions, dispatches_off) = time_run(program_file, repeat)
+        (time_on, _, dispatches_on) = time_run(program_file, repeat, memoize=True)
+
+        print(
+            "{:<12} {:>10} {:>10} {:>10} {:>10.1f} {:>10.1f} {:>9.2f}x".format(
+                name,
+                instructions,
+                dispatches_off,
+                dispatches_on,
+                time_off * 1e6,
+                time_on * 1e6,
+                time_off / time_on,
+            )
+        )
+
+    print()
+
+    return
+
+
+#-----------------------------------------------------------
+
+
+def time_steps(program_file, repeat, step):
+    """
+    Like `time_run`, but drive the CPU with `step(step)` until it halts.
+    """
+
+    best = None
+
+    for _ in range(repeat):
+
+        cpu = CPU()
+        cpu.load(program_file)
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            while cpu.step(step) == step:
+                pass
+            elapsed = time.perf_counter() - start
+
+        best = elapsed if best is None else min(best, elapsed)
+
+    return best
+
+
+def bench_step(examples, repeat, step=DEFAULT__STEP):
+    """
+    Compare one `run()` against repeated `step(n)` calls.
+    """
+
+    print_heading(f"run() against step({step})", width=80)
+    print("{:<12} {:>10} {:>10} {:>10} {:>10}".format("example", "instrs", "us.run", "us.step", "ratio"))
+    print_line(width=80)
+
+    for name in examples:
+
+        program_file = example_path(name)
+
+        (time_run_, instructions, _) = time_run(program_file, repeat)
+        time_step = time_steps(program_file, repeat, step)
+
+        print(
+            "{:<12} {:>10} {:>10.1f} {:>10.1f} {:>9.2f}x".format(
+                name,
+                instructions,
+                time_run_ * 1e6,
+                time_step * 1e6,
+                time_step / time_run_,
+            )
+        )
+
+    print()
+
+    return
+
+
+#-----------------------------------------------------------
+
+
+def _python(*args, capture=None):
+    """
+    Run a fresh Python in the project directory; return `(seconds, output)`.
+    """
+
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, *args],
+        cwd=PROJECT_DIR,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        text=True,
+    )
+    elapsed = time.perf_counter() - start
+
+    return (elapsed, result.stderr if capture == "stderr" else result.stdout)
+
+
+def _import_time(module):
+    """
+    Get the cumulative import time of `module` in ms, from `-X importtime`.
+    """
+
+    (_, output) = _python("-X", "importtime", "-c", f"import {module}", capture="stderr")
+
+    for line in output.splitlines():
+        parts = line.split("|")
+        if len(parts) == 3 and parts[2].strip() == module:
+            return int(parts[1]) / 1000
+
+    return float("nan")
+
+
+def bench_startup(repeat):
+    """
+    Measure interpreter startup against the startup budgets.
+    """
+
+    program_file = example_path("print8")
+    script = FIRST_INSTRUCTION_SCRIPT.format(program_file=program_file)
+
+    import_ms = min(_import_time("ls8.ls8") for _ in range(repeat))
+    first_ms = min(float(_python("-c", script)[1]) for _ in range(repeat))
+    # `-m` imports `runpy` (and `collections` with it) before any of ls8 runs,
+    # so that is part of the baseline rather than of the overhead; the two are
+    # timed alternately, so that drift in the machine's load affects both
+    (bare_ms, run_ms) = (float("inf"), float("inf"))
+    for _ in range(repeat):
+        bare_ms = min(bare_ms, _python("-c", "import runpy")[0] * 1000)
+        run_ms = min(run_ms, _python("-m", "ls8.ls8", "-e", "print8")[0] * 1000)
+
+    print_heading("startup", width=80)
+    print("{:<44} {:>10} {:>10} {:>8}".format("measure", "ms", "budget", "status"))
+    print_line(width=80)
+
+    for (measure, value, budget) in (
+        ("import ls8.ls8", import_ms, STARTUP_BUDGET__IMPORT),
+        ("time to first guest instruction", first_ms, STARTUP_BUDGET__FIRST_INSTRUCTION),
+        ("ls8 -e print8, over bare interpreter", run_ms - bare_ms, STARTUP_BUDGET__OVERHEAD),
+    ):
+        status = "ok" if value <= budget else "OVER"
+        print(f"{measure:<44} {value:>10.2f} {budget:>10.2f} {status:>8}")
+
+    print(f"{'(bare interpreter: python -c ' + repr('import runpy') + ')':<44} {bare_ms:>10.2f}")
+
+    if os.environ.get("PYTHONDONTWRITEBYTECODE"):
+        print("note: PYTHONDONTWRITEBYTECODE is set, so every import above is compiled from source")
+
+    print()
+
+    return
+
+
+def bench_serve(repeat, jobs=DEFAULT__SERVE_JOBS):
+    """
+    Compare a fresh `ls8` process per program against jobs sent to a warm
+    `ls8 serve` worker.
+    """
+
+    import tempfile
+
+    from .serve import Client, Server
+
+    program_file = example_path("print8")
+
+    with open(program_file) as file:
+        program = file.read()
+
+    process_ms = min(_python("-m", "ls8.ls8", "-e", "print8")[0] for _ in range(repeat)) * 1000
+
+    with tempfile.TemporaryDirectory() as directory:
+
+        server = Server(os.path.join(directory, "ls8.sock"), workers=1)
+        server.start()
+
+        try:
+            with Client(server.path) as client:
+
+                client.run(ls8=program)
+
+                start = time.perf_counter()
+                for _ in range(jobs):
+                    client.run(ls8=program)
+                job_ms = (time.perf_counter() - start) / jobs * 1000
+
+        finally:
+            server.stop()
+
+    print_heading("serve", width=80)
+    print("{:<44} {:>10}".format("measure", "ms"))
+    print_line(width=80)
+    print(f"{'ls8 -e print8, fresh process':<44} {process_ms:>10.3f}")
+    print(f"{'print8 job to a warm worker (mean of ' + str(jobs) + ')':<44} {job_ms:>10.3f}")
+    print()
+
+    return
+
+
+SMP_SOURCE = """
+    LDI R1,0
+    LDI R2,{loops}
+    LDI R3,Loop
+Loop:
+    DEC R2
+    CMP R2,R1
+    JNE R3
+    HLT
+"""
+
+
+def bench_smp(repeat, loops=DEFAULT__SMP_LOOPS):
+    """
+    Run the same loop on every core of an `smp.Machine`, for 1, 2, 4, ...
+    up to as many cores as the host has, and compare total throughput.
+    """
+
+    from .serve import assemble
+    from .smp import Machine
+
+    source = assemble(SMP_SOURCE.format(loops=loops), 16)
+
+    host_cores = os.cpu_count() or 1
+    counts = sorted({2 ** i for i in range(host_cores.bit_length())} | {host_cores, 2})
+
+    print_heading("smp", width=80)
+    print("{:<12} {:>16} {:>16} {:>16}".format("cores", "instructions", "seconds", "speedup"))
+    print_line(width=80)
+
+    base_rate = None
+
+    for count in counts:
+
+        best = None
+
+        for _ in range(max(repeat // 4, 1)):
+
+            with Machine(count, wide=True) as machine:
+
+                machine.load(io.BytesIO(source.encode()))
+
+                start = time.perf_counter()
+                results = machine.run()
+                elapsed = time.perf_counter() - start
+
+            if best is None or elapsed < best:
+                best = elapsed
+
+        instructions = sum(result.instruction_count for result in results)
+        rate = instructions / best
+
+        if base_rate is None:
+            base_rate = rate
+
+        print(f"{count:<12} {instructions:>16} {best:>16.3f} {rate / base_rate:>15.2f}x")
+
+    print(f"(host cores: {host_cores})")
+    print()
+
+    return
+
+
+CLUSTER_SOURCE = """
+    LDI R0,0xC0
+    LD R1,R0             ; R1: this node
+    INC R0
+    LD R2,R0             ; R2: the number of nodes
+    INC R1
+    MOD R1,R2
+    LDI R0,0xC2
+    ST R0,R1             ; send to the next node
+    LDI R4,{exchanges}
+    LDI R1,0
+Exchange:
+    LDI R3,{work}
+    LDI R0,Work
+Work:
+    DEC R3
+    CMP R3,R1
+    JNE R0
+    LDI R0,0xC6
+    ST R0,R4
+    LDI R0,0xC3
+    LDI R2,1
+    ST R0,R2             ; send 1 word
+    LDI R0,0xC5
+    LDI R2,Poll
+Poll:
+    LD R3,R0
+    CMP R3,R1
+    JEQ R2               ; until a message comes
+    ST R0,R1             ; free the receive buffer
+    DEC R4
+    CMP R4,R1
+    LDI R0,Exchange
+    JNE R0
+    HLT
+"""
+
+
+def bench_cluster(repeat, nodes=DEFAULT__CLUSTER_NODES, latencies=DEFAULT__CLUSTER_LATENCIES):
+    """
+    Run a cluster where every node works, then trades a message with its
+    neighbors, a few times over, for a few link latencies; and compare its
+    throughput with one CPU running the same kind of loop on its own.
+    """
+
+    from .cluster import Cluster
+    from .cpu import WideCPU
+    from .serve import assemble
+
+    source = assemble(CLUSTER_SOURCE.format(exchanges=5, work=100), 16)
+    alone = assemble(SMP_SOURCE.format(loops=DEFAULT__SMP_LOOPS), 16)
+
+    cpu = WideCPU()
+    cpu.load(io.BytesIO(alone.encode()))
+    result = cpu.run()
+    base_rate = result.instruction_count / result.elapsed
+
+    print_heading("cluster", width=80)
+    print("{:<12} {:>10} {:>10} {:>14} {:>14} {:>14}".format(
+        "latency",
+        "rounds",
+        "messages",
+        "instructions",
+        "seconds",
+        "vs one CPU",
+    ))
+    print_line(width=80)
+
+    for latency in latencies:
+
+        best = None
+
+        for _ in range(max(repeat // 10, 1)):
+
+            cluster = Cluster(nodes, wide=True, latency=latency, quantum=200)
+            cluster.load(io.BytesIO(source.encode()))
+
+            run = cluster.run()
+
+            if best is None or run.elapsed < best.elapsed:
+                best = run
+
+        rate = best.instruction_count / best.elapsed
+
+        print(
+            f"{latency:<12} {best.rounds:>10} {best.received:>10} {best.instruction_count:>14}"
+            f" {best.elapsed:>14.3f} {rate / base_rate:>13.2f}x"
+        )
+
+    print(f"({nodes} nodes, on {cluster.workers} workers)")
+    print()
+
+    return
+
+
+############################################################
+
+SUITES = ("fusion", "alu", "aot", "memo", "step", "startup", "serve", "smp", "cluster")
+
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(description="Benchmark the LS-8 CPU.")
+    parser.add_argument("examples", nargs="*", default=DEFAULT__EXAMPLES)
+    parser.add_argument("--repeat", type=int, default=DEFAULT__REPEAT)
+    parser.add_argument("--suite", action="append", choices=SUITES)
+    args = parser.parse_args(argv)
+
+    suites = args.suite or SUITES
+
+    if "fusion" in suites:
+        bench_fusion(args.examples, args.repeat)
+
+    if "alu" in suites:
+        bench_alu(args.examples, args.repeat)
+
+    if "aot" in suites:
+        bench_aot(args.examples, args.repeat)
+
+    if "memo" in suites:
+        bench_memo(args.examples, args.repeat)
+
+    if "step" in suites:
+        bench_step(args.examples, args.repeat)
+
+    if "startup" in suites:
+        bench_startup(args.repeat)
+
+    if "serve" in suites:
+        bench_serve(args.repeat)
+
+    if "smp" in suites:
+        bench_smp(args.repeat)
+
+    if "cluster" in suites:
+        bench_cluster(args.repeat)
+
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,302 @@
+"""
+Cache the results of deterministic program runs on disk.
+
+With no devices mapped, a run is a pure function of the memory image, the
+initial state and the instruction limit. `ResultCache.run` looks such a run
+up by `(image hash, state hash)`, and replays a hit: its output and the
+errors the CPU reported are printed again, and the CPU takes its final state
+and instruction and dispatch counts. On a miss it runs
+the CPU and stores the result, as long as the run wrote neither IM nor IS
+(so no `INT`, and no unmasking), ran out of neither wall time nor output
+room, and raised nothing.
+
+Anything that could make a run differ (devices, hooks, watchpoints,
+breakpoints, debug output) bypasses the cache. The cache holds at most
+`max_entries` runs, one file each; hits refresh a file's time, and the
+least recently used files go first.
+"""
+
+############################################################
+
+import base64
+import hashlib
+import io
+import json
+import os
+import sys
+import time
+import zlib
+
+from .cpu__results import ProcessorRunResult, REASON__WALL_TIMEOUT
+
+############################################################
+
+VERSION = 2
+
+DEFAULT__DIRECTORY = os.path.join(
+    os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache"),
+    "ls8",
+    "results",
+)
+DEFAULT__MAX_ENTRIES = 1024
+
+MAX_OUTPUT = 1 << 20    # characters; runs that print more are not cached
+
+ENTRY_EXTENSION = ".json"
+
+############################################################
+
+
+def cacheable(cpu):
+    """
+    Whether a run of `cpu` can only depend on its memory and state.
+    """
+
+    return not (cpu.debug or cpu.devices or cpu.hooks is not None or cpu.watches or cpu.breakpoints)
+
+
+def memory_bytes(cpu):
+
+    if cpu.MEMORY_TYPECODE is None:
+        return bytes(cpu.memory)
+
+    return cpu.memory.tobytes()
+
+
+class TeeOutput:
+    """
+    Print to `output` (or, if it is `None`, to `default`) and keep up to
+    `MAX_OUTPUT` characters of what was printed.
+    """
+
+    def __init__(self, output, default=sys.stdout):
+
+        self.output = output
+        self.default = default
+        self.kept = io.StringIO()
+        self.overflowed = False
+
+        return
+
+    def __str__(self):
+
+        return str(self.__dict__)
+
+    def write(self, text):
+
+        (self.output or self.default).write(text)
+
+        if not self.overflowed:
+            if self.kept.tell() + len(text) > MAX_OUTPUT:
+                self.overflowed = True
+            else:
+                self.kept.write(text)
+
+        return len(text)
+
+
+############################################################
+
+
+class ResultCache:
+
+    def __init__(self, directory=DEFAULT__DIRECTORY, max_entries=DEFAULT__MAX_ENTRIES):
+
+        self.directory = directory
+        self.max_entries = max_entries
+
+        self.hits = 0
+        self.misses = 0
+
+        return
+
+    def __str__(self):
+
+        return str(self.__dict__)
+
+    #-----------------------------------------------------------
+
+    def key(self, cpu, max_instructions):
+        """
+        Get `IMAGE-STATE`: hashes of the memory, and of everything else a
+        run depends on.
+        """
+
+        image = hashlib.sha256(memory_bytes(cpu)).hexdigest()
+
+        state = hashlib.sha256(
+            json.dumps([
+                VERSION,
+                cpu.CONSTANTS.BIT_COUNT,
+                cpu.fuse,
+                cpu.memoize,
+                cpu.register,
+                cpu.flags,
+                cpu.program_pointer,
+                cpu.interrupts_enabled,
+                max_instructions,
+            ]).encode()
+        ).hexdigest()
+
+        return f"{image[:32]}-{state[:16]}"
+
+    def path(self, key):
+
+        return os.path.join(self.directory, key + ENTRY_EXTENSION)
+
+    def get(self, key):
+
+        path = self.path(key)
+
+        try:
+            with open(path) as file:
+                entry = json.load(file)
+            os.utime(path)
+        except (OSError, ValueError):
+            return None
+
+        return entry
+
+    def put(self, key, entry):
+
+        os.makedirs(self.directory, exist_ok=True)
+
+        # write then rename, so that readers never see half an entry
+        path = self.path(key)
+        temporary = f"{path}.{os.getpid()}.tmp"
+
+        with open(temporary, "w") as file:
+            json.dump(entry, file, separators=(",", ":"))
+
+        os.replace(temporary, path)
+
+        self.evict()
+
+        return
+
+    def evict(self):
+        """
+        Remove the least recently used entries past `max_entries`.
+        """
+
+        entries = []
+
+        for name in os.listdir(self.directory):
+            if name.endswith(ENTRY_EXTENSION):
+                path = os.path.join(self.directory, name)
+                try:
+                    entries.append((os.stat(path).st_mtime, path))
+                except OSError:
+                    pass
+
+        entries.sort()
+
+        for (_, path) in entries[:max(len(entries) - self.max_entries, 0)]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+        return
+
+    #-----------------------------------------------------------
+
+    def run(self, cpu, max_instructions=None, wall_timeout=None, capture_output=False):
+        """
+        Like `cpu.run`, but from the cache when the run is deterministic.
+        """
+
+        if not cacheable(cpu):
+            return cpu.run(max_instructions, wall_timeout=wall_timeout, capture_output=capture_output)
+
+        key = self.key(cpu, max_instructions)
+        entry = self.get(key)
+
+        if entry is not None:
+            self.hits += 1
+            return self.replay(cpu, entry, capture_output)
+
+        self.misses += 1
+
+        interrupt_register_writes = cpu.interrupt_register_writes
+
+        (output, errors) = (cpu.output, cpu.errors)
+        tee = cpu.output = TeeOutput(io.StringIO() if capture_output else output)
+        tee_errors = cpu.errors = TeeOutput(io.StringIO() if capture_output else errors, sys.stderr)
+
+        try:
+            result = cpu.run(max_instructions, wall_timeout=wall_timeout)
+        finally:
+            (cpu.output, cpu.errors) = (output, errors)
+
+        if capture_output:
+            result.output = tee.output.getvalue()
+            result.errors = tee_errors.output.getvalue()
+
+        overflowed = tee.overflowed or tee_errors.overflowed
+        timed_out = result.reason == REASON__WALL_TIMEOUT
+        touched_interrupts = cpu.interrupt_register_writes != interrupt_register_writes
+
+        if not (overflowed or timed_out or touched_interrupts):
+            self.put(key, self.entry(cpu, result, tee.kept.getvalue(), tee_errors.kept.getvalue()))
+
+        return result
+
+    def entry(self, cpu, result, output, errors):
+
+        return {
+            "reason": result.reason,
+            "halted": cpu.halted,
+            "output": output,
+            "errors": errors,
+            "instructions": result.instruction_count,
+            "dispatches": result.dispatch_count,
+            "program_pointer": cpu.program_pointer,
+            "register": list(cpu.register),
+            "flags": cpu.flags,
+            "interrupts_enabled": cpu.interrupts_enabled,
+            "memory": base64.b64encode(zlib.compress(memory_bytes(cpu))).decode(),
+            "output_bytes": len(output.encode("utf-8", "surrogatepass")),
+        }
+
+    def replay(self, cpu, entry, capture_output):
+        """
+        Give `cpu` the final state in `entry`, print its output and errors,
+        and get a result as `cpu.run` would have.
+        """
+
+        started = time.perf_counter()
+
+        words = zlib.decompress(base64.b64decode(entry["memory"]))
+
+        if cpu.MEMORY_TYPECODE is None:
+            cpu.memory[:] = list(words)
+        else:
+            cpu.memory[:] = type(cpu.memory)(cpu.MEMORY_TYPECODE, words)
+
+        cpu.predecode()
+
+        cpu.register[:] = entry["register"]
+        cpu.flags = entry["flags"]
+        cpu.program_pointer = entry["program_pointer"]
+        cpu.interrupts_enabled = entry["interrupts_enabled"]
+
+        cpu.halted = entry["halted"]
+        cpu.halt_reason = entry["reason"] if cpu.halted else None
+        cpu.instruction_count += entry["instructions"]
+        cpu.dispatch_count += entry["dispatches"]
+        cpu.output_bytes += entry["output_bytes"]
+
+        if not capture_output:
+            (cpu.output or sys.stdout).write(entry["output"])
+            (cpu.errors or sys.stderr).write(entry["errors"])
+
+        return ProcessorRunResult(
+            cpu,
+            entry["reason"],
+            entry["instructions"],
+            entry["dispatches"],
+            time.perf_counter() - started,
+            entry["output"] if capture_output else None,
+            entry["errors"] if capture_output else None,
+        )
@@ -0,0 +1,571 @@
+#!/usr/bin/env python3
+"""
+Simulate a cluster of LS-8 nodes that pass messages over a network.
+
+Every node is a CPU of its own, running the same program, with a
+`devices.NetworkDevice` mapped at `network_start`: the program tells nodes
+apart by the node ID there, fills its send buffer and writes NET_SEND to
+send, and takes messages from its receive buffer, on the network interrupt
+(2) or by polling NET_RECV.
+
+Nodes are spread over host worker processes, many nodes per worker. Time
+goes in rounds: in each round, every node that has not halted runs
+`quantum` instructions. A message sent in round `r` is delivered at the
+start of round `r + latency`, so no message sent within `latency` rounds
+can arrive within them: workers run `latency` rounds on their own, then
+trade every message they sent to other workers' nodes in one exchange,
+split into batches of `batch_size` messages per pipe write. The higher the
+latency, the fewer exchanges; the host pays per exchange, not per message.
+
+Messages due in the same round are delivered in order of their source node
+(then in the order sent), and each node's messages reach it only between
+rounds, so a run is the same whatever the number of workers.
+
+The run ends when every node has halted, or after `max_rounds` rounds.
+Messages to halted nodes are dropped. A node that sends to a node that does
+not exist halts, with `REASON__SEND_FAILED` and an error.
+
+Usage: python -m ls8.ls8 cluster (PROGRAM | --example NAME) --nodes N [--workers N] [--latency ROUNDS]
+                                 [--batch-size N] [--quantum N] [--max-rounds N] [--wide] [--format FORMAT]
+"""
+
+############################################################
+
+import argparse
+import heapq
+import io
+import multiprocessing
+import os
+import sys
+import time
+
+from .cpu import CPU, WideCPU
+from .devices import NetworkDevice
+from .loader import FORMATS, ProgramReader, open_program
+
+############################################################
+
+DEFAULT__WORKERS = os.cpu_count() or 1
+DEFAULT__LATENCY = 4    # rounds
+DEFAULT__BATCH_SIZE = 4096    # messages per pipe write
+DEFAULT__QUANTUM = 1000    # instructions per node per round
+DEFAULT__MAX_ROUNDS = 100_000
+
+DEFAULT__NETWORK_START = 0xC0
+DEFAULT__BUFFER_SIZE = 8    # words
+
+EXAMPLES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "examples")
+EXAMPLES_EXT = ".ls8"
+
+############################################################
+#   NODES
+############################################################
+
+
+class Node:
+    """
+    A CPU with a network device, and the messages on their way to it, as
+    `(round due, source, number, words)` in a heap.
+    """
+
+    def __init__(self, node_id, cluster):
+
+        self.node_id = node_id
+
+        self.cpu = cluster.cpu_class(fuse=cluster.fuse, table_alu=cluster.table_alu)
+        self.cpu.output = io.StringIO()
+        self.cpu.errors = io.StringIO()
+
+        for (address, words) in cluster.program:
+            self.cpu.load_words(words, address)
+
+        self.cpu.program_pointer = cluster.start
+
+        self.device = NetworkDevice(node_id, len(cluster), cluster.network_start, cluster.buffer_size)
+        self.cpu.map_device(self.device)
+
+        self.pending = []
+
+        return
+
+    def __str__(self):
+
+        return str(self.__dict__)
+
+
+class NodeResult:
+
+    def __init__(self, node):
+
+        cpu = node.cpu
+
+        self.node_id = node.node_id
+
+        self.halted = cpu.halted
+        self.reason = cpu.halt_reason
+        self.output = cpu.output.getvalue()
+        self.errors = cpu.errors.getvalue()
+
+        self.instruction_count = cpu.instruction_count
+        self.program_pointer = cpu.program_pointer
+        self.register = list(cpu.register)
+        self.flags = cpu.flags
+
+        self.sent = node.device.sent
+        self.received = node.device.received
+
+        return
+
+    def __str__(self):
+
+        return str(self.__dict__)
+
+
+class ClusterRunResult:
+
+    def __init__(self, nodes, rounds, elapsed):
+
+        self.nodes = nodes
+        self.rounds = rounds
+        self.elapsed = elapsed
+
+        self.instruction_count = sum(node.instruction_count for node in nodes)
+        self.sent = sum(node.sent for node in nodes)
+        self.received = sum(node.received for node in nodes)
+
+        return
+
+    def __str__(self):
+
+        return str(self.__dict__)
+
+
+############################################################
+#   WORKERS
+############################################################
+
+
+class ClusterWorker:
+    """
+    Runs the nodes `worker_index`, `worker_index + workers`, ... of a
+    cluster, in the process forked for it.
+    """
+
+    def __init__(self, cluster, worker_index):
+
+        self.cluster = cluster
+        self.worker_index = worker_index
+        self.workers = cluster.workers
+
+        self.nodes = {}    # node ID: Node
+
+        return
+
+    def __str__(self):
+
+        return str(self.__dict__)
+
+    def serve(self, connection):
+        """
+        Run epochs of `latency` rounds, trading messages with the cluster
+        after each, until it says to stop; then send back the results.
+        """
+
+        try:
+
+            cluster = self.cluster
+
+            self.nodes = {
+                node_id: Node(node_id, cluster)
+                for node_id in range(self.worker_index, len(cluster), self.workers)
+            }
+
+            first_round = 0
+
+            while True:
+
+                rounds = min(cluster.latency, cluster.max_rounds - first_round)
+                outgoing = self.run_rounds(first_round, rounds)
+                first_round += rounds
+
+                for (worker_index, messages) in enumerate(outgoing):
+                    send_batches(connection, worker_index, messages, cluster.batch_size)
+
+                active = sum(1 for node in self.nodes.values() if not node.cpu.halted)
+                connection.send(("epoch", active))
+
+                while True:
+
+                    (kind, value) = connection.recv()
+
+                    if kind != "messages":
+                        break
+
+                    self.accept(value[1])
+
+                if not value:
+                    break
+
+            connection.send(("results", [NodeResult(node) for node in self.nodes.values()]))
+
+        except Exception as exception:
+            connection.send(("error", exception))
+
+        connection.close()
+
+        return
+
+    def run_rounds(self, first_round, rounds):
+        """
+        Run `rounds` rounds from `first_round`. Delivers messages between
+        this worker's own nodes, and gets the ones for each other worker.
+        """
+
+        cluster = self.cluster
+
+        (quantum, latency) = (cluster.quantum, cluster.latency)
+
+        outgoing = [[] for _ in range(self.workers)]
+        local = outgoing[self.worker_index]
+
+        for round_ in range(first_round, first_round + rounds):
+
+            active = [node for node in self.nodes.values() if not node.cpu.halted]
+
+            if not active:
+                break
+
+            due = round_ + latency
+
+            for node in active:
+
+                (cpu, device, pending) = (node.cpu, node.device, node.pending)
+
+                while pending and pending[0][0] <= round_:
+                    (_, source, _, words) = heapq.heappop(pending)
+                    device.receive(source, words)
+
+                cpu.run(quantum)
+
+                if device.outbox:
+
+                    number = device.sent - len(device.outbox)
+
+                    for (destination, words) in device.outbox:
+                        outgoing[destination % self.workers].append((due, destination, node.node_id, number, words))
+                        number += 1
+
+                    device.outbox.clear()
+
+            if local:
+                self.accept(local)
+                local.clear()
+
+        return outgoing
+
+    def accept(self, messages):
+        """
+        Queue `messages` for the nodes they are sent to.
+        """
+
+        nodes = self.nodes
+
+        for (due, destination, source, number, words) in messages:
+
+            node = nodes[destination]
+
+            if not node.cpu.halted:
+                heapq.heappush(node.pending, (due, source, number, words))
+
+        return
+
+
+def send_batches(connection, worker_index, messages, batch_size):
+
+    for start in range(0, len(messages), batch_size):
+        connection.send(("messages", (worker_index, messages[start:start + batch_size])))
+
+    return
+
+
+############################################################
+#   CLUSTER
+############################################################
+
+
+class Cluster:
+
+    def __init__(
+        self,
+        nodes,
+        workers=DEFAULT__WORKERS,
+        wide=False,
+        latency=DEFAULT__LATENCY,
+        batch_size=DEFAULT__BATCH_SIZE,
+        quantum=DEFAULT__QUANTUM,
+        network_start=DEFAULT__NETWORK_START,
+        buffer_size=DEFAULT__BUFFER_SIZE,
+        fuse=True,
+        table_alu=False,
+    ):
+
+        self.cpu_class = WideCPU if wide else CPU
+        self.constants = self.cpu_class.CONSTANTS
+
+        # NET_NODES holds the number of nodes in a word
+        if not 1 <= nodes < self.constants.WORD_SIZE:
+            raise ValueError(f"a cluster has 1 to {self.constants.WORD_SIZE - 1} nodes, not {nodes}")
+
+        if workers < 1:
+            raise ValueError(f"a cluster has at least 1 worker, not {workers}")
+
+        if latency < 1 or batch_size < 1 or quantum < 1:
+            raise ValueError("latency, batch size and quantum are at least 1")
+
+        if network_start + NetworkDevice.CONTROL_SIZE + 2 * buffer_size > self.constants.ADDRESS_OF_KEY_PRESSED:
+            raise ValueError(f"the network device does not fit below {self.constants.ADDRESS_OF_KEY_PRESSED:#x}")
+
+        self.node_count = nodes
+        self.workers = min(workers, nodes)
+        self.latency = latency
+        self.batch_size = batch_size
+        self.quantum = quantum
+        self.network_start = network_start
+        self.buffer_size = buffer_size
+        self.fuse = fuse
+        self.table_alu = table_alu
+
+        self.program = []    # [(address, words)]
+        self.start = 0
+        self.max_rounds = DEFAULT__MAX_ROUNDS
+
+        self.context = multiprocessing.get_context("fork")
+
+        return
+
+    def __str__(self):
+
+        return str(self.__dict__)
+
+    def __len__(self):
+
+        return self.node_count
+
+    #-----------------------------------------------------------
+
+    def load(self, program, format=None):
+        """
+        Read the program every node runs, from a path (`-` for stdin) or a
+        binary stream, in any format `loader` reads.
+        """
+
+        reader = ProgramReader(self.constants, format)
+
+        with open_program(program) as stream:
+            self.program = [(address, list(words)) for (address, words) in reader.read(stream)]
+
+        self.start = reader.start or 0
+
+        return
+
+    def load_words(self, words, start=0):
+        """
+        Like `load`, for words.
+        """
+
+        self.program = [(start, list(words))]
+        self.start = 0
+
+        return
+
+    def run(self, max_rounds=DEFAULT__MAX_ROUNDS):
+        """
+        Boot every node and run them until all halt, or for `max_rounds`
+        rounds. Gets a `ClusterRunResult`, with a `NodeResult` per node.
+        """
+
+        self.max_rounds = max_rounds
+
+        # the workers' CPUs are built after the fork, but from warm tables
+        self.cpu_class.dispatch_tables()
+
+        sys.stdout.flush()
+        sys.stderr.flush()
+
+        started = time.perf_counter()
+
+        runs = []
+
+        for worker_index in range(self.workers):
+
+            (connection, worker_connection) = self.context.Pipe()
+
+            process = self.context.Process(
+                target=ClusterWorker(self, worker_index).serve,
+                args=(worker_connection, ),
+                daemon=True,
+            )
+            process.start()
+
+            worker_connection.close()
+
+            runs.append((process, connection))
+
+        try:
+            (nodes, rounds) = self.exchange([connection for (_, connection) in runs])
+        finally:
+            for (process, connection) in runs:
+                connection.close()
+                process.join()
+
+        nodes.sort(key=lambda node: node.node_id)
+
+        return ClusterRunResult(nodes, rounds, time.perf_counter() - started)
+
+    def exchange(self, connections):
+        """
+        Carry the messages between workers after each epoch, and tell them
+        whether to go on. Gets the node results, and the rounds run.
+        """
+
+        rounds = 0
+
+        while True:
+
+            incoming = [[] for _ in connections]
+            active = 0
+
+            for connection in connections:
+
+                while True:
+
+                    (kind, value) = receive(connection)
+
+                    if kind != "messages":
+                        break
+
+                    (worker_index, messages) = value
+                    incoming[worker_index].extend(messages)
+
+                active += value
+
+            rounds = min(rounds + self.latency, self.max_rounds)
+            go = bool(active) and rounds < self.max_rounds
+
+            for (connection, messages) in zip(connections, incoming):
+                send_batches(connection, None, messages, self.batch_size)
+                connection.send(("go", go))
+
+            if not go:
+                break
+
+        nodes = []
+
+        for connection in connections:
+            (kind, value) = receive(connection)
+            nodes.extend(value)
+
+        return (nodes, rounds)
+
+
+def receive(connection):
+
+    try:
+        (kind, value) = connection.recv()
+    except EOFError:
+        raise RuntimeError("a cluster worker died") from None
+
+    if kind == "error":
+        raise value
+
+    return (kind, value)
+
+
+############################################################
+#   MAIN
+############################################################
+
+
+def parse_commandline(argv):
+
+    parser = argparse.ArgumentParser(prog="ls8 cluster", description="Simulate a cluster of LS-8 nodes.")
+
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("program", nargs="?", help="program every node runs (`-` for stdin)")
+    source.add_argument("-e", "--example", help="name of a program in `ls8/examples`")
+
+    parser.add_argument("--nodes", type=int, required=True, help="number of nodes, each running the program")
+    parser.add_argument("--workers", type=int, default=DEFAULT__WORKERS, help="processes the nodes are shared between")
+    parser.add_argument(
+        "--latency",
+        type=int,
+        default=DEFAULT__LATENCY,
+        metavar="ROUNDS",
+        help="rounds a message takes to reach its node",
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=DEFAULT__BATCH_SIZE,
+        help="messages per write to a worker's pipe",
+    )
+    parser.add_argument("--quantum", type=int, default=DEFAULT__QUANTUM, help="instructions per node per round")
+    parser.add_argument(
+        "--max-rounds",
+        type=int,
+        default=DEFAULT__MAX_ROUNDS,
+        help="rounds to run at most, if some node never halts",
+    )
+    parser.add_argument("--wide", action="store_true", help="run the nodes on the 16-bit CPU")
+    parser.add_argument(
+        "--format",
+        choices=FORMATS,
+        help="the program's format: `.ls8` text, hex text, Intel HEX or raw bytes (default: detected)",
+    )
+
+    return parser.parse_args(argv[1:])
+
+
+def main(argv):
+
+    args = parse_commandline(argv)
+
+    try:
+        cluster = Cluster(
+            args.nodes,
+            workers=args.workers,
+            wide=args.wide,
+            latency=args.latency,
+            batch_size=args.batch_size,
+            quantum=args.quantum,
+        )
+        if args.example is not None:
+            cluster.load(os.path.join(EXAMPLES_DIR, args.example + EXAMPLES_EXT), args.format)
+        else:
+            cluster.load(args.program, args.format)
+    except (OSError, ValueError) as exception:
+        print(f"error: {exception}", file=sys.stderr)
+        return 2
+
+    result = cluster.run(args.max_rounds)
+
+    for node in result.nodes:
+        for line in node.output.splitlines():
+            print(f"node {node.node_id}: {line}")
+        for line in node.errors.splitlines():
+            print(f"node {node.node_id}: {line}", file=sys.stderr)
+
+    halted = sum(1 for node in result.nodes if node.halted)
+
+    print(
+        f"{len(result.nodes)} nodes ({halted} halted) on {cluster.workers} workers, "
+        f"{result.rounds} rounds, {result.instruction_count} instructions, "
+        f"{result.received}/{result.sent} messages delivered, {result.elapsed:.3f} s",
+        file=sys.stderr,
+    )
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
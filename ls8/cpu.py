@@ -2,16 +2,35 @@
 
 ############################################################
 
-from tools.printers import (
-    print_on,
-    print_dent,
-    print_line,
-    print_heading,
-)
+import io
+import sys
+import time
+
+# `tools.printers` is only needed for debug output, so it is imported where
+# it is used rather than here, to keep startup fast.
 
 from .cpu__constants import ProcessorConstants
 from .cpu__masks import ProcessorMasks
 from .cpu__operations import ProcessorOperations
+from .cpu__fusions import ProcessorFusions
+from .cpu__watch import (
+    WATCH__READ,
+    WATCH__WRITE,
+    ProcessorWatchpoint,
+    ProcessorWatchHit,
+)
+from .cpu__results import (
+    ProcessorRunResult,
+    REASON__HALTED,
+    REASON__UNKNOWN_OPERATION,
+    REASON__DIVIDE_BY_ZERO,
+    REASON__MAX_INSTRUCTIONS,
+    REASON__UNTIL_PC,
+    REASON__WALL_TIMEOUT,
+    REASON__WATCHPOINT,
+    REASON__BREAKPOINT,
+)
+from .loader import ProgramReader, open_program
 
 ############################################################
 #   CPU
@@ -28,252 +47,1616 @@ class CPU:
     CONSTANTS = ProcessorConstants(8)
     MASKS = ProcessorMasks(CONSTANTS)
     OPERATIONS = ProcessorOperations(CONSTANTS, MASKS)
+    FUSIONS = ProcessorFusions(CONSTANTS, OPERATIONS)
+
+    # `None` for list-backed memory, or an `array` typecode
+    MEMORY_TYPECODE = None
+
+    # per-page flags: writes to a flagged page take the slow path
+    PAGE_FLAG__FUSED = 0b01    # holds fused pairs, which must be re-predecoded
+    PAGE_FLAG__DEVICE = 0b10    # holds device addresses
+    PAGE_FLAG__MEMO = 0b100    # holds memoized subroutines, whose records must be dropped
+    PAGE_FLAG__WATCH = 0b1000    # holds addresses watched for writes
+    PAGE_FLAG__BREAKPOINT = 0b10000    # holds breakpoints, whose original words writes replace
+
+    # writing either of these registers may leave an interrupt to service,
+    # so the handlers writing a register operand check for them
+    INTERRUPT_REGISTERS = (
+        CONSTANTS.REGISTER_OF_INTERRUPT_MASK,
+        CONSTANTS.REGISTER_OF_INTERRUPT_STATUS,
+    )
+
+    # a `fused` kind that no fusion uses, marking `until_pc` for `run_fast`
+    FUSED__UNTIL_PC = 255
+
+    # the reserved opcode patched over breakpoints; not an operation
+    CODE_OF_BREAKPOINT = 0b00000011
+
+    # how many instructions `run` lets `run_fast` go between checking limits
+    RUN__CHECK_INTERVAL = 1 << 16
 
     #-----------------------------------------------------------
 
-    def __init__(self, debug=False):
+    def __init__(self, debug=False, fuse=True, table_alu=False, memoize=False):
         """
         Construct a new CPU.
+        With `memoize`, calls to pure subroutines are memoized (see `cpu__memo`).
         """
 
         self.debug = debug
+        self.fuse = fuse
+        self.table_alu = table_alu
+        self.memoize = memoize
+
+        # which core of a machine this is (see `smp`), for `CID`
+        self.core_id = 0
+
+        self.register = [0] * self.CONSTANTS.REGISTER_COUNT
+        self.memory = self.new_memory()
+
+        self.dirty_pages = bytearray(self.CONSTANTS.PAGE_COUNT)
+
+        self.fused = bytearray(self.CONSTANTS.WORD_SIZE)
+
+        self.page_flags = bytearray(self.CONSTANTS.PAGE_COUNT)
+        self.page_devices = [None] * self.CONSTANTS.PAGE_COUNT
+        self.page_watches = [None] * self.CONSTANTS.PAGE_COUNT
+
+        (self.handlers, self.advances, self.fused_handlers) = self.dispatch_tables(table_alu, memoize)
 
-        self.register = [0] * CPU.CONSTANTS.BIT_COUNT
-        self.memory = [0] * CPU.CONSTANTS.WORD_SIZE
+        self.reset()
+
+        return
+
+    def reset(self):
+        """
+        Put the CPU back as it was constructed, in place: its memory and
+        tables are cleared and kept, rather than built again. Devices are
+        unmapped; hooks, watchpoints, breakpoints and the source map are
+        dropped.
+        """
+
+        for device in list(getattr(self, "devices", ())):
+            self.unmap_device(device)
+
+        self.register[:] = [0] * self.CONSTANTS.REGISTER_COUNT
+        self.memory[:] = self.new_memory()
         self.flags = 0
 
+        self.dirty_pages[:] = bytes(self.CONSTANTS.PAGE_COUNT)
+
+        # no fusion starts in zeroed memory
+        self.fused[:] = bytes(self.CONSTANTS.WORD_SIZE)
+
+        self.page_flags[:] = bytes(self.CONSTANTS.PAGE_COUNT)
+        self.page_devices[:] = [None] * self.CONSTANTS.PAGE_COUNT
+        self.devices = []
+
+        # a `ProcessorHooks` while any hook is registered
+        self.hooks = None
+
+        self.page_watches[:] = [None] * self.CONSTANTS.PAGE_COUNT
+        self.watches = []
+
+        # the `ProcessorWatchHit` that stopped the run, if any
+        self.watch_hit = None
+
+        # address: the original word patched over by `CODE_OF_BREAKPOINT`
+        self.breakpoints = {}
+
+        # the breakpoint the CPU stopped at, which resuming runs over once
+        self.step_over = None
+
+        # why the run loop was asked to return, short of halting
+        self.pause_reason = None
+
+        self.update_memory_path()
+
         self.program_pointer = 0
-        self.stack_pointer = 0xF4
+        self.stack_pointer = self.CONSTANTS.ADDRESS_OF_STACK_START
+
+        self.interrupts_enabled = True
 
         self.should_continue = False
+        self.halted = False
+        self.halt_reason = None
+
+        self.until_pc = None
+
+        # the `instruction_count` at which `run` stops, while it runs
+        self.stop_count = None
+
+        # where `PRN` and `PRA` print; `None` is stdout
+        self.output = None
+
+        # where the CPU reports errors, like a division by zero; `None` is stderr
+        self.errors = None
+
+        # a `SourceMap` of the loaded program, for naming addresses in reports
+        self.source_map = None
+
+        self.instruction_count = 0
+        self.dispatch_count = 0
+
+        # cheap counters for `metrics`, kept by the cold operations only
+        self.branch_count = 0    # taken jumps
+        self.call_depth = 0
+        self.max_call_depth = 0
+        self.interrupt_count = 0    # interrupts serviced
+        self.interrupt_latency = 0.0    # seconds from `raise_interrupt` to service, in total
+        self.max_interrupt_latency = 0.0
+        self.output_bytes = 0
+
+        # writes to IM or IS (by the program, `INT`, `IRET` or a device), so
+        # `cache` can tell the runs that touch interrupts
+        self.interrupt_register_writes = 0
+
+        # when each pending interrupt was raised, if by `raise_interrupt`
+        self.interrupt_raised_at = [None] * self.CONSTANTS.INTERRUPT_COUNT
+
+        # interrupts raised by `raise_interrupt` but not yet set in IS
+        self.interrupts_raised = bytearray(self.CONSTANTS.INTERRUPT_COUNT)
+
+        self.memo = None
+
+        if self.memoize:
+            from .cpu__memo import ProcessorMemo
+            self.memo = ProcessorMemo(self)
+
+        return
+
+    @classmethod
+    def new_memory(cls):
+        """
+        Make a zeroed memory of `WORD_SIZE` words.
+        """
+
+        if cls.MEMORY_TYPECODE is None:
+            return [0] * cls.CONSTANTS.WORD_SIZE
+
+        from array import array
+
+        # from zeroed bytes, which is much faster than from a list of words
+        return array(cls.MEMORY_TYPECODE, bytes(cls.CONSTANTS.WORD_SIZE * array(cls.MEMORY_TYPECODE).itemsize))
+
+    @classmethod
+    def memory_words(cls, words):
+        """
+        Convert the list `words` to the type of `new_memory`, for slice
+        assignment into the memory.
+        """
+
+        if cls.MEMORY_TYPECODE is None:
+            return words
+
+        # imported here: only `array`-backed memory needs it, and importing it
+        # at startup is a noticeable share of the startup budget
+        from array import array
+
+        return array(cls.MEMORY_TYPECODE, words)
+
+    @classmethod
+    def alu(cls):
+        """
+        Get the table-driven ALU, made once per class on first use.
+        Raises `ValueError` if the word is too wide for ALU tables.
+        """
+
+        alu = cls.__dict__.get("_alu")
+
+        if alu is None:
+
+            from .cpu__alu import ProcessorALU
+
+            alu = ProcessorALU(cls.CONSTANTS, cls.MASKS, cls.OPERATIONS)
+            cls._alu = alu
+
+        return alu
+
+    @classmethod
+    def dispatch_tables(cls, table_alu=False, memoize=False):
+        """
+        Get the word-indexed dispatch tables used by `run`, built once per class
+        and shared by its instances: `(handlers, advances, fused_handlers)`.
+        Handlers are plain functions, called with the CPU. Unknown or
+        unimplemented operations dispatch to `UNKNOWN_OPERATION`. With
+        `table_alu`, ALU operations dispatch to the handlers of `alu()`.
+        With `memoize`, `CALL` dispatches to the CPU's `memo`.
+        """
+
+        cache = cls.__dict__.get("_dispatch_tables")
+
+        if cache is None:
+            cache = cls._dispatch_tables = {}
+
+        tables = cache.get((table_alu, memoize))
+
+        if tables is not None:
+            return tables
+
+        handlers = [cls.UNKNOWN_OPERATION] * cls.CONSTANTS.WORD_SIZE
+        advances = bytearray(cls.CONSTANTS.WORD_SIZE)
+
+        for code in cls.OPERATIONS:
+
+            operation_fun = getattr(cls, cls.OPERATIONS.NAME[code], None)
+
+            if operation_fun:
+                handlers[code] = operation_fun
+                if not cls.OPERATIONS.SETS_POINTER[code]:
+                    advances[code] = cls.OPERATIONS.WIDTH[code]
+
+        if table_alu:
+            for (code, operation_fun) in cls.alu().handlers().items():
+                handlers[code] = operation_fun
+
+        handlers[cls.CODE_OF_BREAKPOINT] = cls.BREAKPOINT
+
+        if memoize:
+            from .cpu__memo import call_handler
+            handlers[cls.OPERATIONS.CODES["CALL"]] = call_handler
+
+        fused_handlers = [None]
+
+        for kind in range(1, len(cls.FUSIONS)):
+
+            fusion = cls.FUSIONS[kind]
+
+            leader_fun = handlers[fusion["leader"]]
+            follower_fun = handlers[fusion["follower"]]
+
+            plain = (
+                getattr(cls, cls.OPERATIONS.NAME[fusion["leader"]]),
+                getattr(cls, cls.OPERATIONS.NAME[fusion["follower"]]),
+            )
+
+            if (leader_fun, follower_fun) == plain:
+                fused_handlers.append(cls.FUSIONS.handler(kind, cls.MASKS))
+            else:
+                fused_handlers.append(cls.fused_pair(leader_fun, fusion["leader_width"], follower_fun))
+
+        tables = (tuple(handlers), bytes(advances), tuple(fused_handlers))
+        cache[(table_alu, memoize)] = tables
+
+        return tables
+
+    @staticmethod
+    def fused_pair(leader_fun, leader_width, follower_fun):
+        """
+        Get a fused handler that runs `leader_fun`, steps over it, then runs
+        `follower_fun`. Used where the table ALU or memoization replaces a
+        handler that the fused handlers of `FUSIONS` would bypass.
+        """
+
+        def fused_handler(cpu):
+
+            pp = cpu.program_pointer
+
+            leader_fun(cpu)
+            cpu.program_pointer = pp + leader_width
+            follower_fun(cpu)
+
+            return
+
+        return fused_handler
+
+    #-----------------------------------------------------------
+
+    @property
+    def stack_pointer(self):
+        return self.register[self.CONSTANTS.REGISTER_OF_STACK_POINTER]
+
+    @stack_pointer.setter
+    def stack_pointer(self, value):
+        self.register[self.CONSTANTS.REGISTER_OF_STACK_POINTER] = self.MASKS.word_mask(value)
+        return
+
+    @property
+    def interrupt_status(self):
+        return self.register[self.CONSTANTS.REGISTER_OF_INTERRUPT_STATUS]
+
+    @interrupt_status.setter
+    def interrupt_status(self, value):
+        self.register[self.CONSTANTS.REGISTER_OF_INTERRUPT_STATUS] = value
+        return
+
+    @property
+    def interrupt_mask(self):
+        return self.register[self.CONSTANTS.REGISTER_OF_INTERRUPT_MASK]
+
+    @interrupt_mask.setter
+    def interrupt_mask(self, value):
+        self.register[self.CONSTANTS.REGISTER_OF_INTERRUPT_MASK] = value
+        return
+
+    #-----------------------------------------------------------
+
+    def format_value(self, value):
+
+        return self.CONSTANTS.format_as_bin(value)
+
+    def format_iterable(self, *args):
+
+        return tuple(self.format_value(value) for value in args)
+
+    def format_address(self, address):
+        """
+        Format `address`, with its source line and label if there is a
+        source map.
+        """
+
+        text = self.format_value(address)
+
+        if self.source_map is not None:
+            where = self.source_map.describe(address)
+            if where:
+                text = f"{text} ({where})"
+
+        return text
+
+    def trace(self):
+        """
+        Handy function to print out the CPU state.
+        You might want to call this from run() if you need help debugging.
+        """
+
+        from tools.printers import print_on
+
+        print_on(
+            "TRACE --- {} {} {} | {} {} {} | ".format(
+                *self.format_iterable(
+                    self.program_pointer,
+                    self.stack_pointer,
+                    self.flags,
+                    self.read_register(self.program_pointer),
+                    self.read_register(self.program_pointer + 1),
+                    self.read_register(self.program_pointer + 2),
+                )
+            )
+        )
+
+        print_on(" ".join(self.format_iterable(*self.register)))
+
+        print()
+
+        return
+
+    ############################################################
+    #   REGISTER
+    ############################################################
+
+    def read_register(self, address):
+        """
+        Read the `value` from the provided `address` in the register.
+        """
+
+        return self.register[address]
+
+    def write_register(self, address, value):
+        """
+        Write the `value` to the provided `address` in the register.
+        """
+
+        self.register[address] = self.MASKS.word_mask(value)
+
+        return
+
+    def write_register_hooked(self, address, value):
+        """
+        Like `write_register`, then call the `on_register_write` hooks.
+        Replaces `write_register` while any hook is registered.
+        """
+
+        type(self).write_register(self, address, value)
+
+        for hook in self.hooks.on_register_write:
+            hook(self, address, self.register[address])
+
+        return
+
+    ############################################################
+    #   MEMORY
+    ############################################################
+
+    def read_memory(self, address):
+        """
+        Read the `value` from the provided `address` in the memory.
+        """
+
+        return self.memory[address]
+
+    def write_memory(self, address, value):
+        """
+        Write the `value` to the provided `address` in the memory.
+        """
+
+        value = self.MASKS.word_mask(value)
+
+        page = address >> self.CONSTANTS.PAGE__WIDTH
+
+        self.dirty_pages[page] = 1
+
+        if self.page_flags[page]:
+            self.write_flagged_page(page, address, value)
+        else:
+            self.memory[address] = value
+
+        return
+
+    def write_memory_raw(self, address, value):
+        """
+        Write the `value` to the provided `address`, marking its page dirty
+        but skipping the devices, watchpoints and hooks there. Used by
+        devices to update their own words without re-entering `write`.
+        """
+
+        self.dirty_pages[address >> self.CONSTANTS.PAGE__WIDTH] = 1
+        self.memory[address] = self.MASKS.word_mask(value)
+
+        return
+
+    def write_flagged_page(self, page, address, value):
+        """
+        Write to a page with `page_flags` set: keep the breakpoint at
+        `address` (if any) over the new word, notify the device there (if
+        any), re-predecode fused pairs around it, drop the memoized calls of
+        the CPU, and check the watchpoints there.
+        """
+
+        flags = self.page_flags[page]
+
+        old_value = self.memory[address]
+
+        if flags & self.PAGE_FLAG__BREAKPOINT and address in self.breakpoints:
+            old_value = self.breakpoints[address]
+            self.breakpoints[address] = value
+        else:
+            self.memory[address] = value
+
+        if flags & self.PAGE_FLAG__DEVICE:
+            device = self.device_at(address)
+            if device is not None:
+                device.write(self, address, value)
+
+        if flags & self.PAGE_FLAG__FUSED:
+            self.predecode(address - self.FUSIONS.MAX_WIDTH + 1, address + 1)
+
+        if flags & self.PAGE_FLAG__MEMO:
+            self.memo.invalidate()
+
+        if flags & self.PAGE_FLAG__WATCH:
+            self.check_watches(self.page_watches[page], WATCH__WRITE, address, old_value, value)
+
+        return
+
+    #-----------------------------------------------------------
+
+    def read_memory_watched(self, address):
+        """
+        Read the `value` from the provided `address`, and check the
+        watchpoints there. Breakpoints read as the words they patched over.
+        Replaces `read_memory` while any watchpoint triggers on reads.
+        """
+
+        page = address >> self.CONSTANTS.PAGE__WIDTH
+
+        value = self.memory[address]
+
+        if self.page_flags[page] & self.PAGE_FLAG__BREAKPOINT:
+            value = self.breakpoints.get(address, value)
+
+        watches = self.page_watches[page]
+
+        if watches is not None and not self.is_fetch(address):
+            self.check_watches(watches, WATCH__READ, address, value, value)
+
+        return value
+
+    def is_fetch(self, address):
+        """
+        Test if reading `address` is part of fetching the running instruction.
+        """
+
+        pp = self.program_pointer
+        word = self.memory[pp]
+        width = self.OPERATIONS.WIDTH[word] if word in self.OPERATIONS else 1
+
+        return pp <= address < pp + width
+
+    def read_memory_data(self, address):
+        """
+        Like `read_memory`, but through the device mapped at `address` if it
+        has a read hook, and reading a breakpoint as the word it patched over.
+        Used by the reads of data (`LD`, `TAS` and stack pops), so that
+        devices and breakpoints leave every other read, fetches included, on
+        the plain path.
+        """
+
+        flags = self.page_flags[address >> self.CONSTANTS.PAGE__WIDTH]
+
+        if flags & self.PAGE_FLAG__DEVICE:
+            device = self.device_at(address)
+            if device is not None and device.read is not None:
+                return self.read_device(device, address)
+
+        value = self.read_memory(address)
+
+        if flags & self.PAGE_FLAG__BREAKPOINT:
+            value = self.breakpoints.get(address, value)
+
+        return value
+
+    def read_device(self, device, address):
+        """
+        Read the `value` at `address` through the read hook of `device`, and
+        check the watchpoints and call the `on_read` hooks there.
+        """
+
+        value = self.MASKS.word_mask(device.read(self, address))
+
+        watches = self.page_watches[address >> self.CONSTANTS.PAGE__WIDTH]
+
+        if watches is not None:
+            self.check_watches(watches, WATCH__READ, address, value, value)
+
+        if self.hooks is not None:
+            for hook in self.hooks.on_read:
+                hook(self, address, value)
+
+        return value
+
+    def read_memory_hooked(self, address):
+        """
+        Like `read_memory_watched`, then call the `on_read` hooks, unless the
+        read is part of fetching the running instruction. Replaces
+        `read_memory` while any hook is registered.
+        """
+
+        value = self.read_memory_watched(address)
+
+        if not self.is_fetch(address):
+            for hook in self.hooks.on_read:
+                hook(self, address, value)
+
+        return value
+
+    def write_memory_hooked(self, address, value):
+        """
+        Like `write_memory`, then call the `on_write` hooks. Replaces
+        `write_memory` while any hook is registered.
+        """
+
+        type(self).write_memory(self, address, value)
+
+        for hook in self.hooks.on_write:
+            hook(self, address, self.memory[address])
+
+        return
+
+    def device_at(self, address):
+        """
+        Get the device mapped at `address`, or `None` for plain memory.
+        """
+
+        devices = self.page_devices[address >> self.CONSTANTS.PAGE__WIDTH]
+
+        if devices is not None:
+            for device in devices:
+                if device.start <= address < device.end:
+                    return device
+
+        return None
+
+    def map_device(self, device):
+        """
+        Attach `device` and map its addresses. Only the pages it covers are
+        flagged, so accesses to every other page keep the plain fast path.
+        """
+
+        for page in device.pages(self.CONSTANTS.PAGE__WIDTH):
+            self.page_devices[page] = (self.page_devices[page] or ()) + (device, )
+            self.page_flags[page] |= self.PAGE_FLAG__DEVICE
+
+        self.devices.append(device)
+
+        device.attach(self)
+
+        return
+
+    def unmap_device(self, device):
+        """
+        Detach `device` and unmap its addresses.
+        """
+
+        device.detach(self)
+
+        self.devices.remove(device)
+
+        for page in device.pages(self.CONSTANTS.PAGE__WIDTH):
+            devices = tuple(other for other in self.page_devices[page] if other is not device)
+            self.page_devices[page] = devices or None
+            if not devices:
+                self.page_flags[page] &= ~self.PAGE_FLAG__DEVICE
+
+        return
+
+    def update_memory_path(self):
+        """
+        Use the hooked accessors only while some hook is registered, and
+        `read_memory_watched` only while some watchpoint triggers on reads.
+        Otherwise the plain accessors of the class are left to run. Device
+        read hooks need neither: `read_memory_data` checks the page flags.
+        """
+
+        if self.hooks is not None:
+            self.read_memory = self.read_memory_hooked
+            self.write_memory = self.write_memory_hooked
+            self.write_register = self.write_register_hooked
+            return
+
+        self.__dict__.pop("write_memory", None)
+        self.__dict__.pop("write_register", None)
+
+        if any(watch.on == WATCH__READ for watch in self.watches):
+            self.read_memory = self.read_memory_watched
+        else:
+            self.__dict__.pop("read_memory", None)
+
+        return
+
+    #-----------------------------------------------------------
+
+    def watch(self, address_range, on=WATCH__WRITE):
+        """
+        Stop `run` after the instruction that reads or writes (as `on` says)
+        an address in `address_range`, a `range` or a single address.
+        Returns the `ProcessorWatchpoint`, for `unwatch`.
+        """
+
+        if isinstance(address_range, int):
+            address_range = range(address_range, address_range + 1)
+
+        watchpoint = ProcessorWatchpoint(address_range.start, address_range.stop, on)
+
+        for page in watchpoint.pages(self.CONSTANTS.PAGE__WIDTH):
+            self.page_watches[page] = (self.page_watches[page] or ()) + (watchpoint, )
+            if on == WATCH__WRITE:
+                self.page_flags[page] |= self.PAGE_FLAG__WATCH
+
+        self.watches.append(watchpoint)
+        self.update_memory_path()
+
+        return watchpoint
+
+    def unwatch(self, watchpoint):
+
+        self.watches.remove(watchpoint)
+
+        for page in watchpoint.pages(self.CONSTANTS.PAGE__WIDTH):
+            watches = tuple(other for other in self.page_watches[page] if other is not watchpoint)
+            self.page_watches[page] = watches or None
+            if not any(other.on == WATCH__WRITE for other in watches):
+                self.page_flags[page] &= ~self.PAGE_FLAG__WATCH
+
+        self.update_memory_path()
+
+        return
+
+    def check_watches(self, watches, on, address, old_value, new_value):
+        """
+        Trigger the first of `watches` on `on` at `address`, if any: keep the
+        hit in `watch_hit`, and make the run loop return.
+        """
+
+        for watchpoint in watches:
+            if watchpoint.on == on and address in watchpoint:
+                self.watch_hit = ProcessorWatchHit(watchpoint, self.program_pointer, address, old_value, new_value)
+                self.pause(REASON__WATCHPOINT)
+                return
+
+        return
+
+    #-----------------------------------------------------------
+
+    def add_breakpoint(self, address):
+        """
+        Make `run` stop before running the instruction at `address`, by
+        patching `CODE_OF_BREAKPOINT` over its opcode. Running on from there
+        runs the original instruction, then keeps the breakpoint.
+        """
+
+        if address in self.breakpoints:
+            return
+
+        self.breakpoints[address] = self.memory[address]
+        self.memory[address] = self.CODE_OF_BREAKPOINT
+
+        self.page_flags[address >> self.CONSTANTS.PAGE__WIDTH] |= self.PAGE_FLAG__BREAKPOINT
+
+        self.patched(address)
+
+        return
+
+    def remove_breakpoint(self, address):
+        """
+        Put back the original word at `address`.
+        """
+
+        self.memory[address] = self.breakpoints.pop(address)
+
+        page = address >> self.CONSTANTS.PAGE__WIDTH
+
+        if not any((other >> self.CONSTANTS.PAGE__WIDTH) == page for other in self.breakpoints):
+            self.page_flags[page] &= ~self.PAGE_FLAG__BREAKPOINT
+
+        if self.step_over == address:
+            self.step_over = None
+
+        self.patched(address)
+
+        return
+
+    def patched(self, address):
+        """
+        Catch up with a breakpoint patched in or out at `address`.
+        """
+
+        self.predecode(address - self.FUSIONS.MAX_WIDTH + 1, address + 1)
+
+        if self.memo is not None and self.memo.subroutines is not None:
+            self.memo.invalidate()
+
+        self.update_memory_path()
+
+        return
+
+    #-----------------------------------------------------------
+
+    def add_hook(self, event, hook):
+        """
+        Call `hook` on `event` (see `cpu__hooks`). While any hook is
+        registered, `run` and `step` use `run_hooked`.
+        """
+
+        if self.hooks is None:
+            from .cpu__hooks import ProcessorHooks
+            hooks = ProcessorHooks()
+        else:
+            hooks = self.hooks
+
+        hooks.add(event, hook)
+
+        self.hooks = hooks
+        self.update_memory_path()
+
+        return
+
+    def remove_hook(self, event, hook):
+        """
+        Stop calling `hook` on `event`. Once no hook is left, the CPU is back
+        on its plain path.
+        """
+
+        if self.hooks is None:
+            raise ValueError(f"no hook registered for {event!r}")
+
+        self.hooks.remove(event, hook)
+
+        if not self.hooks:
+            self.hooks = None
+
+        self.update_memory_path()
+
+        return
+
+    #-----------------------------------------------------------
+
+    def read_page(self, page):
+        """
+        Read the words of the provided `page` in the memory.
+        """
+
+        start = page << self.CONSTANTS.PAGE__WIDTH
+
+        return tuple(self.memory[start:(start + self.CONSTANTS.PAGE_SIZE)])
+
+    def changed_pages(self):
+        """
+        Get the pages written since the last checkpoint, as `{page: words}`.
+        """
+
+        return {
+            page: self.read_page(page)
+            for (page, dirty) in enumerate(self.dirty_pages)
+            if dirty
+        }
+
+    def checkpoint(self):
+        """
+        Take an incremental checkpoint of the CPU state.
+        Only the pages changed since the previous checkpoint are included;
+        the (small) register file, flags and pointer are always included.
+        """
+
+        state = {
+            "program_pointer": self.program_pointer,
+            "flags": self.flags,
+            "register": tuple(self.register),
+            "pages": self.changed_pages(),
+        }
+
+        self.dirty_pages[:] = bytes(self.CONSTANTS.PAGE_COUNT)
+
+        return state
+
+    def apply_checkpoint(self, state):
+        """
+        Apply an incremental checkpoint taken by `checkpoint` (here or on
+        another CPU) on top of the current state. The pages it restores
+        count as written, so the next checkpoint (or `compare_pages`)
+        includes them.
+        """
+
+        self.program_pointer = state["program_pointer"]
+        self.flags = state["flags"]
+        self.register[:] = state["register"]
+
+        for (page, words) in state["pages"].items():
+
+            start = page << self.CONSTANTS.PAGE__WIDTH
+
+            for (offset, word) in enumerate(words):
+                self.memory[start + offset] = word
+
+            self.dirty_pages[page] = 1
+            self.predecode(start - self.FUSIONS.MAX_WIDTH + 1, start + len(words))
+
+        return
+
+    def compare_pages(self, other):
+        """
+        Get the pages that differ between this CPU and `other`.
+        Both CPUs are assumed to match at their last checkpoints, so only the
+        pages changed since then on either side are compared.
+        """
+
+        return [
+            page for (page, (dirty_a, dirty_b))
+            in enumerate(zip(self.dirty_pages, other.dirty_pages))
+            if (dirty_a or dirty_b) and (self.read_page(page) != other.read_page(page))
+        ]
+
+    ############################################################
+    #   PROCESSING
+    ############################################################
+
+    def load(self, program, format=None):
+        """
+        Load a program into memory, from a path (`-` for stdin) or a binary
+        stream, in any format `loader` reads. Words go straight into the
+        buffer as they are parsed, as with `load_words`; a start address
+        from Intel HEX sets the program pointer.
+        """
+
+        if self.debug:
+            from tools.printers import print_heading
+            print()
+            print_heading("loading program...", width=40)
+
+        reader = ProgramReader(self.CONSTANTS, format)
+
+        # predecode each span of contiguous runs once, when it ends
+        (span_start, span_stop) = (0, 0)
+
+        with open_program(program) as stream:
+
+            for (address, words) in reader.read(stream):
+
+                stop = address + len(words)
+
+                self.memory[address:stop] = self.memory_words(words)
+
+                if self.debug:
+                    for (i, word) in enumerate(self.memory[address:stop], start=address):
+                        print("[{}]: {}".format(*self.format_iterable(i, word)))
+
+                if address != span_stop:
+                    self.predecode(span_start - self.FUSIONS.MAX_WIDTH + 1, span_stop)
+                    span_start = address
+
+                span_stop = stop
+
+        self.predecode(span_start - self.FUSIONS.MAX_WIDTH + 1, span_stop)
+
+        if reader.start is not None:
+            self.program_pointer = reader.start
+
+        return
+
+    def load_words(self, words, start=0):
+        """
+        Load the program `words` into memory from `start`, straight into the
+        buffer rather than through `write_memory`, so no device, watchpoint
+        or breakpoint sees it. Meant for a CPU fresh from `reset`.
+        """
+
+        stop = start + len(words)
+
+        if stop > self.CONSTANTS.WORD_SIZE:
+            raise ValueError(f"the program does not fit in memory: {len(words)} words from {start}")
+
+        word_mask = self.CONSTANTS.WORD_SIZE - 1
+        words = [word & word_mask for word in words]
+
+        self.memory[start:stop] = self.memory_words(words)
+
+        self.predecode(start - self.FUSIONS.MAX_WIDTH + 1, stop)
+
+        return
+
+    def predecode(self, start=0, stop=None):
+        """
+        Find the fusible instruction pairs starting in `[start, stop)`.
+        Every address is checked on its own, so jumping into the middle of a
+        pair (or into data) still runs exactly the words found there.
+        Writes through `write_memory` re-run this over the affected words.
+        """
+
+        if not self.fuse:
+            return
+
+        start = max(start, 0)
+        stop = self.CONSTANTS.WORD_SIZE if stop is None else min(stop, self.CONSTANTS.WORD_SIZE)
+
+        for address in range(start, stop):
+
+            kind = self.FUSIONS.kind_at(self.memory, address)
+
+            self.fused[address] = kind
+
+            if kind:
+                last = min(address + self.FUSIONS[kind]["width"], self.CONSTANTS.WORD_SIZE) - 1
+                for page in range(
+                    address >> self.CONSTANTS.PAGE__WIDTH,
+                    (last >> self.CONSTANTS.PAGE__WIDTH) + 1,
+                ):
+                    self.page_flags[page] |= self.PAGE_FLAG__FUSED
+
+        if self.until_pc is not None:
+            self.mark_until_pc(self.until_pc)
+
+        return
+
+    def mark_until_pc(self, address):
+        """
+        Make `run_fast` stop before running the word at `address`. No pair
+        fused across `address` is left to step over it.
+        """
+
+        self.until_pc = address
+
+        for leader_address in range(max(address - self.FUSIONS.MAX_WIDTH + 1, 0), address):
+            self.fused[leader_address] = 0
+
+        self.fused[address] = self.FUSED__UNTIL_PC
+
+        return
+
+    def unmark_until_pc(self):
+        """
+        Undo `mark_until_pc`.
+        """
+
+        address = self.until_pc
+        self.until_pc = None
+
+        for leader_address in range(max(address - self.FUSIONS.MAX_WIDTH + 1, 0), address + 1):
+            self.fused[leader_address] = 0
+
+        self.predecode(address - self.FUSIONS.MAX_WIDTH + 1, address + 1)
+
+        return
+
+    #-----------------------------------------------------------
+
+    def start(self):
+        self.should_continue = True
+        self.halted = False
+        self.halt_reason = None
+        self.resume()
+        return
+
+    def resume(self):
+        """
+        Clear the reason for the last pause. Only if the program pointer is
+        still at the breakpoint it stopped at is that breakpoint run over.
+        """
+
+        self.pause_reason = None
+        self.watch_hit = None
+
+        if self.step_over != self.program_pointer:
+            self.step_over = None
+
+        return
+
+    def pause(self, reason):
+        """
+        Make the run loop return with `reason`, between instructions.
+        """
+
+        self.pause_reason = reason
+        self.should_continue = False
+
+        return
+
+    def stop(self, reason=REASON__HALTED):
+        self.should_continue = False
+        self.halted = True
+        self.halt_reason = reason
+        if self.hooks is not None:
+            for hook in self.hooks.on_halt:
+                hook(self, reason)
+        return
+
+    def metrics(self):
+        """
+        Get a snapshot of the counters of the CPU, as `name: value`.
+        Safe to call from another thread while the CPU runs.
+        """
+
+        return {
+            "instructions": self.instruction_count,
+            "dispatches": self.dispatch_count,
+            "branches_taken": self.branch_count,
+            "max_call_depth": self.max_call_depth,
+            "interrupts_serviced": self.interrupt_count,
+            "interrupt_latency_seconds": self.interrupt_latency,
+            "max_interrupt_latency_seconds": self.max_interrupt_latency,
+            "output_bytes": self.output_bytes,
+            "halted": int(self.halted),
+        }
+
+    def divide_by_zero(self):
+        """
+        Report a division by zero and halt, as the spec requires.
+        """
+
+        message = f"error: division by zero at {self.format_address(self.program_pointer)}"
+        print(message, file=sys.stderr if self.errors is None else self.errors)
+        self.stop(REASON__DIVIDE_BY_ZERO)
+
+        return
+
+    def run(self, max_instructions=None, until_pc=None, wall_timeout=None, capture_output=False):
+        """
+        Run the CPU until it halts, or until it has run `max_instructions`,
+        is about to run the word at `until_pc`, or has run for `wall_timeout`
+        seconds. Returns a `ProcessorRunResult`.
+
+        `until_pc` and `max_instructions` are exact, except that with
+        `memoize` a memoized call runs as a whole. The wall clock is only
+        read every `RUN__CHECK_INTERVAL` instructions or so.
+
+        With `capture_output`, what the program prints and the errors the CPU
+        reports are kept in the result instead of going to stdout and stderr.
+        """
+
+        started = time.perf_counter()
+        deadline = None if wall_timeout is None else started + wall_timeout
+
+        instruction_count = self.instruction_count
+        dispatch_count = self.dispatch_count
+
+        stop_count = None if max_instructions is None else instruction_count + max_instructions
+
+        (output, errors) = (self.output, self.errors)
+        if capture_output:
+            (self.output, self.errors) = (io.StringIO(), io.StringIO())
+
+        if until_pc is not None:
+            self.mark_until_pc(until_pc)
+
+        self.stop_count = stop_count
+
+        self.start()
+
+        try:
+            if self.debug:
+                reason = self.run_debug(stop_count, until_pc, deadline)
+            else:
+                reason = self.run_limited(stop_count, until_pc, deadline)
+        finally:
+            if until_pc is not None:
+                self.unmark_until_pc()
+            self.stop_count = None
+            (captured, self.output) = (self.output, output)
+            (captured_errors, self.errors) = (self.errors, errors)
+
+        return ProcessorRunResult(
+            self,
+            reason,
+            self.instruction_count - instruction_count,
+            self.dispatch_count - dispatch_count,
+            time.perf_counter() - started,
+            captured.getvalue() if capture_output else None,
+            captured_errors.getvalue() if capture_output else None,
+        )
+
+    def run_limited(self, stop_count, until_pc, deadline):
+        """
+        Run `run_fast` in slices, servicing interrupts and checking the
+        limits of `run` between them. The last slice before `stop_count`
+        runs on `run_exact`. Returns the reason for stopping.
+        """
+
+        # each slice returns on halt, at `until_pc`, at the end of the slice,
+        # or when `check_interrupts` asks it to
+        while True:
+
+            limit = self.RUN__CHECK_INTERVAL
+
+            if stop_count is not None:
+                remaining = stop_count - self.instruction_count
+                if remaining <= 0:
+                    return REASON__MAX_INSTRUCTIONS
+
+            # entering an interrupt handler belongs to the next instruction
+            self.should_continue = True
+            self.service_interrupts()
+
+            if self.program_pointer == until_pc:
+                return REASON__UNTIL_PC
+
+            if self.hooks is not None:
+                self.run_hooked(remaining if stop_count is not None and remaining <= limit else limit)
+            elif stop_count is not None and remaining <= limit:
+                self.run_exact(remaining)
+            else:
+                self.run_fast(limit)
+
+            if self.halted:
+                return self.halt_reason
+
+            if self.pause_reason is not None:
+                return self.pause_reason
+
+            if deadline is not None and time.perf_counter() >= deadline:
+                return REASON__WALL_TIMEOUT
+
+    def run_debug(self, stop_count=None, until_pc=None, deadline=None):
+        """
+        Run the CPU one operation at a time, printing what it is doing.
+        Checks the limits of `run` before every operation.
+        """
+
+        from tools.printers import (
+            print_dent,
+            print_line,
+            print_heading,
+        )
+
+        if self.debug:
+            print()
+            print_heading("running program from memory...", width=40)
+            print()
+
+        reason = None
+
+        while not self.halted:
+
+            if stop_count is not None and self.instruction_count >= stop_count:
+                reason = REASON__MAX_INSTRUCTIONS
+                break
+
+            self.should_continue = True
+            self.service_interrupts()
+
+            if self.program_pointer == until_pc:
+                reason = REASON__UNTIL_PC
+                break
+
+            if deadline is not None and time.perf_counter() >= deadline:
+                reason = REASON__WALL_TIMEOUT
+                break
+
+            address = self.program_pointer
+            word = self.memory[address]
+
+            # stopping at a breakpoint runs no instruction
+            if word == self.CODE_OF_BREAKPOINT and self.trap_breakpoint():
+                reason = self.pause_reason
+                break
+
+            self.instruction_count += 1
+            self.dispatch_count += 1
+
+            if self.debug:
+                print(self.format_value(word))
+
+            if word == self.CODE_OF_BREAKPOINT:
+
+                self.BREAKPOINT()
+
+            elif word in self.OPERATIONS:
+
+                operation_name = self.OPERATIONS.NAME[word]
+
+                if self.debug:
+                    print_dent(
+                        "operation: {} ({})".format(
+                            operation_name,
+                            self.OPERATIONS.CODE_NAME[word],
+                        )
+                    )
+
+                # get the operation's function:
+                operation_fun = getattr(self, operation_name, None)
+
+                # run the operation or stop
+                if operation_fun:
+
+                    if self.debug:
+                        print_dent("running...")
+                        print_dent(end="")
+
+                    operation_fun()
+
+                    if not self.OPERATIONS.SETS_POINTER[word]:
+                        self.program_pointer += self.OPERATIONS.WIDTH[word]
+
+                else:
+
+                    if self.debug:
+                        print_dent("not implemented")
+                        print_dent("stopping...")
+
+                    self.stop(REASON__UNKNOWN_OPERATION)
+
+            else:
+
+                if self.debug:
+                    print_dent("unknown")
+                    print_dent("stopping...")
+
+                self.stop(REASON__UNKNOWN_OPERATION)
+
+            if self.hooks is not None:
+                for hook in self.hooks.on_instruction:
+                    hook(self, address, word)
+
+            if self.debug:
+                print()
+
+            if self.pause_reason is not None:
+                reason = self.pause_reason
+                break
+
+        if self.debug:
+            print_line(width=40)
+            print("done.")
+
+        return self.halt_reason if reason is None else reason
+
+    def run_fast(self, limit=RUN__CHECK_INTERVAL):
+        """
+        Run the CPU through the dispatch tables, without debug output.
+        Fused pairs found by `predecode` run as a single dispatch.
+        Returns at `until_pc`, or where the program pointer is set once
+        `limit` instructions have run.
+        """
+
+        memory = self.memory
+        fused = self.fused
+        handlers = self.handlers
+        advances = self.advances
+        fused_handlers = self.fused_handlers
+
+        until_pc_kind = self.FUSED__UNTIL_PC
+
+        instructions = 0
+        dispatches = 0
+
+        try:
+
+            while self.should_continue:
+
+                pp = self.program_pointer
+                kind = fused[pp]
+
+                if kind:
+
+                    if kind == until_pc_kind:
+                        break
+
+                    fused_handlers[kind](self)
+
+                    instructions += 2
+                    dispatches += 1
+
+                    if instructions >= limit:
+                        break
+
+                else:
+
+                    word = memory[pp]
+
+                    # only a breakpoint stopping returns anything
+                    if handlers[word](self):
+                        break
+
+                    instructions += 1
+                    dispatches += 1
+
+                    advance = advances[word]
+                    if advance:
+                        self.program_pointer = pp + advance
+                    elif instructions >= limit:
+                        break
+
+        finally:
+
+            self.instruction_count += instructions
+            self.dispatch_count += dispatches
+
+        return
+
+    def run_exact(self, count):
+        """
+        Like `run_fast`, but run at most `count` instructions, stopping only
+        between instructions. A fused pair runs fused only if both of its
+        instructions fit. Returns the number of instructions run.
+        """
+
+        memory = self.memory
+        fused = self.fused
+        handlers = self.handlers
+        advances = self.advances
+        fused_handlers = self.fused_handlers
+
+        until_pc_kind = self.FUSED__UNTIL_PC
+
+        instructions = 0
+        dispatches = 0
+
+        try:
+
+            while instructions < count and self.should_continue:
+
+                pp = self.program_pointer
+                kind = fused[pp]
 
-        return
+                if kind == until_pc_kind:
+                    break
 
-    #-----------------------------------------------------------
+                if kind and instructions + 1 < count:
 
-    @property
-    def stack_pointer(self):
-        return self.register[CPU.CONSTANTS.REGISTER_OF_STACK_POINTER]
+                    fused_handlers[kind](self)
 
-    @stack_pointer.setter
-    def stack_pointer(self, value):
-        self.register[CPU.CONSTANTS.REGISTER_OF_STACK_POINTER] = value
-        return
+                    instructions += 2
 
-    @property
-    def interrupt_status(self):
-        return self.register[CPU.CONSTANTS.REGISTER_OF_STACK_POINTER]
+                else:
 
-    @interrupt_status.setter
-    def interrupt_status(self, value):
-        self.register[CPU.CONSTANTS.REGISTER_OF_STACK_POINTER] = value
-        return
+                    word = memory[pp]
 
-    @property
-    def interrupt_mask(self):
-        return self.register[CPU.CONSTANTS.REGISTER_OF_STACK_POINTER]
+                    # only a breakpoint stopping returns anything
+                    if handlers[word](self):
+                        break
 
-    @interrupt_mask.setter
-    def interrupt_mask(self, value):
-        self.register[CPU.CONSTANTS.REGISTER_OF_STACK_POINTER] = value
-        return
+                    advance = advances[word]
+                    if advance:
+                        self.program_pointer = pp + advance
 
-    #-----------------------------------------------------------
+                    instructions += 1
 
-    def format_value(self, value):
+                dispatches += 1
 
-        return CPU.CONSTANTS.format_as_bin(value)
+        finally:
 
-    def format_iterable(self, *args):
+            self.instruction_count += instructions
+            self.dispatch_count += dispatches
 
-        return tuple(self.format_value(value) for value in args)
+        return instructions
 
-    def trace(self):
+    def run_hooked(self, count):
         """
-        Handy function to print out the CPU state.
-        You might want to call this from run() if you need help debugging.
+        Like `run_exact`, but through the plain handlers, one instruction at
+        a time, calling the `on_instruction` hooks after each. Replaces
+        `run_fast` and `run_exact` while any hook is registered, so that
+        hooks see every instruction and every access.
         """
 
-        print_on(
-            "TRACE --- {} {} {} | {} {} {} | ".format(
-                *self.format_iterable(
-                    self.program_pointer,
-                    self.stack_pointer,
-                    self.flags,
-                    self.read_register(self.program_pointer),
-                    self.read_register(self.program_pointer + 1),
-                    self.read_register(self.program_pointer + 2),
-                )
-            )
-        )
+        memory = self.memory
+        fused = self.fused
+        (handlers, advances, _) = self.dispatch_tables()
 
-        print_on(" ".join(self.format_iterable(*self.register)))
+        until_pc_kind = self.FUSED__UNTIL_PC
+        on_instruction = self.hooks.on_instruction
 
-        print()
+        instructions = 0
 
-        return
+        while instructions < count and self.should_continue:
 
-    ############################################################
-    #   REGISTER
-    ############################################################
+            pp = self.program_pointer
 
-    def read_register(self, address):
-        """
-        Read the `value` from the provided `address` in the register.
-        """
+            if fused[pp] == until_pc_kind:
+                break
 
-        return self.register[address]
+            word = memory[pp]
 
-    def write_register(self, address, value):
-        """
-        Write the `value` to the provided `address` in the register.
-        """
+            # only a breakpoint stopping returns anything
+            if handlers[word](self):
+                break
 
-        self.register[address] = CPU.MASKS.word_mask(value)
+            advance = advances[word]
+            if advance:
+                self.program_pointer = pp + advance
 
-        return
+            instructions += 1
 
-    ############################################################
-    #   MEMORY
-    ############################################################
+            self.instruction_count += 1
+            self.dispatch_count += 1
 
-    def read_memory(self, address):
-        """
-        Read the `value` from the provided `address` in the memory.
-        """
+            for hook in on_instruction:
+                hook(self, pp, word)
 
-        return self.memory[address]
+        return instructions
 
-    def write_memory(self, address, value):
+    def step(self, count=1):
         """
-        Write the `value` to the provided `address` in the memory.
+        Run exactly `count` instructions, servicing interrupts as `run` does,
+        without the bookkeeping of `run`. Returns early if the CPU halts,
+        reaches a breakpoint, or triggers a watchpoint. Returns the number
+        of instructions run.
         """
 
-        self.memory[address] = CPU.MASKS.word_mask(value)
+        done = 0
 
-        return
+        self.resume()
 
-    ############################################################
-    #   PROCESSING
-    ############################################################
+        while done < count and not self.halted and self.pause_reason is None:
 
-    def load(self, program_file):
-        """
-        Load a program into memory.
-        """
+            self.should_continue = True
+            self.service_interrupts()
 
-        if self.debug:
-            print()
-            print_heading("reading program from file...", width=40)
+            if self.hooks is not None:
+                done += self.run_hooked(count - done)
+            else:
+                done += self.run_exact(count - done)
 
-        program = []
+        return done
 
-        with open(program_file) as file:
+    ############################################################
+    #   INTERRUPTS
+    ############################################################
 
-            for line in file:
+    def raise_interrupt(self, number):
+        """
+        Raise interrupt `number` from a device, which may run on a thread of
+        its own. Rather than updating IS, which the CPU's thread may be
+        updating too, it sets a flag of its own and makes `run_fast` return;
+        `service_interrupts` moves the flag into IS once the CPU can take an
+        interrupt, so one raised during a handler is not overwritten by the
+        IS that `IRET` restores. Numbers past `INTERRUPT_COUNT` raise nothing.
+        """
 
-                line_str = line.split("#")[0].strip()
+        if number >= self.CONSTANTS.INTERRUPT_COUNT:
+            return
 
-                if line_str:
+        if self.interrupt_raised_at[number] is None:
+            self.interrupt_raised_at[number] = time.perf_counter()
 
-                    word = int(line_str, base=2)
-                    program.append(word)
+        self.interrupts_raised[number] = 1
+        self.should_continue = False
 
-                    if self.debug:
-                        print(self.format_value(word))
+        return
 
-        if self.debug:
-            print()
-            print_heading("writing program to memory...", width=40)
+    def take_raised_interrupts(self):
+        """
+        Set the interrupts raised by `raise_interrupt` pending in IS. Runs on
+        the CPU's thread, so nothing else updates IS meanwhile.
+        """
 
-        for (i, word) in enumerate(program):
+        raised = self.interrupts_raised
+        status = self.interrupt_status
 
-            self.write_memory(i, word)
+        for number in range(len(raised)):
+            if raised[number]:
+                raised[number] = 0
+                status |= 1 << number
 
-            if self.debug:
-                print("[{}]: {}".format(*self.format_iterable(i, word)))
+        self.interrupt_status = status
+        self.interrupt_register_writes += 1
 
         return
 
-    #-----------------------------------------------------------
+    def check_interrupts(self):
+        """
+        If an unmasked interrupt is pending, make `run_fast` return so that
+        `run` services it before the next instruction fetch. Nothing is
+        checked per instruction. Called after every write to IM or IS.
+        """
 
-    def start(self):
-        self.should_continue = True
-        return
+        self.interrupt_register_writes += 1
+
+        if self.interrupt_mask & self.interrupt_status:
+            self.should_continue = False
 
-    def stop(self):
-        self.should_continue = False
         return
 
-    def run(self):
+    def service_interrupts(self):
         """
-        Run the CPU.
+        Enter the handler of the lowest pending unmasked interrupt, if any.
         """
 
-        self.start()
-
-        if self.debug:
-            print()
-            print_heading("running program from memory...", width=40)
-            print()
+        if not self.interrupts_enabled:
+            return
 
-        while self.should_continue:
+        if any(self.interrupts_raised):
+            self.take_raised_interrupts()
 
-            word = self.read_memory(self.program_pointer)
+        masked = self.interrupt_mask & self.interrupt_status
 
-            if self.debug:
-                print(self.format_value(word))
+        if not masked:
+            return
 
-            if word in self.OPERATIONS:
+        for number in range(self.CONSTANTS.INTERRUPT_COUNT):
 
-                operation = self.OPERATIONS[word]
+            if masked & (1 << number):
 
-                if self.debug:
-                    print_dent(
-                        "operation: {} ({})".format(
-                            operation["name"],
-                            operation["code_name"],
-                        )
-                    )
+                self.interrupts_enabled = False
+                self.interrupt_status &= ~(1 << number)
 
-                # get the operation's function:
-                operation_fun = getattr(self, operation["name"], None)
+                self.interrupt_count += 1
 
-                # run the operation or stop
-                if operation_fun:
+                raised_at = self.interrupt_raised_at[number]
+                if raised_at is not None:
+                    latency = time.perf_counter() - raised_at
+                    self.interrupt_latency += latency
+                    self.max_interrupt_latency = max(self.max_interrupt_latency, latency)
+                    self.interrupt_raised_at[number] = None
 
-                    if self.debug:
-                        print_dent("running...")
-                        print_dent(end="")
+                self.push_value(self.program_pointer)
+                self.push_value(self.flags)
 
-                    operation_fun()
+                for address in range(self.CONSTANTS.REGISTER_OF_INTERRUPT_STATUS + 1):
+                    self.push_value(self.read_register(address))
 
-                    if not operation["sets_pointer"]:
-                        self.program_pointer += (1 + operation["args"])
+                vector = self.CONSTANTS.ADDRESS_OF_INTERRUPT_VECTORS + number
+                self.program_pointer = self.read_memory(vector)
 
-                else:
+                if self.hooks is not None:
+                    for hook in self.hooks.on_interrupt:
+                        hook(self, number)
 
-                    if self.debug:
-                        print_dent("not implemented")
-                        print_dent("stopping...")
-                        self.stop()
+                break
 
-            else:
+        return
 
-                if self.debug:
-                    print_dent("unknown")
-                    print_dent("stopping...")
-                    self.stop()
+    ############################################################
+    #   STACK
+    ############################################################
 
-            if self.debug:
-                print()
+    def push_value(self, value):
+        """
+        Push `value` on the stack, which grows down.
+        """
 
-        if self.debug:
-            print_line(width=40)
-            print("done.")
+        self.stack_pointer -= 1
+        self.write_memory(self.stack_pointer, value)
 
         return
 
+    def pop_value(self):
+        """
+        Pop the value at the top of the stack.
+        """
+
+        value = self.read_memory_data(self.stack_pointer)
+        self.stack_pointer += 1
+
+        return value
+
     ############################################################
     #   OPERATIONS
     ############################################################
@@ -293,6 +1676,67 @@ class CPU:
 
     #     return
 
+    def UNKNOWN_OPERATION(self):
+
+        self.stop(REASON__UNKNOWN_OPERATION)
+
+        return
+
+    def trap_breakpoint(self):
+        """
+        If the program pointer is at a breakpoint not being run over, pause
+        there. Returns whether it did.
+        """
+
+        pp = self.program_pointer
+
+        if self.step_over == pp or pp not in self.breakpoints:
+            return False
+
+        self.step_over = pp
+        self.pause(REASON__BREAKPOINT)
+
+        return True
+
+    def BREAKPOINT(self):
+        """
+        Handle `CODE_OF_BREAKPOINT`: stop before the instruction patched over,
+        or, resuming from there, run it with its original opcode. Anywhere
+        else the code is an unknown operation. Returns `True` if it stopped,
+        which the run loops do not count as an instruction.
+        """
+
+        if self.trap_breakpoint():
+            return True
+
+        pp = self.program_pointer
+        original = self.breakpoints.get(pp)
+
+        if original is None:
+            self.UNKNOWN_OPERATION()
+            return
+
+        self.step_over = None
+
+        if self.hooks is not None:
+            (handlers, advances, _) = self.dispatch_tables()
+        else:
+            (handlers, advances) = (self.handlers, self.advances)
+
+        self.memory[pp] = original
+
+        handlers[original](self)
+
+        advance = advances[original]
+        if advance:
+            self.program_pointer = pp + advance
+
+        # a write to `pp` by the instruction already moved into `breakpoints`
+        if pp in self.breakpoints:
+            self.memory[pp] = self.CODE_OF_BREAKPOINT
+
+        return
+
     def NO_OPERATION(self):
 
         return
@@ -305,18 +1749,31 @@ class CPU:
 
     def RETURN_FROM_CALL(self):
 
-        sp = self.stack_pointer
-
-        value_s = self.read_memory(sp)
-
-        self.stack_pointer -= 1
+        value_s = self.pop_value()
 
         self.program_pointer = value_s
 
+        if self.call_depth:
+            self.call_depth -= 1
+
         return
 
-    def __RETURN_FROM_INTERRUPT(self):
-        pass
+    def RETURN_FROM_INTERRUPT(self):
+
+        for address in reversed(range(self.CONSTANTS.REGISTER_OF_INTERRUPT_STATUS + 1)):
+            self.register[address] = self.pop_value()
+
+        self.flags = self.pop_value()
+        self.program_pointer = self.pop_value()
+
+        self.interrupts_enabled = True
+        self.check_interrupts()
+
+        if self.hooks is not None:
+            for hook in self.hooks.on_interrupt_return:
+                hook(self)
+
+        return
 
     def PUSH(self):
 
@@ -326,21 +1783,13 @@ class CPU:
 
         value_a = self.read_register(reg_a)
 
-        self.stack_pointer += 1
-
-        sp = self.stack_pointer
-
-        self.write_memory(sp, value_a)
+        self.push_value(value_a)
 
         return
 
     def POP(self):
 
-        sp = self.stack_pointer
-
-        value_s = self.read_memory(sp)
-
-        self.stack_pointer -= 1
+        value_s = self.pop_value()
 
         pp = self.program_pointer
 
@@ -348,6 +1797,9 @@ class CPU:
 
         self.write_register(reg_a, value_s)
 
+        if reg_a in self.INTERRUPT_REGISTERS:
+            self.check_interrupts()
+
         return
 
     def PRINT_NUMBER(self):
@@ -358,7 +1810,10 @@ class CPU:
 
         value_a = self.read_register(reg_a)
 
-        print(value_a)
+        text = str(value_a)
+        print(text, file=self.output)
+
+        self.output_bytes += len(text) + 1
 
         return
 
@@ -370,7 +1825,27 @@ class CPU:
 
         value_a = self.read_register(reg_a)
 
-        print(chr(value_a))
+        text = chr(value_a)
+        print(text, file=self.output)
+
+        self.output_bytes += len(text.encode("utf-8", "surrogatepass")) + 1
+
+        return
+
+    def CORE_ID(self):
+        """
+        `CID a`: load the ID of the core running this into `a`; 0 but on
+        the cores of an `smp.Machine`.
+        """
+
+        pp = self.program_pointer
+
+        reg_a = self.read_memory(pp + 1)
+
+        self.write_register(reg_a, self.core_id)
+
+        if reg_a in self.INTERRUPT_REGISTERS:
+            self.check_interrupts()
 
         return
 
@@ -382,18 +1857,33 @@ class CPU:
 
         value_a = self.read_register(reg_a)
 
+        self.push_value(pp + 2)
+
         self.program_pointer = value_a
 
-        self.stack_pointer += 1
+        self.call_depth += 1
+        if self.call_depth > self.max_call_depth:
+            self.max_call_depth = self.call_depth
 
-        sp = self.stack_pointer
+        return
 
-        self.write_memory(sp, pp + 2)
+    def INTERRUPT(self):
 
-        return
+        pp = self.program_pointer
 
-    def __INTERRUPT(self):
-        pass
+        reg_a = self.read_memory(pp + 1)
+
+        value_a = self.read_register(reg_a)
+
+        self.program_pointer = pp + 2
+
+        if value_a < self.CONSTANTS.INTERRUPT_COUNT and self.interrupt_raised_at[value_a] is None:
+            self.interrupt_raised_at[value_a] = time.perf_counter()
+
+        self.write_register(self.CONSTANTS.REGISTER_OF_INTERRUPT_STATUS, self.interrupt_status | (1 << value_a))
+        self.check_interrupts()
+
+        return
 
     def JUMP(self):
 
@@ -405,6 +1895,8 @@ class CPU:
 
         self.program_pointer = mem_a
 
+        self.branch_count += 1
+
         return
 
     def __JUMP_WHEN(self, should_jump):
@@ -467,6 +1959,9 @@ class CPU:
 
         self.write_register(reg_a, result)
 
+        if reg_a in self.INTERRUPT_REGISTERS:
+            self.check_interrupts()
+
         return
 
     def DECREMENT(self):
@@ -481,6 +1976,9 @@ class CPU:
 
         self.write_register(reg_a, result)
 
+        if reg_a in self.INTERRUPT_REGISTERS:
+            self.check_interrupts()
+
         return
 
     def BITWISE_NOT(self):
@@ -491,10 +1989,13 @@ class CPU:
 
         value_a = self.read_register(reg_a)
 
-        result = CPU.MASKS.WORD - value_a
+        result = self.MASKS.WORD - value_a
 
         self.write_register(reg_a, result)
 
+        if reg_a in self.INTERRUPT_REGISTERS:
+            self.check_interrupts()
+
         return
 
     def LOAD_IMMEDIATE(self):
@@ -506,6 +2007,9 @@ class CPU:
 
         self.write_register(reg_a, value_b)
 
+        if reg_a in self.INTERRUPT_REGISTERS:
+            self.check_interrupts()
+
         return
 
     def LOAD(self):
@@ -516,10 +2020,13 @@ class CPU:
         reg_b = self.read_memory(pp + 2)
 
         mem_b = self.read_register(reg_b)
-        value_b = self.read_memory(mem_b)
+        value_b = self.read_memory_data(mem_b)
 
         self.write_register(reg_a, value_b)
 
+        if reg_a in self.INTERRUPT_REGISTERS:
+            self.check_interrupts()
+
         return
 
     def STORE(self):
@@ -536,6 +2043,32 @@ class CPU:
 
         return
 
+    def TEST_AND_SET(self):
+        """
+        `TAS a, b`: load the word at the address in `b` into `a`, and set
+        that word to 1 if it was 0. A word that was not 0 is left as it is,
+        so a lock being released meanwhile is never overwritten. Cores of an
+        `smp.Machine` run this as one atomic step.
+        """
+
+        pp = self.program_pointer
+
+        reg_a = self.read_memory(pp + 1)
+        reg_b = self.read_memory(pp + 2)
+
+        mem_b = self.read_register(reg_b)
+        value_b = self.read_memory_data(mem_b)
+
+        if not value_b:
+            self.write_memory(mem_b, 1)
+
+        self.write_register(reg_a, value_b)
+
+        if reg_a in self.INTERRUPT_REGISTERS:
+            self.check_interrupts()
+
+        return
+
     def ADD(self):
 
         pp = self.program_pointer
@@ -550,6 +2083,9 @@ class CPU:
 
         self.write_register(reg_a, result)
 
+        if reg_a in self.INTERRUPT_REGISTERS:
+            self.check_interrupts()
+
         return
 
     def SUBTRACT(self):
@@ -566,6 +2102,9 @@ class CPU:
 
         self.write_register(reg_a, result)
 
+        if reg_a in self.INTERRUPT_REGISTERS:
+            self.check_interrupts()
+
         return
 
     def MULTIPLY(self):
@@ -582,6 +2121,9 @@ class CPU:
 
         self.write_register(reg_a, result)
 
+        if reg_a in self.INTERRUPT_REGISTERS:
+            self.check_interrupts()
+
         return
 
     def DIVIDE(self):
@@ -594,10 +2136,17 @@ class CPU:
         value_a = self.read_register(reg_a)
         value_b = self.read_register(reg_b)
 
+        if value_b == 0:
+            self.divide_by_zero()
+            return
+
         result = value_a // value_b
 
         self.write_register(reg_a, result)
 
+        if reg_a in self.INTERRUPT_REGISTERS:
+            self.check_interrupts()
+
         return
 
     def MODULO(self):
@@ -610,10 +2159,17 @@ class CPU:
         value_a = self.read_register(reg_a)
         value_b = self.read_register(reg_b)
 
+        if value_b == 0:
+            self.divide_by_zero()
+            return
+
         result = value_a % value_b
 
         self.write_register(reg_a, result)
 
+        if reg_a in self.INTERRUPT_REGISTERS:
+            self.check_interrupts()
+
         return
 
     def COMPARE(self):
@@ -646,6 +2202,9 @@ class CPU:
 
         self.write_register(reg_a, result)
 
+        if reg_a in self.INTERRUPT_REGISTERS:
+            self.check_interrupts()
+
         return
 
     def BITWISE_OR(self):
@@ -662,6 +2221,9 @@ class CPU:
 
         self.write_register(reg_a, result)
 
+        if reg_a in self.INTERRUPT_REGISTERS:
+            self.check_interrupts()
+
         return
 
     def BITWISE_XOR(self):
@@ -678,6 +2240,9 @@ class CPU:
 
         self.write_register(reg_a, result)
 
+        if reg_a in self.INTERRUPT_REGISTERS:
+            self.check_interrupts()
+
         return
 
     def BITWISE_SHIFT_LEFT(self):
@@ -694,6 +2259,9 @@ class CPU:
 
         self.write_register(reg_a, result)
 
+        if reg_a in self.INTERRUPT_REGISTERS:
+            self.check_interrupts()
+
         return
 
     def BITWISE_SHIFT_RIGHT(self):
@@ -710,6 +2278,9 @@ class CPU:
 
         self.write_register(reg_a, result)
 
+        if reg_a in self.INTERRUPT_REGISTERS:
+            self.check_interrupts()
+
         return
 
     ############################################################
@@ -718,33 +2289,33 @@ class CPU:
 
     @property
     def flag_eq(self):
-        return CPU.MASKS.is_masked_by(self.flags, CPU.MASKS.FLAG_EQ)
+        return self.MASKS.is_masked_by(self.flags, self.MASKS.FLAG_EQ)
 
     @flag_eq.setter
     def flag_eq(self, value):
-        self.flags = CPU.MASKS.toggle_masked(value, self.flags, CPU.MASKS.FLAG_EQ)
+        self.flags = self.MASKS.toggle_masked(value, self.flags, self.MASKS.FLAG_EQ)
         return
 
     #-----------------------------------------------------------
 
     @property
     def flag_gt(self):
-        return CPU.MASKS.is_masked_by(self.flags, CPU.MASKS.FLAG_GT)
+        return self.MASKS.is_masked_by(self.flags, self.MASKS.FLAG_GT)
 
     @flag_gt.setter
     def flag_gt(self, value):
-        self.flags = CPU.MASKS.toggle_masked(value, self.flags, CPU.MASKS.FLAG_GT)
+        self.flags = self.MASKS.toggle_masked(value, self.flags, self.MASKS.FLAG_GT)
         return
 
     #-----------------------------------------------------------
 
     @property
     def flag_lt(self):
-        return CPU.MASKS.is_masked_by(self.flags, CPU.MASKS.FLAG_LT)
+        return self.MASKS.is_masked_by(self.flags, self.MASKS.FLAG_LT)
 
     @flag_lt.setter
     def flag_lt(self, value):
-        self.flags = CPU.MASKS.toggle_masked(value, self.flags, CPU.MASKS.FLAG_LT)
+        self.flags = self.MASKS.toggle_masked(value, self.flags, self.MASKS.FLAG_LT)
         return
 
     #-----------------------------------------------------------
@@ -779,3 +2350,26 @@ class CPU:
     def flag_nlt(self, value):
         self.flag_gt = (not value)
         return
+
+
+############################################################
+#   WIDE CPU
+############################################################
+
+
+class WideCPU(CPU):
+    """
+    16-bit LS-8 variant: 16-bit words and registers, and 64K words of
+    `array`-backed memory. Operation codes are unchanged (the low 8 bits of
+    an instruction word); the stack starts at `0xFFF4` and the interrupt
+    vectors are at `0xFFF8`-`0xFFFF`.
+    """
+
+    ############################################################
+
+    CONSTANTS = ProcessorConstants(16)
+    MASKS = ProcessorMasks(CONSTANTS)
+    OPERATIONS = ProcessorOperations(CONSTANTS, MASKS)
+    FUSIONS = ProcessorFusions(CONSTANTS, OPERATIONS)
+
+    MEMORY_TYPECODE = "H"
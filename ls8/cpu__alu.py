@@ -0,0 +1,254 @@
+"""
+Generate a table-driven ALU for a computer processor.
+
+Every ALU operation on a small word has few enough inputs to precompute:
+binary operations are tables indexed by `(value_a << BIT_COUNT) | value_b`,
+unary ones by `value_a`. `CMP` has a table of `FL` bytes. Tables are built
+the first time they are used, so they cost nothing at startup.
+"""
+
+############################################################
+
+from array import array
+
+############################################################
+
+# the largest word size the tables are built for
+MAX_BIT_COUNT = 8
+
+UNARY = {
+    "INC": (lambda word, a: a + 1),
+    "DEC": (lambda word, a: a - 1),
+    "NOT": (lambda word, a: word - a),
+}
+
+# `None` means "divide by zero"
+BINARY = {
+    "ADD": (lambda word, a, b: a + b),
+    "SUB": (lambda word, a, b: a - b),
+    "MUL": (lambda word, a, b: a * b),
+    "DIV": (lambda word, a, b: None if b == 0 else a // b),
+    "MOD": (lambda word, a, b: None if b == 0 else a % b),
+    "AND": (lambda word, a, b: a & b),
+    "OR": (lambda word, a, b: a | b),
+    "XOR": (lambda word, a, b: a ^ b),
+    "SHL": (lambda word, a, b: a << b),
+    "SHR": (lambda word, a, b: a >> b),
+}
+
+COMPARE = "CMP"
+
+############################################################
+
+
+class ProcessorALU:
+
+    def __init__(self, constants, masks, operations):
+
+        if constants.BIT_COUNT > MAX_BIT_COUNT:
+            raise ValueError(
+                f"a table-driven ALU needs a word of at most {MAX_BIT_COUNT} bits, not {constants.BIT_COUNT}"
+            )
+
+        self.constants = constants
+        self.masks = masks
+        self.operations = operations
+
+        # marks "divide by zero" in the `DIV` and `MOD` tables
+        self.DIVIDE_BY_ZERO = constants.WORD_SIZE
+
+        self.tables = {}
+
+        return
+
+    def __str__(self):
+
+        return str(self.__dict__)
+
+    def __getitem__(self, code_name):
+        """
+        Get the table of the operation named `code_name`, building it first
+        if needed.
+        """
+
+        table = self.tables.get(code_name)
+
+        if table is None:
+            table = self.tables[code_name] = self.build_table(code_name)
+
+        return table
+
+    def build_table(self, code_name):
+
+        word = self.masks.WORD
+        values = range(self.constants.WORD_SIZE)
+
+        if code_name in UNARY:
+
+            fun = UNARY[code_name]
+
+            return bytes(fun(word, a) & word for a in values)
+
+        if code_name == COMPARE:
+
+            return bytes(
+                (self.masks.FLAG_LT if a < b else self.masks.FLAG_GT if a > b else self.masks.FLAG_EQ)
+                for a in values for b in values
+            )
+
+        fun = BINARY[code_name]
+
+        if code_name in ("DIV", "MOD"):
+
+            return array("H", (
+                self.DIVIDE_BY_ZERO if result is None else result & word
+                for result in (fun(word, a, b) for a in values for b in values)
+            ))
+
+        return bytes(fun(word, a, b) & word for a in values for b in values)
+
+    #-----------------------------------------------------------
+
+    def handlers(self):
+        """
+        Get dispatch-table handlers for every ALU operation, as `code: handler`.
+        Each reads its operands as instruction words, like instruction fetch,
+        and builds its table on its first call, so only the operations a
+        program runs cost a table.
+        """
+
+        handlers = {}
+
+        for code in self.operations:
+
+            if not self.operations.USES_ALU[code]:
+                continue
+
+            code_name = self.operations.CODE_NAME[code]
+
+            if code_name in UNARY:
+                handlers[code] = self.unary_handler(code_name)
+            elif code_name == COMPARE:
+                handlers[code] = self.compare_handler(code_name)
+            elif code_name in ("DIV", "MOD"):
+                handlers[code] = self.divide_handler(code_name)
+            else:
+                handlers[code] = self.binary_handler(code_name)
+
+        return handlers
+
+    def interrupt_registers(self):
+        """
+        Get the registers whose writes may leave an interrupt to service.
+        """
+
+        return (
+            self.constants.REGISTER_OF_INTERRUPT_MASK,
+            self.constants.REGISTER_OF_INTERRUPT_STATUS,
+        )
+
+    def unary_handler(self, code_name):
+
+        interrupt_registers = self.interrupt_registers()
+        table = None    # built on the first call
+
+        def handler(cpu):
+
+            nonlocal table
+            if table is None:
+                table = self[code_name]
+
+            reg_a = cpu.memory[cpu.program_pointer + 1]
+            register = cpu.register
+
+            register[reg_a] = table[register[reg_a]]
+
+            if reg_a in interrupt_registers:
+                cpu.check_interrupts()
+
+            return
+
+        return handler
+
+    def binary_handler(self, code_name):
+
+        interrupt_registers = self.interrupt_registers()
+        shift = self.constants.BIT_COUNT
+        table = None    # built on the first call
+
+        def handler(cpu):
+
+            nonlocal table
+            if table is None:
+                table = self[code_name]
+
+            pp = cpu.program_pointer
+            memory = cpu.memory
+            register = cpu.register
+
+            reg_a = memory[pp + 1]
+
+            register[reg_a] = table[(register[reg_a] << shift) | register[memory[pp + 2]]]
+
+            if reg_a in interrupt_registers:
+                cpu.check_interrupts()
+
+            return
+
+        return handler
+
+    def divide_handler(self, code_name):
+
+        interrupt_registers = self.interrupt_registers()
+        shift = self.constants.BIT_COUNT
+        divide_by_zero = self.DIVIDE_BY_ZERO
+        table = None    # built on the first call
+
+        def handler(cpu):
+
+            nonlocal table
+            if table is None:
+                table = self[code_name]
+
+            pp = cpu.program_pointer
+            memory = cpu.memory
+            register = cpu.register
+
+            reg_a = memory[pp + 1]
+
+            result = table[(register[reg_a] << shift) | register[memory[pp + 2]]]
+
+            if result == divide_by_zero:
+                cpu.divide_by_zero()
+                return
+
+            register[reg_a] = result
+
+            if reg_a in interrupt_registers:
+                cpu.check_interrupts()
+
+            return
+
+        return handler
+
+    def compare_handler(self, code_name):
+
+        shift = self.constants.BIT_COUNT
+        keep = self.masks.WORD - self.masks.FLAG_COMPARE
+        table = None    # built on the first call
+
+        def handler(cpu):
+
+            nonlocal table
+            if table is None:
+                table = self[code_name]
+
+            pp = cpu.program_pointer
+            memory = cpu.memory
+            register = cpu.register
+
+            cpu.flags = (cpu.flags & keep) | table[(register[memory[pp + 1]] << shift) | register[memory[pp + 2]]]
+
+            return
+
+        return handler
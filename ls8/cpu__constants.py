@@ -6,37 +6,51 @@ Generate basic constants for a computer processor.
 
 import math
 
-from tools.numbers import (
-    int_to_str,
-    DEFAULT__INCLUDE_BASE__BETWEEN as BETWEEN,
-    DEFAULT__INCLUDE_BASE__BEFORE_BASE as BEFORE_BASE,
-    DEFAULT__INCLUDE_BASE__AFTER_BASE as AFTER_BASE,
-)
+# `tools.numbers` is only needed for formatting (debug output), so it is
+# imported in `_format_as_base` rather than here, to keep startup fast.
 
 ############################################################
 
 
 class ProcessorConstants:
 
-    def __init__(self, bit_count):
+    def __init__(self, bit_count, register_count=8, operation_bit_count=8):
 
         self.BIT_COUNT = bit_count
         self.WORD_SIZE = 2 ** self.BIT_COUNT
 
-        self.REGISTER_OF_STACK_POINTER = self.BIT_COUNT - 1
+        self.REGISTER_COUNT = register_count
+        self.REGISTER_OF_STACK_POINTER = self.REGISTER_COUNT - 1
         self.REGISTER_OF_INTERRUPT_STATUS = self.REGISTER_OF_STACK_POINTER - 1
         self.REGISTER_OF_INTERRUPT_MASK = self.REGISTER_OF_INTERRUPT_STATUS - 1
 
+        # memory specification
+
+        self.PAGE__WIDTH = 4
+        self.PAGE_SIZE = 2 ** self.PAGE__WIDTH
+        self.PAGE_COUNT = self.WORD_SIZE // self.PAGE_SIZE
+
+        # the top of memory, counting down: interrupt vectors, then key pressed
+
+        self.INTERRUPT_COUNT = 8
+        self.ADDRESS_OF_INTERRUPT_VECTORS = self.WORD_SIZE - self.INTERRUPT_COUNT
+        self.ADDRESS_OF_KEY_PRESSED = self.ADDRESS_OF_INTERRUPT_VECTORS - 4
+        self.ADDRESS_OF_STACK_START = self.ADDRESS_OF_KEY_PRESSED
+
         # operations specification
+        # (operation codes are the low `operation_bit_count` bits of a word)
+
+        self.OPERATION_BIT_COUNT = operation_bit_count
+        self.OPERATION_CODE_COUNT = 2 ** self.OPERATION_BIT_COUNT
 
         self.OPERATION_ARGS__WIDTH = 2
-        self.OPERATION_ARGS__SHIFT = self.BIT_COUNT - 2
+        self.OPERATION_ARGS__SHIFT = self.OPERATION_BIT_COUNT - 2
 
         self.OPERATION_USES_ALU__WIDTH = 1
-        self.OPERATION_USES_ALU__SHIFT = self.BIT_COUNT - 3
+        self.OPERATION_USES_ALU__SHIFT = self.OPERATION_BIT_COUNT - 3
 
         self.OPERATION_SETS_POINTER__WIDTH = 1
-        self.OPERATION_SETS_POINTER__SHIFT = self.BIT_COUNT - 4
+        self.OPERATION_SETS_POINTER__SHIFT = self.OPERATION_BIT_COUNT - 4
 
         self.OPERATION_IDENTIFIER__WIDTH = 4
         self.OPERATION_IDENTIFIER__SHIFT = 0
@@ -63,6 +77,13 @@ class ProcessorConstants:
 
     def _format_as_base(self, number, base, width):
 
+        from tools.numbers import (
+            int_to_str,
+            DEFAULT__INCLUDE_BASE__BETWEEN as BETWEEN,
+            DEFAULT__INCLUDE_BASE__BEFORE_BASE as BEFORE_BASE,
+            DEFAULT__INCLUDE_BASE__AFTER_BASE as AFTER_BASE,
+        )
+
         base_str = f"{BEFORE_BASE}{base}{AFTER_BASE}"
         number_str = int_to_str(number, base=base, width=width)
 
@@ -0,0 +1,247 @@
+"""
+Generate superinstructions (fused operation pairs) for the LS-8 CPU.
+"""
+
+############################################################
+
+from .cpu__operations import OPERATIONS
+
+############################################################
+
+# Each entry is `leader: followers`. The leader never sets the pointer and
+# every follower always does, so a fused pair is exactly "run the leader,
+# step over it, run the follower". An `LDI` to an interrupt register is never
+# fused, since an interrupt it unmasks must be entered before the follower.
+
+FUSIBLE = {
+    "LDI": ("JMP", "JEQ", "JNE", "JGT", "JLT", "JLE", "JGE", "CALL"),
+    "CMP": ("JEQ", "JNE", "JGT", "JLT", "JLE", "JGE"),
+}
+
+# How each conditional jump decides: the flag it tests, and whether that flag
+# must be set for the jump to be taken.
+
+JUMP_CONDITIONS = {
+    "JEQ": ("FLAG_EQ", True),
+    "JNE": ("FLAG_EQ", False),
+    "JGT": ("FLAG_GT", True),
+    "JLT": ("FLAG_LT", True),
+    "JLE": ("FLAG_GT", False),
+    "JGE": ("FLAG_LT", False),
+}
+
+FUSIBLE_CODES = frozenset(
+    code for (code, operation) in OPERATIONS.items()
+    if operation["code_name"] in FUSIBLE
+)
+
+############################################################
+
+
+class ProcessorFusions:
+
+    def __init__(self, constants, operations):
+
+        fusions = [None]    # kind `0` means "not fused"
+        kinds = {}
+
+        for (leader_name, follower_names) in FUSIBLE.items():
+
+            leader = operations.CODES[leader_name]
+
+            for follower_name in follower_names:
+
+                follower = operations.CODES[follower_name]
+
+                kinds[(leader, follower)] = len(fusions)
+                fusions.append({
+                    "leader": leader,
+                    "follower": follower,
+                    "leader_width": operations.WIDTH[leader],
+                    "width": operations.WIDTH[leader] + operations.WIDTH[follower],
+                    "code_name": f"{leader_name}+{follower_name}",
+                    "leader_name": leader_name,
+                    "follower_name": follower_name,
+                })
+
+        self.operations = operations
+        self.load_immediate = operations.CODES["LDI"]
+        self.interrupt_registers = (
+            constants.REGISTER_OF_INTERRUPT_MASK,
+            constants.REGISTER_OF_INTERRUPT_STATUS,
+        )
+        self.fusions = fusions
+        self.kinds = kinds
+        self.MAX_WIDTH = max(fusion["width"] for fusion in fusions[1:])
+
+        return
+
+    def __str__(self):
+
+        return str(self.__dict__)
+
+    def __getitem__(self, kind):
+
+        return self.fusions[kind]
+
+    def __len__(self):
+
+        return len(self.fusions)
+
+    def kind_at(self, memory, address):
+        """
+        Get the kind of the fused pair starting at `address` in `memory`.
+        Returns `0` if the words there do not form a fusible pair.
+        """
+
+        leader = memory[address]
+
+        if leader not in FUSIBLE_CODES:
+            return 0
+
+        follower_address = address + self.operations.WIDTH[leader]
+
+        if follower_address >= len(memory):
+            return 0
+
+        if leader == self.load_immediate and memory[address + 1] in self.interrupt_registers:
+            return 0
+
+        return self.kinds.get((leader, memory[follower_address]), 0)
+
+    def handler(self, kind, masks):
+        """
+        Get a function running the fused pair of `kind` in one step, as the
+        plain handlers of its leader and follower would. Operands are read
+        straight from memory, as `kind_at` does, and a `CMP` pair decides
+        its branch from the comparison rather than reading `FL` back.
+        """
+
+        fusion = self.fusions[kind]
+
+        width = fusion["leader_width"]
+        follower_name = fusion["follower_name"]
+
+        if fusion["leader_name"] == "LDI":
+            return _load_immediate_and(follower_name, width, masks)
+
+        return _compare_and(follower_name, width, masks)
+
+
+############################################################
+
+
+def _load_immediate_and(follower_name, width, masks):
+    """
+    Fuse `LDI` with the jump or call `follower_name`.
+    """
+
+    target_offset = width + 1
+    return_offset = width + 2
+
+    if follower_name == "JMP":
+
+        def fused_handler(cpu):
+
+            memory = cpu.memory
+            register = cpu.register
+            pp = cpu.program_pointer
+
+            register[memory[pp + 1]] = memory[pp + 2]
+            cpu.program_pointer = pp + width
+            cpu.program_pointer = register[memory[pp + target_offset]]
+            cpu.branch_count += 1
+
+            return
+
+    elif follower_name == "CALL":
+
+        def fused_handler(cpu):
+
+            memory = cpu.memory
+            register = cpu.register
+            pp = cpu.program_pointer
+
+            register[memory[pp + 1]] = memory[pp + 2]
+            cpu.program_pointer = pp + width
+
+            # read the target before the push, which may change it
+            target = register[memory[pp + target_offset]]
+            cpu.push_value(pp + return_offset)
+            cpu.program_pointer = target
+
+            cpu.call_depth += 1
+            if cpu.call_depth > cpu.max_call_depth:
+                cpu.max_call_depth = cpu.call_depth
+
+            return
+
+    else:
+
+        (mask_name, when_set) = JUMP_CONDITIONS[follower_name]
+        mask = getattr(masks, mask_name)
+
+        def fused_handler(cpu):
+
+            memory = cpu.memory
+            register = cpu.register
+            pp = cpu.program_pointer
+
+            register[memory[pp + 1]] = memory[pp + 2]
+            cpu.program_pointer = pp + width
+
+            if bool(cpu.flags & mask) is when_set:
+                cpu.program_pointer = register[memory[pp + target_offset]]
+                cpu.branch_count += 1
+            else:
+                cpu.program_pointer = pp + return_offset
+
+            return
+
+    return fused_handler
+
+
+def _compare_and(follower_name, width, masks):
+    """
+    Fuse `CMP` with the conditional jump `follower_name`.
+    """
+
+    target_offset = width + 1
+    return_offset = width + 2
+
+    (mask_name, when_set) = JUMP_CONDITIONS[follower_name]
+    mask = getattr(masks, mask_name)
+
+    kept = masks.WORD & ~masks.FLAG_COMPARE
+    flag_eq = masks.FLAG_EQ
+    flag_gt = masks.FLAG_GT
+    flag_lt = masks.FLAG_LT
+
+    def fused_handler(cpu):
+
+        memory = cpu.memory
+        register = cpu.register
+        pp = cpu.program_pointer
+
+        value_a = register[memory[pp + 1]]
+        value_b = register[memory[pp + 2]]
+
+        if value_a < value_b:
+            compared = flag_lt
+        elif value_a > value_b:
+            compared = flag_gt
+        else:
+            compared = flag_eq
+
+        cpu.flags = (cpu.flags & kept) | compared
+        cpu.program_pointer = pp + width
+
+        if bool(compared & mask) is when_set:
+            cpu.program_pointer = register[memory[pp + target_offset]]
+            cpu.branch_count += 1
+        else:
+            cpu.program_pointer = pp + return_offset
+
+        return
+
+    return fused_handler
@@ -0,0 +1,73 @@
+"""
+Hold the execution hooks of a computer processor.
+
+Hooks are plain functions, called with the CPU first:
+
+    on_instruction(cpu, address, code)    after an instruction runs
+    on_read(cpu, address, value)    after a data read of memory
+    on_write(cpu, address, value)    after a write to memory
+    on_register_write(cpu, register, value)    after a write to a register
+    on_interrupt(cpu, number)    after entering an interrupt handler
+    on_interrupt_return(cpu)    after `IRET` restores the interrupted state
+    on_halt(cpu, reason)    when the CPU stops
+
+Reads of the words of the running instruction are its fetch, and are not
+reported to `on_read`. Moving SP by the stack operations is not reported to
+`on_register_write`; their memory traffic is reported instead.
+"""
+
+############################################################
+
+EVENTS = (
+    "on_instruction",
+    "on_read",
+    "on_write",
+    "on_register_write",
+    "on_interrupt",
+    "on_interrupt_return",
+    "on_halt",
+)
+
+############################################################
+
+
+class ProcessorHooks:
+
+    def __init__(self):
+
+        for event in EVENTS:
+            setattr(self, event, [])
+
+        return
+
+    def __str__(self):
+
+        return str(self.__dict__)
+
+    def __bool__(self):
+
+        return any(getattr(self, event) for event in EVENTS)
+
+    def add(self, event, hook):
+        """
+        Call `hook` on `event`, after the hooks already there.
+        """
+
+        if event not in EVENTS:
+            raise ValueError(f"unknown hook event: {event!r}")
+
+        getattr(self, event).append(hook)
+
+        return
+
+    def remove(self, event, hook):
+        """
+        Stop calling `hook` on `event`.
+        """
+
+        if event not in EVENTS:
+            raise ValueError(f"unknown hook event: {event!r}")
+
+        getattr(self, event).remove(hook)
+
+        return
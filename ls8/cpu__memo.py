@@ -0,0 +1,547 @@
+"""
+Memoize pure subroutines of a computer processor.
+
+A subroutine is pure when its effects depend only on its input registers:
+it only computes in registers, moves the stack within its own frame, and
+calls other pure subroutines. No memory access outside the frame, no I/O,
+no interrupts, and no writes to IM, IS or SP other than through the stack.
+
+The first `CALL` of a pure subroutine with given inputs runs the body one
+instruction at a time and records what it did: the registers and flags it
+left, the words it left in its frame, and how many instructions it ran.
+Later calls with the same inputs apply the record instead of running the
+body. Records are kept in a bounded LRU cache.
+
+Calls are only memoized while IM is 0, since an interrupt could otherwise
+be serviced in the middle of the body. A memoized call counts all of its
+instructions, but runs as a whole, so it may take `run` past its limits.
+"""
+
+############################################################
+
+from collections import OrderedDict
+
+############################################################
+
+DEFAULT__CAPACITY = 4096    # records
+
+# instructions a recording may run before it is abandoned
+MAX_RECORDING = 1 << 16
+
+# operations allowed in a pure body
+PURE = frozenset((
+    "NOP",
+    "LDI",
+    "INC",
+    "DEC",
+    "NOT",
+    "ADD",
+    "SUB",
+    "MUL",
+    "DIV",
+    "MOD",
+    "CMP",
+    "AND",
+    "OR",
+    "XOR",
+    "SHL",
+    "SHR",
+    "PUSH",
+    "POP",
+    "JMP",
+    "JEQ",
+    "JNE",
+    "JGT",
+    "JLT",
+    "JLE",
+    "JGE",
+    "CALL",
+    "RET",
+))
+
+JUMPS = frozenset(("JMP", ))
+CONDITIONAL_JUMPS = frozenset(("JEQ", "JNE", "JGT", "JLT", "JLE", "JGE"))
+
+# operations that write their first register operand
+WRITES_REGISTER = frozenset((
+    "LDI",
+    "POP",
+    "INC",
+    "DEC",
+    "NOT",
+    "ADD",
+    "SUB",
+    "MUL",
+    "DIV",
+    "MOD",
+    "AND",
+    "OR",
+    "XOR",
+    "SHL",
+    "SHR",
+))
+
+# stands for FL among the registers read and written
+FLAGS = "FL"
+
+############################################################
+
+
+class PureSubroutine:
+
+    def __init__(self, entry, instructions, inputs, uses_flags, outputs, sets_flags):
+
+        self.entry = entry
+        self.instructions = instructions    # address -> Instruction
+        self.inputs = inputs    # sorted registers whose values the body reads
+        self.uses_flags = uses_flags    # if the body reads FL before setting it
+        self.outputs = outputs    # sorted registers the body (or a callee) may write
+        self.sets_flags = sets_flags    # if the body (or a callee) may set FL
+
+        return
+
+    def __str__(self):
+
+        return str(self.__dict__)
+
+
+class MemoRecord:
+
+    def __init__(self, register, flags, frame, instruction_count):
+
+        self.register = register    # the values of the subroutine's outputs, afterwards
+        self.flags = flags    # `None` if the subroutine leaves FL alone
+        self.frame = frame    # the words left below the return address
+        self.instruction_count = instruction_count    # the body's, and its callees'
+
+        return
+
+    def __str__(self):
+
+        return str(self.__dict__)
+
+
+############################################################
+
+
+class ProcessorMemo:
+
+    def __init__(self, cpu, capacity=DEFAULT__CAPACITY):
+
+        self.cpu = cpu
+        self.capacity = capacity
+
+        self.subroutines = None    # entry -> PureSubroutine, found on first use
+        self.records = OrderedDict()    # (entry, inputs...) -> MemoRecord
+
+        # bumped by every `invalidate`, so that a recording that saw its
+        # code change is not kept
+        self.generation = 0
+
+        # the lowest stack address written by the last call that finished
+        self.low_water = None
+
+        self.hits = 0
+        self.misses = 0
+
+        return
+
+    def __str__(self):
+
+        return str(self.__dict__)
+
+    #-----------------------------------------------------------
+
+    def analyse(self):
+        """
+        Find the pure subroutines of the loaded image, and flag the pages of
+        their code so that writes there invalidate the records.
+        """
+
+        from .analysis import build_cfg
+
+        cpu = self.cpu
+        cfg = build_cfg(cpu.memory, operations=cpu.OPERATIONS, constants=cpu.CONSTANTS)
+
+        bodies = {
+            entry: {
+                instruction.address: instruction
+                for start in starts
+                for instruction in cfg.blocks[start].instructions
+            }
+            for (entry, starts) in cfg.subroutines.items()
+        }
+
+        candidates = {entry for (entry, body) in bodies.items() if entry in body and self.is_local(body)}
+
+        # a subroutine stays pure only if everything it calls does
+        changed = True
+
+        while changed:
+            changed = False
+            for entry in sorted(candidates):
+                for instruction in bodies[entry].values():
+                    if instruction.code_name == "CALL" and instruction.target not in candidates:
+                        candidates.discard(entry)
+                        changed = True
+                        break
+
+        self.subroutines = {}
+
+        # callees first, so that calls can use what their callees read and write
+        for entry in self.call_order(candidates, bodies):
+
+            body = bodies[entry]
+
+            (inputs, uses_flags) = self.live_inputs(entry, body)
+            (outputs, sets_flags) = self.written(body)
+
+            self.subroutines[entry] = PureSubroutine(
+                entry, body, tuple(sorted(inputs)), uses_flags, tuple(sorted(outputs)), sets_flags,
+            )
+
+        for subroutine in self.subroutines.values():
+            for instruction in subroutine.instructions.values():
+                for address in (instruction.address, instruction.address + instruction.width - 1):
+                    cpu.page_flags[address >> cpu.CONSTANTS.PAGE__WIDTH] |= cpu.PAGE_FLAG__MEMO
+
+        return
+
+    def is_local(self, body):
+        """
+        Test if `body` only uses pure operations, leaves IM, IS and SP to the
+        stack operations, and only jumps within itself.
+        """
+
+        constants = self.cpu.CONSTANTS
+        reserved = (
+            constants.REGISTER_OF_INTERRUPT_MASK,
+            constants.REGISTER_OF_INTERRUPT_STATUS,
+            constants.REGISTER_OF_STACK_POINTER,
+        )
+
+        for instruction in body.values():
+
+            name = instruction.code_name
+            registers = instruction.operands[:1] if name == "LDI" else instruction.operands
+
+            if name not in PURE:
+                return False
+
+            if any(r >= constants.REGISTER_COUNT or r in reserved for r in registers):
+                return False
+
+            if name in JUMPS or name in CONDITIONAL_JUMPS:
+                if instruction.target not in body:
+                    return False
+
+            if name == "CALL" and instruction.target is None:
+                return False
+
+        return True
+
+    def call_order(self, entries, bodies):
+        """
+        Order `entries` so that every subroutine comes after its callees.
+        Recursive subroutines are left out.
+        """
+
+        order = []
+        state = {}
+
+        def visit(entry):
+
+            if entry not in entries:
+                return False
+
+            if entry in state:
+                return state[entry]
+
+            # anything reached again before this is done is recursive
+            state[entry] = False
+
+            for instruction in bodies[entry].values():
+                if instruction.code_name == "CALL" and not visit(instruction.target):
+                    return False
+
+            state[entry] = True
+            order.append(entry)
+
+            return True
+
+        for entry in sorted(entries):
+            visit(entry)
+
+        return order
+
+    def live_inputs(self, entry, body):
+        """
+        Get the registers read on some path through `body`, from `entry`,
+        before they are written, and whether FL is.
+        """
+
+        uses = {}
+        defines = {}
+        successors = {}
+
+        for (address, instruction) in body.items():
+
+            name = instruction.code_name
+            operands = instruction.operands
+            fall = address + instruction.width
+
+            used = set()
+            defined = set()
+
+            if name == "CALL":
+                callee = self.subroutines[instruction.target]
+                used.update(operands)
+                used.update(callee.inputs)
+                defined.update(callee.outputs)
+                if callee.uses_flags:
+                    used.add(FLAGS)
+                if callee.sets_flags:
+                    defined.add(FLAGS)
+            elif name in ("LDI", "POP"):
+                defined.add(operands[0])
+            else:
+                used.update(operands)
+                if name in WRITES_REGISTER:
+                    defined.add(operands[0])
+
+            if name == "CMP":
+                defined.add(FLAGS)
+
+            if name in CONDITIONAL_JUMPS:
+                used.add(FLAGS)
+
+            uses[address] = used
+            defines[address] = defined
+
+            if name == "RET":
+                successors[address] = ()
+            elif name in JUMPS:
+                successors[address] = (instruction.target, )
+            elif name in CONDITIONAL_JUMPS:
+                successors[address] = (instruction.target, fall)
+            else:
+                successors[address] = (fall, )
+
+        live = {address: set() for address in body}
+
+        changed = True
+
+        while changed:
+            changed = False
+            for address in sorted(body, reverse=True):
+                live_out = set()
+                for successor in successors[address]:
+                    live_out |= live.get(successor, set())
+                live_in = uses[address] | (live_out - defines[address])
+                if live_in != live[address]:
+                    live[address] = live_in
+                    changed = True
+
+        return ({r for r in live[entry] if r != FLAGS}, FLAGS in live[entry])
+
+    def written(self, body):
+        """
+        Get the registers that `body` or its callees may write, and whether
+        they may set FL.
+        """
+
+        outputs = set()
+        sets_flags = False
+
+        for instruction in body.values():
+
+            name = instruction.code_name
+
+            if name == "CALL":
+                callee = self.subroutines[instruction.target]
+                outputs.update(callee.outputs)
+                sets_flags = sets_flags or callee.sets_flags
+            elif name in WRITES_REGISTER:
+                outputs.add(instruction.operands[0])
+            elif name == "CMP":
+                sets_flags = True
+
+        return (outputs, sets_flags)
+
+    #-----------------------------------------------------------
+
+    def invalidate(self):
+        """
+        Forget every subroutine and record, after a write into their code.
+        """
+
+        cpu = self.cpu
+
+        for page in range(len(cpu.page_flags)):
+            cpu.page_flags[page] &= ~cpu.PAGE_FLAG__MEMO
+
+        self.subroutines = None
+        self.records.clear()
+        self.generation += 1
+
+        return
+
+    def call(self):
+        """
+        Run the `CALL` at the program pointer, from a record if there is one.
+        """
+
+        cpu = self.cpu
+
+        if self.subroutines is None:
+            self.analyse()
+
+        pp = cpu.program_pointer
+        register = cpu.register
+
+        target = register[cpu.memory[pp + 1]]
+        subroutine = self.subroutines.get(target)
+
+        # an unmasked interrupt could be serviced in the middle of the body,
+        # and a watchpoint must see every access the body makes
+        if subroutine is None or cpu.interrupt_mask or cpu.watches:
+            cpu.CALL()
+            self.low_water = None
+            return
+
+        key = (target, ) + tuple(register[r] for r in subroutine.inputs)
+        if subroutine.uses_flags:
+            key += (cpu.flags, )
+
+        record = self.records.get(key)
+
+        if record is None:
+            self.misses += 1
+            self.record(subroutine, key, pp + 2)
+            return
+
+        self.records.move_to_end(key)
+        self.hits += 1
+
+        self.apply(subroutine, record, pp + 2)
+
+        return
+
+    def apply(self, subroutine, record, return_address):
+        """
+        Do what the recorded call did: leave its frame on the stack, below
+        the stack pointer, and its outputs in the registers.
+        """
+
+        cpu = self.cpu
+        register = cpu.register
+
+        frame_top = cpu.stack_pointer - 1
+        low = frame_top - len(record.frame)
+
+        cpu.write_memory(frame_top, return_address)
+
+        for (offset, word) in enumerate(record.frame):
+            cpu.write_memory(low + offset, word)
+
+        for (r, value) in zip(subroutine.outputs, record.register):
+            register[r] = value
+
+        if record.flags is not None:
+            cpu.flags = record.flags
+
+        cpu.program_pointer = return_address
+        cpu.instruction_count += record.instruction_count
+
+        self.low_water = low
+
+        return
+
+    def drop(self):
+        """
+        Drop the recording in progress, and make the run loop return so that
+        its limits are checked before the rest of the body runs.
+        """
+
+        self.low_water = None
+        self.cpu.should_continue = False
+
+        return
+
+    def record(self, subroutine, key, return_address):
+        """
+        Run the call one instruction at a time, and keep a record of it.
+        If the body leaves its code, reads the stack above its frame, or
+        runs into `until_pc` or the end of `run`, the recording is dropped,
+        and the caller's loop is made to check its limits and run the rest
+        of the body.
+        """
+
+        cpu = self.cpu
+        register = cpu.register
+        instructions = subroutine.instructions
+
+        generation = self.generation
+        stack_pointer = cpu.stack_pointer
+        instruction_count = cpu.instruction_count
+
+        cpu.CALL()
+
+        low = cpu.stack_pointer
+
+        while cpu.program_pointer != return_address or cpu.stack_pointer != stack_pointer:
+
+            pp = cpu.program_pointer
+
+            too_long = cpu.instruction_count - instruction_count > MAX_RECORDING
+            must_stop = cpu.stop_count is not None and cpu.instruction_count >= cpu.stop_count
+
+            if pp not in instructions or cpu.fused[pp] == cpu.FUSED__UNTIL_PC or too_long or must_stop:
+                self.drop()
+                return
+
+            self.low_water = None
+
+            cpu.step(1)
+
+            if cpu.halted:
+                return
+
+            # popping the return address, or above it, reads the caller's frame
+            if cpu.stack_pointer >= stack_pointer and cpu.program_pointer != return_address:
+                self.drop()
+                return
+
+            low = min(low, cpu.stack_pointer)
+            if self.low_water is not None:
+                low = min(low, self.low_water)
+
+        self.low_water = low
+
+        if self.generation != generation:
+            return
+
+        self.records[key] = MemoRecord(
+            tuple(register[r] for r in subroutine.outputs),
+            cpu.flags if subroutine.sets_flags else None,
+            tuple(cpu.memory[low:(stack_pointer - 1)]),
+            cpu.instruction_count - instruction_count,
+        )
+
+        if len(self.records) > self.capacity:
+            self.records.popitem(last=False)
+
+        return
+
+
+############################################################
+
+
+def call_handler(cpu):
+    """
+    The dispatch-table handler of `CALL` for a CPU built with `memoize`.
+    """
+
+    cpu.memo.call()
+
+    return
@@ -4,11 +4,13 @@ Generate operations for the LS-8 CPU.
 
 ############################################################
 
-from .cpu__masks import _block, _unblock
+from types import MappingProxyType
+
+from .cpu__masks import _unblock
 
 ############################################################
 
-OPERATIONS = {
+_OPERATIONS = {
     0b00000000: {
         "name": "NO_OPERATION",
         "code_name": "NOP",
@@ -41,6 +43,10 @@ OPERATIONS = {
         "name": "PRINT_ALPHA",
         "code_name": "PRA",
     },
+    0b01001001: {
+        "name": "CORE_ID",
+        "code_name": "CID",
+    },
     0b01010000: {
         "name": "CALL",
         "code_name": "CALL",
@@ -101,6 +107,10 @@ OPERATIONS = {
         "name": "STORE",
         "code_name": "ST",
     },
+    0b10000101: {
+        "name": "TEST_AND_SET",
+        "code_name": "TAS",
+    },
     0b10100000: {
         "name": "ADD",
         "code_name": "ADD",
@@ -147,39 +157,218 @@ OPERATIONS = {
     },
 }
 
+# read-only view: the tables below are derived from this, never the reverse
+OPERATIONS = MappingProxyType({
+    code: MappingProxyType(operation)
+    for (code, operation) in _OPERATIONS.items()
+})
+
+OPERATION_CODE_COUNT = 256
+
+TABLES_MODULE = "cpu__operations__tables"
+TABLES_MODULE__LINE_LENGTH = 120
+
+_TABLES = {}
+
 ############################################################
 
 
+def _layout(constants):
+    """
+    Get the key identifying the opcode layout given by `constants`.
+    """
+
+    return (
+        constants.OPERATION_ARGS__WIDTH,
+        constants.OPERATION_ARGS__SHIFT,
+        constants.OPERATION_USES_ALU__WIDTH,
+        constants.OPERATION_USES_ALU__SHIFT,
+        constants.OPERATION_SETS_POINTER__WIDTH,
+        constants.OPERATION_SETS_POINTER__SHIFT,
+        constants.OPERATION_IDENTIFIER__WIDTH,
+        constants.OPERATION_IDENTIFIER__SHIFT,
+    )
+
+
+def _build_tables(constants, masks):
+    """
+    Get the opcode-indexed operation tables for the opcode layout given by
+    `constants` and `masks`. Tables are loaded from the generated module or
+    computed, once per layout, and shared.
+    """
+
+    layout = _layout(constants)
+
+    if not _TABLES:
+        _TABLES.update(_load_tables())
+
+    if layout not in _TABLES:
+        _TABLES[layout] = _compute_tables(constants, masks)
+
+    return _TABLES[layout]
+
+
+def _compute_tables(constants, masks):
+
+    def field(code, width, shift, mask):
+
+        return _unblock(width, shift, masks.and_mask(code, mask))
+
+    codes = range(OPERATION_CODE_COUNT)
+
+    args = bytes(
+        field(
+            code,
+            constants.OPERATION_ARGS__WIDTH,
+            constants.OPERATION_ARGS__SHIFT,
+            masks.OPERATION_ARGS,
+        ) for code in codes
+    )
+    uses_alu = bytes(
+        field(
+            code,
+            constants.OPERATION_USES_ALU__WIDTH,
+            constants.OPERATION_USES_ALU__SHIFT,
+            masks.OPERATION_USES_ALU,
+        ) for code in codes
+    )
+    sets_pointer = bytes(
+        field(
+            code,
+            constants.OPERATION_SETS_POINTER__WIDTH,
+            constants.OPERATION_SETS_POINTER__SHIFT,
+            masks.OPERATION_SETS_POINTER,
+        ) for code in codes
+    )
+    identifier = bytes(
+        field(
+            code,
+            constants.OPERATION_IDENTIFIER__WIDTH,
+            constants.OPERATION_IDENTIFIER__SHIFT,
+            masks.OPERATION_IDENTIFIER,
+        ) for code in codes
+    )
+
+    tables = {
+        "NAME": tuple((OPERATIONS[code]["name"] if code in OPERATIONS else None) for code in codes),
+        "CODE_NAME": tuple((OPERATIONS[code]["code_name"] if code in OPERATIONS else None) for code in codes),
+        "ARGS": args,
+        "WIDTH": bytes((1 + arg) for arg in args),
+        "USES_ALU": uses_alu,
+        "SETS_POINTER": sets_pointer,
+        "IDENTIFIER": identifier,
+        "CODES": MappingProxyType({operation["code_name"]: code for (code, operation) in OPERATIONS.items()}),
+    }
+
+    return tables
+
+
+def _source_key():
+    """
+    Get a key identifying the contents of `OPERATIONS`.
+    """
+
+    return tuple(
+        (code, operation["name"], operation["code_name"])
+        for (code, operation) in sorted(OPERATIONS.items())
+    )
+
+
+def _load_tables():
+    """
+    Load the precomputed tables written by `write_tables_module`.
+    They are ignored if missing or generated from a different `OPERATIONS`.
+    """
+
+    try:
+        from . import cpu__operations__tables as generated
+    except ImportError:
+        return {}
+
+    if generated.SOURCE != _source_key():
+        return {}
+
+    return generated.TABLES
+
+
+def _format_literal(value, indent, prefix="", suffix=""):
+    """
+    Format `value` as a Python literal between `prefix` and `suffix`, wrapped
+    to fit the line length with continuation lines aligned after `prefix`.
+    """
+
+    import pprint
+
+    width = TABLES_MODULE__LINE_LENGTH - indent - len(prefix) - len(suffix)
+    text = pprint.pformat(value, width=width, compact=True)
+    pad = " " * (indent + len(prefix))
+
+    return " " * indent + prefix + text.replace("\n", "\n" + pad) + suffix
+
+
+def write_tables_module(path, layouts):
+    """
+    Write the tables for each `(constants, masks)` in `layouts` to a Python
+    module at `path`, so they can be imported instead of built at startup.
+    """
+
+    lines = [
+        '"""',
+        "Precomputed operation tables for the LS-8 CPU.",
+        "",
+        "Generated by `python -m ls8.cpu__operations`; do not edit.",
+        '"""',
+        "",
+        "from types import MappingProxyType",
+        "",
+        _format_literal(_source_key(), 0, "SOURCE = "),
+        "",
+        "TABLES = {",
+    ]
+
+    for (constants, masks) in layouts:
+
+        tables = _compute_tables(constants, masks)
+
+        lines.append(f"    {_layout(constants)!r}: {{")
+        for (name, table) in tables.items():
+            if isinstance(table, MappingProxyType):
+                lines.append(_format_literal(dict(table), 8, f"{name!r}: MappingProxyType(", "),"))
+            else:
+                lines.append(_format_literal(table, 8, f"{name!r}: ", ","))
+        lines.append("    },")
+
+    lines.append("}")
+
+    with open(path, "w") as file:
+        file.write("\n".join(lines) + "\n")
+
+    return
+
+
+#-----------------------------------------------------------
+
+
 class ProcessorOperations:
+    """
+    Opcode-indexed, read-only operation tables.
+    Each of `NAME`, `CODE_NAME`, `ARGS`, `WIDTH`, `USES_ALU`, `SETS_POINTER`
+    and `IDENTIFIER` has one entry per opcode; `NAME` is `None` for opcodes
+    that are not operations. `CODES` maps each `code_name` to its opcode.
+    """
 
     def __init__(self, constants, masks):
 
-        operations = OPERATIONS
-
-        for code in operations:
-
-            operations[code]["args"] = _unblock(
-                constants.OPERATION_ARGS__WIDTH,
-                constants.OPERATION_ARGS__SHIFT,
-                masks.and_mask(code, masks.OPERATION_ARGS),
-            )
-            operations[code]["uses_alu"] = _unblock(
-                constants.OPERATION_USES_ALU__WIDTH,
-                constants.OPERATION_USES_ALU__SHIFT,
-                masks.and_mask(code, masks.OPERATION_USES_ALU),
-            )
-            operations[code]["sets_pointer"] = _unblock(
-                constants.OPERATION_SETS_POINTER__WIDTH,
-                constants.OPERATION_SETS_POINTER__SHIFT,
-                masks.and_mask(code, masks.OPERATION_SETS_POINTER),
-            )
-            operations[code]["identifier"] = _unblock(
-                constants.OPERATION_IDENTIFIER__WIDTH,
-                constants.OPERATION_IDENTIFIER__SHIFT,
-                masks.and_mask(code, masks.OPERATION_IDENTIFIER),
-            )
-
-        self.operations = operations
+        tables = _build_tables(constants, masks)
+
+        self.NAME = tables["NAME"]
+        self.CODE_NAME = tables["CODE_NAME"]
+        self.ARGS = tables["ARGS"]
+        self.WIDTH = tables["WIDTH"]
+        self.USES_ALU = tables["USES_ALU"]
+        self.SETS_POINTER = tables["SETS_POINTER"]
+        self.IDENTIFIER = tables["IDENTIFIER"]
+        self.CODES = tables["CODES"]
 
         return
 
@@ -189,15 +378,42 @@ class ProcessorOperations:
 
     def __getitem__(self, key):
 
-        return self.operations[key]
+        if key not in self:
+            raise KeyError(key)
+
+        return {
+            "name": self.NAME[key],
+            "code_name": self.CODE_NAME[key],
+            "args": self.ARGS[key],
+            "uses_alu": self.USES_ALU[key],
+            "sets_pointer": self.SETS_POINTER[key],
+            "identifier": self.IDENTIFIER[key],
+        }
 
     def __contains__(self, key):
 
-        return (key in self.operations)
+        return (0 <= key < OPERATION_CODE_COUNT) and (self.NAME[key] is not None)
 
     def __iter__(self):
 
-        for key in self.operations:
+        for key in OPERATIONS:
             yield key
 
         return
+
+
+############################################################
+
+if __name__ == "__main__":
+
+    import os
+
+    from .cpu__constants import ProcessorConstants
+    from .cpu__masks import ProcessorMasks
+
+    constants = ProcessorConstants(8)
+
+    write_tables_module(
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), TABLES_MODULE + ".py"),
+        [(constants, ProcessorMasks(constants))],
+    )
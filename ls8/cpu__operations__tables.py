@@ -0,0 +1,155 @@
+"""
+Precomputed operation tables for the LS-8 CPU.
+
+Generated by `python -m ls8.cpu__operations`; do not edit.
+"""
+
+from types import MappingProxyType
+
+SOURCE = ((0, 'NO_OPERATION', 'NOP'), (1, 'HALT', 'HLT'), (17, 'RETURN_FROM_CALL', 'RET'),
+          (19, 'RETURN_FROM_INTERRUPT', 'IRET'), (69, 'PUSH', 'PUSH'), (70, 'POP', 'POP'), (71, 'PRINT_NUMBER', 'PRN'),
+          (72, 'PRINT_ALPHA', 'PRA'), (73, 'CORE_ID', 'CID'), (80, 'CALL', 'CALL'), (82, 'INTERRUPT', 'INT'),
+          (84, 'JUMP', 'JMP'), (85, 'JUMP_WHEN_FLAG_EQ', 'JEQ'), (86, 'JUMP_WHEN_FLAG_NEQ', 'JNE'),
+          (87, 'JUMP_WHEN_FLAG_GT', 'JGT'), (88, 'JUMP_WHEN_FLAG_LT', 'JLT'), (89, 'JUMP_WHEN_FLAG_NGT', 'JLE'),
+          (90, 'JUMP_WHEN_FLAG_NLT', 'JGE'), (101, 'INCREMENT', 'INC'), (102, 'DECREMENT', 'DEC'),
+          (105, 'BITWISE_NOT', 'NOT'), (130, 'LOAD_IMMEDIATE', 'LDI'), (131, 'LOAD', 'LD'), (132, 'STORE', 'ST'),
+          (133, 'TEST_AND_SET', 'TAS'), (160, 'ADD', 'ADD'), (161, 'SUBTRACT', 'SUB'), (162, 'MULTIPLY', 'MUL'),
+          (163, 'DIVIDE', 'DIV'), (164, 'MODULO', 'MOD'), (167, 'COMPARE', 'CMP'), (168, 'BITWISE_AND', 'AND'),
+          (170, 'BITWISE_OR', 'OR'), (171, 'BITWISE_XOR', 'XOR'), (172, 'BITWISE_SHIFT_LEFT', 'SHL'),
+          (173, 'BITWISE_SHIFT_RIGHT', 'SHR'))
+
+TABLES = {
+    (2, 6, 1, 5, 1, 4, 4, 0): {
+        'NAME': ('NO_OPERATION', 'HALT', None, None, None, None, None, None, None, None, None, None, None, None, None,
+                 None, None, 'RETURN_FROM_CALL', None, 'RETURN_FROM_INTERRUPT', None, None, None, None, None, None,
+                 None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None,
+                 None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None,
+                 None, None, None, None, None, None, None, None, None, 'PUSH', 'POP', 'PRINT_NUMBER', 'PRINT_ALPHA',
+                 'CORE_ID', None, None, None, None, None, None, 'CALL', None, 'INTERRUPT', None, 'JUMP',
+                 'JUMP_WHEN_FLAG_EQ', 'JUMP_WHEN_FLAG_NEQ', 'JUMP_WHEN_FLAG_GT', 'JUMP_WHEN_FLAG_LT',
+                 'JUMP_WHEN_FLAG_NGT', 'JUMP_WHEN_FLAG_NLT', None, None, None, None, None, None, None, None, None,
+                 None, 'INCREMENT', 'DECREMENT', None, None, 'BITWISE_NOT', None, None, None, None, None, None, None,
+                 None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None,
+                 'LOAD_IMMEDIATE', 'LOAD', 'STORE', 'TEST_AND_SET', None, None, None, None, None, None, None, None,
+                 None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None,
+                 None, 'ADD', 'SUBTRACT', 'MULTIPLY', 'DIVIDE', 'MODULO', None, None, 'COMPARE', 'BITWISE_AND', None,
+                 'BITWISE_OR', 'BITWISE_XOR', 'BITWISE_SHIFT_LEFT', 'BITWISE_SHIFT_RIGHT', None, None, None, None,
+                 None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None,
+                 None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None,
+                 None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None,
+                 None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None,
+                 None, None, None, None, None, None, None, None, None, None),
+        'CODE_NAME': ('NOP', 'HLT', None, None, None, None, None, None, None, None, None, None, None, None, None, None,
+                      None, 'RET', None, 'IRET', None, None, None, None, None, None, None, None, None, None, None,
+                      None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None,
+                      None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None,
+                      None, None, None, None, None, None, 'PUSH', 'POP', 'PRN', 'PRA', 'CID', None, None, None, None,
+                      None, None, 'CALL', None, 'INT', None, 'JMP', 'JEQ', 'JNE', 'JGT', 'JLT', 'JLE', 'JGE', None,
+                      None, None, None, None, None, None, None, None, None, 'INC', 'DEC', None, None, 'NOT', None,
+                      None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None,
+                      None, None, None, None, None, None, None, 'LDI', 'LD', 'ST', 'TAS', None, None, None, None, None,
+                      None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None,
+                      None, None, None, None, None, 'ADD', 'SUB', 'MUL', 'DIV', 'MOD', None, None, 'CMP', 'AND', None,
+                      'OR', 'XOR', 'SHL', 'SHR', None, None, None, None, None, None, None, None, None, None, None,
+                      None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None,
+                      None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None,
+                      None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None,
+                      None, None, None, None, None, None, None, None, None, None, None, None, None, None, None, None,
+                      None, None, None, None, None, None, None),
+        'ARGS': (b'\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00'
+                 b'\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00'
+                 b'\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x01\x01\x01\x01\x01\x01\x01\x01'
+                 b'\x01\x01\x01\x01\x01\x01\x01\x01\x01\x01\x01\x01\x01\x01\x01\x01\x01\x01\x01\x01\x01\x01\x01\x01'
+                 b'\x01\x01\x01\x01\x01\x01\x01\x01\x01\x01\x01\x01\x01\x01\x01\x01\x01\x01\x01\x01\x01\x01\x01\x01'
+                 b'\x01\x01\x01\x01\x01\x01\x01\x01\x02\x02\x02\x02\x02\x02\x02\x02\x02\x02\x02\x02\x02\x02\x02\x02'
+                 b'\x02\x02\x02\x02\x02\x02\x02\x02\x02\x02\x02\x02\x02\x02\x02\x02\x02\x02\x02\x02\x02\x02\x02\x02'
+                 b'\x02\x02\x02\x02\x02\x02\x02\x02\x02\x02\x02\x02\x02\x02\x02\x02\x02\x02\x02\x02\x02\x02\x02\x02'
+                 b'\x03\x03\x03\x03\x03\x03\x03\x03\x03\x03\x03\x03\x03\x03\x03\x03\x03\x03\x03\x03\x03\x03\x03\x03'
+                 b'\x03\x03\x03\x03\x03\x03\x03\x03\x03\x03\x03\x03\x03\x03\x03\x03\x03\x03\x03\x03\x03\x03\x03\x03'
+                 b'\x03\x03\x03\x03\x03\x03\x03\x03\x03\x03\x03\x03\x03\x03\x03\x03'),
+        'WIDTH': (b'\x01\x01\x01\x01\x01\x01\x01\x01\x01\x01\x01\x01\x01\x01\x01\x01\x01\x01\x01\x01\x01\x01\x01\x01'
+                  b'\x01\x01\x01\x01\x01\x01\x01\x01\x01\x01\x01\x01\x01\x01\x01\x01\x01\x01\x01\x01\x01\x01\x01\x01'
+                  b'\x01\x01\x01\x01\x01\x01\x01\x01\x01\x01\x01\x01\x01\x01\x01\x01\x02\x02\x02\x02\x02\x02\x02\x02'
+                  b'\x02\x02\x02\x02\x02\x02\x02\x02\x02\x02\x02\x02\x02\x02\x02\x02\x02\x02\x02\x02\x02\x02\x02\x02'
+                  b'\x02\x02\x02\x02\x02\x02\x02\x02\x02\x02\x02\x02\x02\x02\x02\x02\x02\x02\x02\x02\x02\x02\x02\x02'
+                  b'\x02\x02\x02\x02\x02\x02\x02\x02\x03\x03\x03\x03\x03\x03\x03\x03\x03\x03\x03\x03\x03\x03\x03\x03'
+                  b'\x03\x03\x03\x03\x03\x03\x03\x03\x03\x03\x03\x03\x03\x03\x03\x03\x03\x03\x03\x03\x03\x03\x03\x03'
+                  b'\x03\x03\x03\x03\x03\x03\x03\x03\x03\x03\x03\x03\x03\x03\x03\x03\x03\x03\x03\x03\x03\x03\x03\x03'
+                  b'\x04\x04\x04\x04\x04\x04\x04\x04\x04\x04\x04\x04\x04\x04\x04\x04\x04\x04\x04\x04\x04\x04\x04\x04'
+                  b'\x04\x04\x04\x04\x04\x04\x04\x04\x04\x04\x04\x04\x04\x04\x04\x04\x04\x04\x04\x04\x04\x04\x04\x04'
+                  b'\x04\x04\x04\x04\x04\x04\x04\x04\x04\x04\x04\x04\x04\x04\x04\x04'),
+        'USES_ALU': (b'\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00'
+                     b'\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x01\x01\x01\x01\x01\x01\x01\x01'
+                     b'\x01\x01\x01\x01\x01\x01\x01\x01\x01\x01\x01\x01\x01\x01\x01\x01\x01\x01\x01\x01'
+                     b'\x01\x01\x01\x01\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00'
+                     b'\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x01\x01\x01\x01'
+                     b'\x01\x01\x01\x01\x01\x01\x01\x01\x01\x01\x01\x01\x01\x01\x01\x01\x01\x01\x01\x01'
+                     b'\x01\x01\x01\x01\x01\x01\x01\x01\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00'
+                     b'\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00'
+                     b'\x01\x01\x01\x01\x01\x01\x01\x01\x01\x01\x01\x01\x01\x01\x01\x01\x01\x01\x01\x01'
+                     b'\x01\x01\x01\x01\x01\x01\x01\x01\x01\x01\x01\x01\x00\x00\x00\x00\x00\x00\x00\x00'
+                     b'\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00'
+                     b'\x00\x00\x00\x00\x01\x01\x01\x01\x01\x01\x01\x01\x01\x01\x01\x01\x01\x01\x01\x01'
+                     b'\x01\x01\x01\x01\x01\x01\x01\x01\x01\x01\x01\x01\x01\x01\x01\x01'),
+        'SETS_POINTER': (b'\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x01\x01\x01\x01'
+                         b'\x01\x01\x01\x01\x01\x01\x01\x01\x01\x01\x01\x01\x00\x00\x00\x00\x00\x00\x00\x00'
+                         b'\x00\x00\x00\x00\x00\x00\x00\x00\x01\x01\x01\x01\x01\x01\x01\x01\x01\x01\x01\x01'
+                         b'\x01\x01\x01\x01\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00'
+                         b'\x01\x01\x01\x01\x01\x01\x01\x01\x01\x01\x01\x01\x01\x01\x01\x01\x00\x00\x00\x00'
+                         b'\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x01\x01\x01\x01\x01\x01\x01\x01'
+                         b'\x01\x01\x01\x01\x01\x01\x01\x01\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00'
+                         b'\x00\x00\x00\x00\x01\x01\x01\x01\x01\x01\x01\x01\x01\x01\x01\x01\x01\x01\x01\x01'
+                         b'\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x01\x01\x01\x01'
+                         b'\x01\x01\x01\x01\x01\x01\x01\x01\x01\x01\x01\x01\x00\x00\x00\x00\x00\x00\x00\x00'
+                         b'\x00\x00\x00\x00\x00\x00\x00\x00\x01\x01\x01\x01\x01\x01\x01\x01\x01\x01\x01\x01'
+                         b'\x01\x01\x01\x01\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00'
+                         b'\x01\x01\x01\x01\x01\x01\x01\x01\x01\x01\x01\x01\x01\x01\x01\x01'),
+        'IDENTIFIER': (b'\x00\x01\x02\x03\x04\x05\x06\x07\x08\t\n\x0b\x0c\r\x0e\x0f\x00\x01\x02\x03\x04\x05\x06\x07'
+                       b'\x08\t\n\x0b\x0c\r\x0e\x0f\x00\x01\x02\x03\x04\x05\x06\x07\x08\t\n\x0b\x0c\r\x0e\x0f'
+                       b'\x00\x01\x02\x03\x04\x05\x06\x07\x08\t\n\x0b\x0c\r\x0e\x0f\x00\x01\x02\x03\x04\x05\x06\x07'
+                       b'\x08\t\n\x0b\x0c\r\x0e\x0f\x00\x01\x02\x03\x04\x05\x06\x07\x08\t\n\x0b\x0c\r\x0e\x0f'
+                       b'\x00\x01\x02\x03\x04\x05\x06\x07\x08\t\n\x0b\x0c\r\x0e\x0f\x00\x01\x02\x03\x04\x05\x06\x07'
+                       b'\x08\t\n\x0b\x0c\r\x0e\x0f\x00\x01\x02\x03\x04\x05\x06\x07\x08\t\n\x0b\x0c\r\x0e\x0f'
+                       b'\x00\x01\x02\x03\x04\x05\x06\x07\x08\t\n\x0b\x0c\r\x0e\x0f\x00\x01\x02\x03\x04\x05\x06\x07'
+                       b'\x08\t\n\x0b\x0c\r\x0e\x0f\x00\x01\x02\x03\x04\x05\x06\x07\x08\t\n\x0b\x0c\r\x0e\x0f'
+                       b'\x00\x01\x02\x03\x04\x05\x06\x07\x08\t\n\x0b\x0c\r\x0e\x0f\x00\x01\x02\x03\x04\x05\x06\x07'
+                       b'\x08\t\n\x0b\x0c\r\x0e\x0f\x00\x01\x02\x03\x04\x05\x06\x07\x08\t\n\x0b\x0c\r\x0e\x0f'
+                       b'\x00\x01\x02\x03\x04\x05\x06\x07\x08\t\n\x0b\x0c\r\x0e\x0f'),
+        'CODES': MappingProxyType({'ADD': 160,
+                                   'AND': 168,
+                                   'CALL': 80,
+                                   'CID': 73,
+                                   'CMP': 167,
+                                   'DEC': 102,
+                                   'DIV': 163,
+                                   'HLT': 1,
+                                   'INC': 101,
+                                   'INT': 82,
+                                   'IRET': 19,
+                                   'JEQ': 85,
+                                   'JGE': 90,
+                                   'JGT': 87,
+                                   'JLE': 89,
+                                   'JLT': 88,
+                                   'JMP': 84,
+                                   'JNE': 86,
+                                   'LD': 131,
+                                   'LDI': 130,
+                                   'MOD': 164,
+                                   'MUL': 162,
+                                   'NOP': 0,
+                                   'NOT': 105,
+                                   'OR': 170,
+                                   'POP': 70,
+                                   'PRA': 72,
+                                   'PRN': 71,
+                                   'PUSH': 69,
+                                   'RET': 17,
+                                   'SHL': 172,
+                                   'SHR': 173,
+                                   'ST': 132,
+                                   'SUB': 161,
+                                   'TAS': 133,
+                                   'XOR': 171}),
+    },
+}
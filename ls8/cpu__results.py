@@ -0,0 +1,46 @@
+"""
+Describe how a run of a computer processor ended.
+"""
+
+############################################################
+
+# why `CPU.run` returned
+
+REASON__HALTED = "halted"    # ran `HLT`
+REASON__UNKNOWN_OPERATION = "unknown operation"    # fetched an unknown or unimplemented operation
+REASON__DIVIDE_BY_ZERO = "divide by zero"    # ran `DIV` or `MOD` with a zero divisor
+REASON__MAX_INSTRUCTIONS = "max instructions"    # used up `max_instructions`
+REASON__UNTIL_PC = "until pc"    # reached `until_pc`
+REASON__WALL_TIMEOUT = "wall timeout"    # ran past `wall_timeout`
+REASON__WATCHPOINT = "watchpoint"    # triggered a watchpoint, described by `watch_hit`
+REASON__BREAKPOINT = "breakpoint"    # reached a breakpoint, at `program_pointer`
+REASON__SEND_FAILED = "send failed"    # sent a message to a cluster node that does not exist
+
+############################################################
+
+
+class ProcessorRunResult:
+
+    def __init__(self, cpu, reason, instruction_count, dispatch_count, elapsed, output=None, errors=None):
+
+        self.reason = reason
+        self.halted = cpu.halted
+
+        self.instruction_count = instruction_count
+        self.dispatch_count = dispatch_count
+        self.elapsed = elapsed
+
+        self.program_pointer = cpu.program_pointer
+        self.register = list(cpu.register)
+        self.flags = cpu.flags
+
+        self.output = output
+        self.errors = errors
+
+        self.watch_hit = cpu.watch_hit
+
+        return
+
+    def __str__(self):
+
+        return str(self.__dict__)
@@ -0,0 +1,63 @@
+"""
+Describe the memory watchpoints of a computer processor.
+
+A watchpoint covers a range of addresses and triggers on reads or writes
+there. Only the pages a watchpoint covers are flagged, so accesses to every
+other page keep the plain fast path. When one triggers, the instruction
+finishes and `run` returns with a `ProcessorWatchHit`.
+"""
+
+############################################################
+
+WATCH__READ = "read"
+WATCH__WRITE = "write"
+
+WATCH_KINDS = (WATCH__READ, WATCH__WRITE)
+
+############################################################
+
+
+class ProcessorWatchpoint:
+
+    def __init__(self, start, stop, on=WATCH__WRITE):
+
+        if on not in WATCH_KINDS:
+            raise ValueError(f"a watchpoint triggers on one of {WATCH_KINDS}, not {on!r}")
+
+        self.start = start
+        self.stop = stop    # exclusive
+        self.on = on
+
+        return
+
+    def __str__(self):
+
+        return str(self.__dict__)
+
+    def __contains__(self, address):
+
+        return self.start <= address < self.stop
+
+    def pages(self, page_width):
+
+        if self.stop <= self.start:
+            return range(0)
+
+        return range(self.start >> page_width, ((self.stop - 1) >> page_width) + 1)
+
+
+class ProcessorWatchHit:
+
+    def __init__(self, watchpoint, program_pointer, address, old_value, new_value):
+
+        self.watchpoint = watchpoint
+        self.program_pointer = program_pointer    # of the instruction (or interrupt) that made the access
+        self.address = address
+        self.old_value = old_value
+        self.new_value = new_value    # the same as `old_value` for reads
+
+        return
+
+    def __str__(self):
+
+        return str(self.__dict__)
@@ -0,0 +1,378 @@
+"""
+Memory-mapped devices for the LS-8 CPU.
+
+A device covers `size` words from `start`. The CPU flags only the pages a
+device covers, so reads and writes everywhere else stay on the plain path.
+Only data reads (`LD`, `TAS` and stack pops) go through read hooks;
+instruction fetch never does.
+"""
+
+############################################################
+
+import sys
+import threading
+
+from collections import deque
+
+from .cpu__results import REASON__SEND_FAILED
+
+############################################################
+
+
+class Device:
+    """
+    Base device. `write` is called after every write to a covered address;
+    set `read` to a function `read(cpu, address)` to intercept data reads.
+    """
+
+    read = None
+
+    def __init__(self, start, size=1):
+
+        self.start = start
+        self.end = start + size
+
+        return
+
+    def __str__(self):
+
+        return str(self.__dict__)
+
+    def pages(self, page_width):
+        """
+        Get the pages covered by the device.
+        """
+
+        return range(self.start >> page_width, ((self.end - 1) >> page_width) + 1)
+
+    def attach(self, cpu):
+        return
+
+    def detach(self, cpu):
+        return
+
+    def write(self, cpu, address, value):
+        return
+
+
+############################################################
+
+
+class CounterDevice(Device):
+    """
+    A word that counts its own reads. Writing it sets the count.
+    """
+
+    def __init__(self, address):
+
+        super().__init__(address)
+
+        self.count = 0
+
+        return
+
+    def read(self, cpu, address):
+
+        count = self.count
+        self.count += 1
+
+        return count
+
+    def write(self, cpu, address, value):
+
+        self.count = value
+
+        return
+
+
+class KeyboardDevice(Device):
+    """
+    The key-pressed word. `press` queues a key; the first queued key is
+    stored in the word and raises the keyboard interrupt, and reading the
+    word takes it, storing the next key (and raising the interrupt again)
+    if there is one. So keys pressed faster than the handler runs wait for
+    it rather than overwrite each other. With `stdin=True`, a thread
+    presses each byte read from stdin.
+    """
+
+    INTERRUPT = 1
+
+    def __init__(self, address, stdin=False):
+
+        super().__init__(address)
+
+        self.stdin = stdin
+        self.cpu = None
+        self.thread = None
+
+        # keys not yet stored, and whether the stored key is still unread
+        self.keys = deque()
+        self.unread = False
+        self.lock = threading.Lock()
+
+        return
+
+    def attach(self, cpu):
+
+        self.cpu = cpu
+
+        if self.stdin:
+            self.thread = threading.Thread(target=self.read_stdin, daemon=True)
+            self.thread.start()
+
+        return
+
+    def detach(self, cpu):
+
+        self.cpu = None
+
+        return
+
+    def press(self, key):
+
+        with self.lock:
+            self.keys.append(key)
+            if not self.unread:
+                self.store_next(self.cpu)
+
+        return
+
+    def read(self, cpu, address):
+
+        with self.lock:
+            key = cpu.memory[self.start]
+            if self.keys:
+                self.store_next(cpu)
+            else:
+                self.unread = False
+
+        return key
+
+    def store_next(self, cpu):
+
+        # the raw store keeps the key from re-entering `write`
+        cpu.write_memory_raw(self.start, self.keys.popleft())
+        self.unread = True
+        cpu.raise_interrupt(self.INTERRUPT)
+
+        return
+
+    def read_stdin(self):
+
+        while self.cpu is not None:
+
+            key = sys.stdin.buffer.read(1)
+
+            if not key or self.cpu is None:
+                break
+
+            self.press(key[0])
+
+        return
+
+
+class TimerDevice(Device):
+    """
+    A timer thread raising the timer interrupt every `period` seconds.
+    It maps no addresses.
+    """
+
+    INTERRUPT = 0
+
+    def __init__(self, period=1.0):
+
+        super().__init__(0, 0)
+
+        self.period = period
+        self.stopped = None
+
+        return
+
+    def pages(self, page_width):
+
+        return range(0)
+
+    def attach(self, cpu):
+
+        self.stopped = threading.Event()
+
+        thread = threading.Thread(target=self.tick, args=(cpu, self.stopped), daemon=True)
+        thread.start()
+
+        return
+
+    def detach(self, cpu):
+
+        self.stopped.set()
+
+        return
+
+    def tick(self, cpu, stopped):
+
+        while not stopped.wait(self.period):
+            cpu.raise_interrupt(self.INTERRUPT)
+
+        return
+
+
+class NetworkDevice(Device):
+    """
+    The network interface of a node in a `cluster.Cluster`. From `start`,
+    its control words are
+
+        +0  NET_ID      the ID of this node (read)
+        +1  NET_NODES   the number of nodes (read)
+        +2  NET_DEST    the node to send to (write)
+        +3  NET_SEND    writing N sends the first N words of the send buffer
+                        to NET_DEST
+        +4  NET_SRC     the node the received message came from (read)
+        +5  NET_RECV    the length of the received message, or 0 for none
+                        (read); writing it frees the receive buffer for the
+                        next message
+
+    then the send buffer and the receive buffer, `buffer_size` words each,
+    in plain memory. Putting a message in the receive buffer raises the
+    network interrupt. Sent messages wait in `outbox`, and received ones in
+    `inbox`, for the cluster to carry. Sending to a node that does not
+    exist reports an error and halts the CPU, as a division by zero does.
+    """
+
+    INTERRUPT = 2
+
+    (ID, NODES, DEST, SEND, SRC, RECV) = range(6)
+
+    CONTROL_SIZE = 6
+
+    def __init__(self, node, nodes, start, buffer_size):
+
+        super().__init__(start, self.CONTROL_SIZE)
+
+        self.node = node
+        self.nodes = nodes
+
+        self.send_buffer = start + self.CONTROL_SIZE
+        self.receive_buffer = self.send_buffer + buffer_size
+        self.buffer_size = buffer_size
+
+        self.cpu = None
+        self.source = 0
+        self.busy = False
+
+        self.inbox = deque()    # (source, words), oldest first
+        self.outbox = []    # (destination, words), oldest first
+
+        self.sent = 0
+        self.received = 0
+
+        return
+
+    def attach(self, cpu):
+
+        self.cpu = cpu
+
+        self.store(self.ID, self.node)
+        self.store(self.NODES, self.nodes)
+        self.store(self.RECV, 0)
+
+        return
+
+    def detach(self, cpu):
+
+        self.cpu = None
+
+        return
+
+    def store(self, offset, value):
+
+        cpu = self.cpu
+
+        # the raw store keeps the value from re-entering `write`
+        cpu.write_memory_raw(self.start + offset, value)
+
+        return
+
+    def write(self, cpu, address, value):
+
+        offset = address - self.start
+
+        if offset == self.SEND:
+
+            count = min(value, self.buffer_size)
+
+            destination = cpu.memory[self.start + self.DEST]
+
+            if count and destination >= self.nodes:
+                self.send_failed(cpu, destination)
+            elif count:
+                words = list(cpu.memory[self.send_buffer:self.send_buffer + count])
+                self.outbox.append((destination, words))
+                self.sent += 1
+
+            self.store(self.SEND, 0)
+
+        elif offset == self.RECV:
+
+            self.busy = False
+            self.store(self.RECV, 0)
+            self.deliver()
+
+        elif offset != self.DEST:
+
+            # the other words are read-only
+            self.store(self.ID, self.node)
+            self.store(self.NODES, self.nodes)
+            self.store(self.SRC, self.source)
+
+        return
+
+    def send_failed(self, cpu, destination):
+        """
+        Report a send to `destination`, which is not a node, and halt.
+        """
+
+        message = (
+            f"error: send to node {destination} of {self.nodes} "
+            f"at {cpu.format_address(cpu.program_pointer)}"
+        )
+        print(message, file=sys.stderr if cpu.errors is None else cpu.errors)
+        cpu.stop(REASON__SEND_FAILED)
+
+        return
+
+    def receive(self, source, words):
+        """
+        Queue a message from node `source`.
+        """
+
+        self.inbox.append((source, words))
+        self.deliver()
+
+        return
+
+    def deliver(self):
+        """
+        Put the oldest queued message in the receive buffer, if it is free.
+        """
+
+        if self.busy or not self.inbox:
+            return
+
+        (source, words) = self.inbox.popleft()
+        words = words[:self.buffer_size]
+
+        cpu = self.cpu
+
+        for (index, word) in enumerate(words):
+            cpu.write_memory(self.receive_buffer + index, word)
+
+        self.source = source
+        self.busy = True
+
+        self.store(self.SRC, source)
+        self.store(self.RECV, len(words))
+
+        self.received += 1
+
+        cpu.raise_interrupt(self.INTERRUPT)
+
+        return
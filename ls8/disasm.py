@@ -0,0 +1,445 @@
+#!/usr/bin/env python3
+"""
+Disassemble LS-8 memory images and instruction traces.
+
+Listings come from the operation table: each code is looked up in
+`OPERATIONS.CODE_NAME` and `OPERATIONS.ARGS`, so new operations need no
+changes here. Jump and call targets loaded by `LDI` get synthetic labels,
+named as in `format_cfg`: `SUB_XX` for calls and `L_XX` for jumps.
+
+An image, in any format `loader` reads, is swept linearly over the words
+up to the highest address it loads.
+A trace (written by `ls8 --trace`, see `trace`) is read in fixed-size
+chunks, so memory use does not grow with its length. Labels take a first
+pass over the input; for a trace on stdin, which cannot be read twice,
+there are no labels.
+
+With a source map from `asm.py` (found next to an image, or given with
+`--map`), the source's labels replace the synthetic ones, and each line
+names its source line.
+
+Usage: python -m ls8.disasm [--wide] [--raw] [--no-labels] [--map FILE] (FILE | -)
+"""
+
+############################################################
+
+import argparse
+import sys
+
+from .analysis import WRITES_REGISTER
+from .cpu import CPU, WideCPU
+from .loader import FORMAT__RAW, ProgramReader
+from .sourcemap import find_source_map, load_source_map
+from .trace import HEADER_SIZE, parse_header, read_trace
+
+############################################################
+
+LABEL__JUMP = 1
+LABEL__CALL = 2
+
+LABEL_KINDS = {
+    "JMP": LABEL__JUMP,
+    "JEQ": LABEL__JUMP,
+    "JNE": LABEL__JUMP,
+    "JGT": LABEL__JUMP,
+    "JLT": LABEL__JUMP,
+    "JLE": LABEL__JUMP,
+    "JGE": LABEL__JUMP,
+    "CALL": LABEL__CALL,
+}
+
+# in a linear sweep, what a register held does not survive these
+BARRIERS = frozenset(("JMP", "CALL", "RET", "IRET", "HLT"))
+
+MIN_ZERO_RUN = 8    # words
+
+############################################################
+#   LABELS
+############################################################
+
+
+class TargetTracker:
+    """
+    Follow the values `LDI` loads into registers to the jumps and calls
+    that use them.
+    """
+
+    def __init__(self, constants, operations, linear):
+
+        self.register_count = constants.REGISTER_COUNT
+        self.code_names = operations.CODE_NAME
+        self.linear = linear
+
+        self.loaded = [None] * self.register_count    # (value, address of the `LDI`)
+
+        return
+
+    def __str__(self):
+
+        return str(self.__dict__)
+
+    def step(self, address, code, operand_a, operand_b):
+        """
+        Follow one instruction. Returns `(target, source)` for a jump or call
+        through a register loaded by `LDI`, where `source` is the address
+        of that `LDI`, or `None`.
+        """
+
+        name = self.code_names[code] if code < len(self.code_names) else None
+        loaded = self.loaded
+        found = None
+
+        if operand_a >= self.register_count:
+            operand_a = None
+
+        if name == "LDI":
+
+            if operand_a is not None:
+                loaded[operand_a] = (operand_b, address)
+
+            return None
+
+        if name in LABEL_KINDS and operand_a is not None:
+            found = loaded[operand_a]
+
+        if name is None or (self.linear and name in BARRIERS):
+            self.loaded = [None] * self.register_count
+        elif name in WRITES_REGISTER and operand_a is not None:
+            loaded[operand_a] = None
+
+        return found
+
+
+def find_labels(records, constants, operations, linear):
+    """
+    Find the targets of jumps and calls in `records`. Returns `(labels,
+    sources)`: `labels[address]` is the `LABEL__*` kind of a target, and
+    `sources[address]` is set for each `LDI` that loads one.
+    """
+
+    labels = bytearray(constants.WORD_SIZE)
+    sources = bytearray(constants.WORD_SIZE)
+
+    tracker = TargetTracker(constants, operations, linear)
+    code_names = operations.CODE_NAME
+
+    for (address, code, operand_a, operand_b) in records:
+
+        found = tracker.step(address, code, operand_a, operand_b)
+
+        if found is not None:
+            (target, source) = found
+            labels[target] = max(labels[target], LABEL_KINDS[code_names[code]])
+            sources[source] = 1
+
+    return (labels, sources)
+
+
+def label_name(kind, address, hex_width):
+
+    return "{}_{:0{}X}".format("SUB" if kind == LABEL__CALL else "L", address, hex_width)
+
+
+############################################################
+#   RECORDS
+############################################################
+
+
+def decode_at(memory, address, operations):
+    """
+    Decode the instruction at `address` as `(code, operand_a, operand_b,
+    width)`. Unknown codes, and instructions that run past the end of
+    `memory`, are one word long, with a code name of `None`.
+    """
+
+    code = memory[address]
+
+    if code >= len(operations.CODE_NAME) or operations.CODE_NAME[code] is None:
+        return (code, 0, 0, 1)
+
+    width = operations.WIDTH[code]
+
+    if address + width > len(memory):
+        return (code, 0, 0, 1)
+
+    return (
+        code,
+        memory[address + 1] if width > 1 else 0,
+        memory[address + 2] if width > 2 else 0,
+        width,
+    )
+
+
+def image_records(memory, operations):
+    """
+    Yield `(address, code, operand_a, operand_b)` for a linear sweep of
+    `memory`.
+    """
+
+    address = 0
+
+    while address < len(memory):
+
+        (code, operand_a, operand_b, width) = decode_at(memory, address, operations)
+
+        yield (address, code, operand_a, operand_b)
+
+        address += width
+
+    return
+
+
+def trace_records(file, bit_count):
+
+    for words in read_trace(file, bit_count):
+        values = iter(words)
+        yield from zip(values, values, values, values)
+
+    return
+
+
+def read_image(file, constants, raw, head=b""):
+    """
+    Read an image from the binary `file` (after `head`), in the format it
+    holds, or as raw little-endian words.
+    """
+
+    memory = []
+
+    for (address, words) in ProgramReader(constants, FORMAT__RAW if raw else None).read(file, head):
+
+        stop = address + len(words)
+
+        if stop > len(memory):
+            memory.extend([0] * (stop - len(memory)))
+
+        memory[address:stop] = words
+
+    return memory
+
+
+############################################################
+#   LISTING
+############################################################
+
+
+class Formatter:
+
+    def __init__(self, constants, operations, labels=None, sources=None, linear=True, source_map=None):
+
+        self.operations = operations
+        self.hex_width = constants.HEX_WIDTH
+
+        self.labels = labels
+        self.sources = sources
+        self.source_map = source_map
+
+        self.tracker = TargetTracker(constants, operations, linear)
+
+        self.hex = tuple(f"{word:0{self.hex_width}X}" for word in range(constants.WORD_SIZE))
+        self.words_width = 3 * self.hex_width + 4
+        self.text_width = self.words_width + 2 * self.hex_width + 20
+
+        return
+
+    def __str__(self):
+
+        return str({key: value for (key, value) in self.__dict__.items() if key != "hex"})
+
+    def label(self, address):
+
+        if self.source_map is not None and self.source_map.name[address] is not None:
+            return self.source_map.name[address]
+
+        if self.labels is None or not self.labels[address]:
+            return None
+
+        return label_name(self.labels[address], address, self.hex_width)
+
+    def format(self, address, code, operand_a, operand_b):
+        """
+        Format one instruction as `0xADDR  WORDS  TEXT    ; -> LABEL, SOURCE:LINE`.
+        """
+
+        hex = self.hex
+        code_names = self.operations.CODE_NAME
+        name = code_names[code] if code < len(code_names) else None
+
+        if name is None:
+
+            words = hex[code]
+            text = f"DB 0x{words}"
+
+        else:
+
+            args = self.operations.ARGS[code]
+            words = " ".join((hex[code], hex[operand_a], hex[operand_b])[:1 + args])
+
+            if name == "LDI":
+                target = self.label(operand_b) if self.sources is not None and self.sources[address] else None
+                text = f"LDI R{operand_a},{target or operand_b}"
+            elif args == 2:
+                text = f"{name} R{operand_a},R{operand_b}"
+            elif args == 1:
+                text = f"{name} R{operand_a}"
+            else:
+                text = name
+
+        line = f"0x{hex[address]}  {words:<{self.words_width}}{text}"
+        notes = []
+
+        found = self.tracker.step(address, code, operand_a, operand_b)
+
+        if found is not None and self.labels is not None:
+            notes.append(f"-> {self.label(found[0])}")
+
+        if self.source_map is not None and self.source_map.line[address]:
+            notes.append(self.source_map.where(address))
+
+        if notes:
+            line = f"{line:<{self.text_width}}; {', '.join(notes)}"
+
+        return line
+
+    def image_lines(self, memory):
+        """
+        Yield the lines of a listing of `memory`, folding runs of zero words
+        (empty memory) into one line.
+        """
+
+        size = len(memory)
+        address = 0
+
+        while address < size:
+
+            label = self.label(address)
+            if label is not None:
+                yield f"{label}:\n"
+
+            if not memory[address]:
+
+                end = address + 1
+                while end < size and not memory[end] and self.label(end) is None:
+                    end += 1
+
+                if end - address >= MIN_ZERO_RUN:
+                    yield f"    0x{self.hex[address]}  ; {end - address} zero words\n"
+                    address = end
+                    continue
+
+            (code, operand_a, operand_b, width) = decode_at(memory, address, self.operations)
+
+            yield f"    {self.format(address, code, operand_a, operand_b)}\n"
+
+            address += width
+
+        return
+
+    def trace_lines(self, records):
+
+        for (index, (address, code, operand_a, operand_b)) in enumerate(records):
+
+            label = self.label(address)
+            if label is not None:
+                yield f"{label}:\n"
+
+            yield f"{index:>12}  {self.format(address, code, operand_a, operand_b)}\n"
+
+        return
+
+
+############################################################
+#   MAIN
+############################################################
+
+
+def parse_commandline(argv):
+
+    parser = argparse.ArgumentParser(prog="ls8.disasm", description="Disassemble an LS-8 image or trace.")
+
+    parser.add_argument("file", help="an image (`.ls8`, hex, Intel HEX or raw) or a trace; `-` for stdin")
+    parser.add_argument("--wide", action="store_true", help="the image is for the 16-bit CPU")
+    parser.add_argument(
+        "--raw",
+        action="store_true",
+        help="the image is raw little-endian words, even if it looks like text",
+    )
+    parser.add_argument("--no-labels", action="store_true", help="skip the pass that finds labels")
+    parser.add_argument("--map", help="a source map from `asm.py` (default: FILE.map, if there is one)")
+
+    return parser.parse_args(argv[1:])
+
+
+def disassemble(file, out, wide=False, raw=False, labels=True, source_map=None):
+    """
+    Write a listing of the image or trace in the binary `file` to `out`.
+    Traces are told apart by their header.
+    """
+
+    header = file.read(HEADER_SIZE)
+    bit_count = parse_header(header)
+
+    if bit_count is None:
+
+        cpu_class = WideCPU if wide else CPU
+        (constants, operations) = (cpu_class.CONSTANTS, cpu_class.OPERATIONS)
+
+        memory = read_image(file, constants, raw, header)
+
+        found = (None, None)
+        if labels:
+            found = find_labels(image_records(memory, operations), constants, operations, linear=True)
+
+        formatter = Formatter(constants, operations, *found, linear=True, source_map=source_map)
+        out.writelines(formatter.image_lines(memory))
+
+    else:
+
+        cpu_class = WideCPU if bit_count > 8 else CPU
+        (constants, operations) = (cpu_class.CONSTANTS, cpu_class.OPERATIONS)
+
+        found = (None, None)
+        if labels and file.seekable():
+            found = find_labels(trace_records(file, bit_count), constants, operations, linear=False)
+            file.seek(HEADER_SIZE)
+
+        formatter = Formatter(constants, operations, *found, linear=False, source_map=source_map)
+        out.writelines(formatter.trace_lines(trace_records(file, bit_count)))
+
+    return
+
+
+def main(argv):
+
+    args = parse_commandline(argv)
+
+    # a trace may be of either width, so the map gets room for the wider
+    word_size = WideCPU.CONSTANTS.WORD_SIZE
+
+    if args.map is not None:
+        source_map = load_source_map(args.map, word_size)
+    elif args.file != "-":
+        source_map = find_source_map(args.file, word_size)
+    else:
+        source_map = None
+
+    try:
+
+        if args.file == "-":
+            disassemble(sys.stdin.buffer, sys.stdout, args.wide, args.raw, not args.no_labels, source_map)
+        else:
+            with open(args.file, "rb") as file:
+                disassemble(file, sys.stdout, args.wide, args.raw, not args.no_labels, source_map)
+
+        sys.stdout.flush()
+
+    except BrokenPipeError:
+
+        # the reader (`head`, a pager) went away; that is not an error
+        sys.stderr.close()
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,517 @@
+#!/usr/bin/env python3
+"""
+Differential fuzzer for the LS-8 CPU.
+
+Runs random programs on the reference interpreter (`run_debug`, one
+operation at a time through `getattr`) and on each optimised engine, and
+compares the machines every few instructions. Diverging programs are shrunk
+to a small reproducer.
+
+Usage: python -m ls8.fuzz [--programs N] [--seed S] [--jobs J] [--steps N] [--every N]
+                          [--engine NAME ...] [--out DIR]
+"""
+
+############################################################
+
+import argparse
+import contextlib
+import io
+import os
+import random
+import time
+
+from .cpu import CPU
+
+############################################################
+
+DEFAULT__PROGRAMS = 10000
+DEFAULT__SEED = 0
+DEFAULT__STEPS = 512    # instructions per program, at most
+DEFAULT__EVERY = 16    # instructions between comparisons
+DEFAULT__BATCH = 250    # programs per pool task
+
+MAX_PROGRAM_LENGTH = 32    # instructions
+
+# the share of programs that start with interrupts enabled and unmasked
+INTERRUPT_CHANCE = 0.25
+
+############################################################
+#   CASES
+############################################################
+
+
+class FuzzCase:
+    """
+    A random program and the machine state it starts from. The memory image
+    is `program`, laid out from address 0, over `filler`.
+    """
+
+    def __init__(self, program, filler, register, flags, interrupts_enabled):
+
+        self.program = program
+        self.filler = filler
+        self.register = register
+        self.flags = flags
+        self.interrupts_enabled = interrupts_enabled
+
+        return
+
+    def __str__(self):
+
+        return str(self.__dict__)
+
+    def image(self):
+
+        words = [word for instruction in self.program for word in instruction]
+
+        return (words + self.filler[len(words):])[:len(self.filler)]
+
+    def replace(self, **changes):
+
+        fields = dict(self.__dict__)
+        fields.update(changes)
+
+        return FuzzCase(**fields)
+
+
+def random_instruction(rng, codes, operations, constants):
+    """
+    Make a random instruction: one of `codes`, with register operands (and
+    an immediate for `LDI`).
+    """
+
+    code = rng.choice(codes)
+    words = [code]
+
+    for i in range(operations.ARGS[code]):
+        if i == 1 and operations.CODE_NAME[code] == "LDI":
+            words.append(rng.randrange(constants.WORD_SIZE))
+        else:
+            words.append(rng.randrange(constants.REGISTER_COUNT))
+
+    return tuple(words)
+
+
+def random_case(rng, cpu_class=CPU):
+
+    operations = cpu_class.OPERATIONS
+    constants = cpu_class.CONSTANTS
+
+    codes = sorted(operations.CODES.values())
+
+    program = [
+        random_instruction(rng, codes, operations, constants)
+        for _ in range(rng.randint(1, MAX_PROGRAM_LENGTH))
+    ]
+
+    filler = [rng.randrange(constants.WORD_SIZE) for _ in range(constants.WORD_SIZE)]
+
+    register = [rng.randrange(constants.WORD_SIZE) for _ in range(constants.REGISTER_COUNT)]
+    register[constants.REGISTER_OF_STACK_POINTER] = constants.ADDRESS_OF_STACK_START
+
+    if rng.random() >= INTERRUPT_CHANCE:
+        register[constants.REGISTER_OF_INTERRUPT_MASK] = 0
+
+    return FuzzCase(
+        program,
+        filler,
+        register,
+        rng.randrange(1 << 3),
+        rng.random() < INTERRUPT_CHANCE,
+    )
+
+
+def format_case(case, cpu_class=CPU):
+    """
+    Format `case` as a `.ls8` program, with its starting state in comments.
+    """
+
+    operations = cpu_class.OPERATIONS
+    constants = cpu_class.CONSTANTS
+
+    lines = [
+        "# fuzz reproducer",
+        f"# registers: {case.register}",
+        f"# flags: {case.flags:03b}",
+        f"# interrupts enabled: {case.interrupts_enabled}",
+    ]
+
+    def word(value):
+        return constants.format_as_bin(value)[-constants.BIT_COUNT:]
+
+    address = 0
+
+    for instruction in case.program:
+
+        code = instruction[0]
+        name = operations.CODE_NAME[code] if code in operations else "???"
+        operands = ",".join(str(operand) for operand in instruction[1:])
+
+        lines.append(f"{word(code)} # {address:02X}: {name} {operands}".rstrip())
+        lines.extend(word(operand) for operand in instruction[1:])
+
+        address += len(instruction)
+
+    # the filler, up to its last non-zero word
+    image = case.image()
+    end = max([address] + [i + 1 for i in range(address, len(image)) if image[i]])
+
+    if end > address:
+        lines.append(f"# filler from {address:02X}")
+        lines.extend(word(value) for value in image[address:end])
+
+    return "\n".join(lines) + "\n"
+
+
+############################################################
+#   ENGINES
+############################################################
+
+
+def advance_reference(cpu, count):
+    """
+    Run `count` instructions on the reference interpreter.
+    """
+
+    cpu.run_debug(stop_count=cpu.instruction_count + count)
+
+    return
+
+
+def advance_step(cpu, count):
+
+    cpu.step(count)
+
+    return
+
+
+def advance_run(cpu, count):
+
+    if not cpu.halted:
+        cpu.run(max_instructions=count)
+
+    return
+
+
+def advance_aot(cpu, count):
+
+    from . import aot
+
+    aot.run_aot(cpu, module=aot.load(cpu, cache=False), max_instructions=count)
+
+    return
+
+
+# name: (CPU keyword arguments, advance function)
+REFERENCE = ({"fuse": False}, advance_reference)
+
+ENGINES = {
+    "step": ({"fuse": False}, advance_step),
+    "fused": ({"fuse": True}, advance_step),
+    "table": ({"fuse": False, "table_alu": True}, advance_step),
+    "run": ({"fuse": True, "table_alu": True}, advance_run),
+}
+
+# engines that cannot stop at exact counts, so are only compared at the end
+# of the programs that halt
+FINAL_ENGINES = {
+    "aot": ({"fuse": True}, advance_aot),
+    "memo": ({"fuse": True, "memoize": True}, advance_run),
+}
+
+#-----------------------------------------------------------
+
+
+def new_machine(case, cpu_kwargs, cpu_class=CPU):
+
+    cpu = cpu_class(**cpu_kwargs)
+
+    cpu.memory[:] = case.image()
+    cpu.register[:] = case.register
+    cpu.flags = case.flags
+    cpu.interrupts_enabled = case.interrupts_enabled
+    cpu.output = io.StringIO()
+
+    cpu.predecode()
+
+    return cpu
+
+
+def snapshot(cpu, error):
+    """
+    Get everything two machines must agree on.
+    """
+
+    return {
+        "program_pointer": cpu.program_pointer,
+        "register": list(cpu.register),
+        "flags": cpu.flags,
+        "memory": list(cpu.memory),
+        "output": cpu.output.getvalue(),
+        "halt_reason": cpu.halt_reason,
+        "error": error,
+    }
+
+
+def run_case(case, engines, steps=DEFAULT__STEPS, every=DEFAULT__EVERY, cpu_class=CPU):
+    """
+    Run `case` on the reference and on each of `engines`, comparing them every
+    `every` instructions. Returns `None`, or a description of the first
+    divergence: `(engine, instruction_count, field, expected, actual)`.
+    """
+
+    machines = [("reference", REFERENCE[1], new_machine(case, REFERENCE[0], cpu_class), [None])]
+
+    for name in engines:
+        if name in ENGINES:
+            (cpu_kwargs, advance) = ENGINES[name]
+            machines.append((name, advance, new_machine(case, cpu_kwargs, cpu_class), [None]))
+
+    for done in range(every, steps + every, every):
+
+        snapshots = []
+
+        for (name, advance, cpu, error) in machines:
+
+            if error[0] is None and not cpu.halted:
+                try:
+                    advance(cpu, every)
+                except Exception as exception:
+                    error[0] = type(exception).__name__
+
+            snapshots.append(snapshot(cpu, error[0]))
+
+        expected = snapshots[0]
+
+        for ((name, _, _, _), actual) in zip(machines[1:], snapshots[1:]):
+            for field in expected:
+                if expected[field] != actual[field]:
+                    return (name, done, field, expected[field], actual[field])
+
+        if all(cpu.halted or error[0] is not None for (_, _, cpu, error) in machines):
+            break
+
+    (_, _, reference, error) = machines[0]
+
+    if not (reference.halted or error[0] is not None):
+        return None
+
+    expected = snapshot(reference, error[0])
+
+    for name in engines:
+
+        if name not in FINAL_ENGINES:
+            continue
+
+        (cpu_kwargs, advance) = FINAL_ENGINES[name]
+        cpu = new_machine(case, cpu_kwargs, cpu_class)
+        error = None
+
+        try:
+            advance(cpu, steps)
+        except Exception as exception:
+            error = type(exception).__name__
+
+        actual = snapshot(cpu, error)
+
+        for field in expected:
+            if expected[field] != actual[field]:
+                return (name, reference.instruction_count, field, expected[field], actual[field])
+
+    return None
+
+
+############################################################
+#   SHRINKING
+############################################################
+
+
+def shrink(case, engines, steps=DEFAULT__STEPS, every=1, cpu_class=CPU):
+    """
+    Shrink a diverging `case` while it still diverges: drop runs of
+    instructions, then zero operands, registers, flags and filler.
+    """
+
+    def diverges(candidate):
+        return run_case(candidate, engines, steps, every, cpu_class) is not None
+
+    # drop instructions, halving the run length each pass
+    length = max(len(case.program) // 2, 1)
+
+    while length >= 1:
+
+        start = 0
+
+        while start < len(case.program) and len(case.program) > 1:
+
+            candidate = case.replace(program=case.program[:start] + case.program[start + length:])
+
+            if candidate.program and diverges(candidate):
+                case = candidate
+            else:
+                start += length
+
+        length //= 2
+
+    # zero operands
+    for (i, instruction) in enumerate(case.program):
+        for j in range(1, len(instruction)):
+
+            if instruction[j] == 0:
+                continue
+
+            program = list(case.program)
+            program[i] = instruction[:j] + (0, ) + instruction[j + 1:]
+            candidate = case.replace(program=program)
+
+            if diverges(candidate):
+                case = candidate
+                instruction = program[i]
+
+    # zero registers (but the stack pointer), flags and filler
+    for i in range(len(case.register) - 1):
+
+        if case.register[i] == 0:
+            continue
+
+        register = list(case.register)
+        register[i] = 0
+        candidate = case.replace(register=register)
+
+        if diverges(candidate):
+            case = candidate
+
+    for candidate in (
+        case.replace(flags=0),
+        case.replace(interrupts_enabled=False),
+        case.replace(filler=[0] * len(case.filler)),
+    ):
+        if diverges(candidate):
+            case = candidate
+
+    return case
+
+
+############################################################
+#   DRIVER
+############################################################
+
+
+def fuzz_batch(seed, batch, count, engines, steps, every):
+    """
+    Fuzz `count` programs made from `(seed, batch)`. Returns
+    `(count, failures)`, with each failure a shrunk `(case, divergence)`.
+    """
+
+    rng = random.Random(f"{seed}:{batch}")
+
+    failures = []
+
+    # `DIV` and `MOD` by zero report to stderr
+    with contextlib.redirect_stderr(io.StringIO()):
+
+        for _ in range(count):
+
+            case = random_case(rng)
+            divergence = run_case(case, engines, steps, every)
+
+            if divergence is None:
+                continue
+
+            # shrink at the spacing the divergence was found at, and keep the
+            # original if the shrunk case no longer diverges
+            shrunk = shrink(case, engines, steps, every)
+            shrunk_divergence = run_case(shrunk, engines, steps, every)
+
+            if shrunk_divergence is None:
+                failures.append((case, divergence))
+            else:
+                failures.append((shrunk, shrunk_divergence))
+
+    return (count, failures)
+
+
+def report(case, divergence, out_dir, index):
+
+    (engine, done, field, expected, actual) = divergence
+
+    print(f"divergence: {engine} after {done} instructions, in {field}")
+    print(f"    reference: {expected}")
+    print(f"    {engine}: {actual}")
+
+    text = format_case(case)
+
+    if out_dir is None:
+        print(text)
+        return
+
+    os.makedirs(out_dir, exist_ok=True)
+    path = os.path.join(out_dir, f"fuzz-{index:04}.ls8")
+
+    with open(path, "w") as file:
+        file.write(text)
+
+    print(f"    reproducer: {path}")
+
+    return
+
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(description="Cross-check the LS-8 engines against the reference interpreter.")
+    parser.add_argument("--programs", type=int, default=DEFAULT__PROGRAMS)
+    parser.add_argument("--seed", type=int, default=DEFAULT__SEED)
+    parser.add_argument("--jobs", type=int, default=os.cpu_count())
+    parser.add_argument("--steps", type=int, default=DEFAULT__STEPS, help="instructions per program, at most")
+    parser.add_argument("--every", type=int, default=DEFAULT__EVERY, help="instructions between comparisons")
+    parser.add_argument(
+        "--engine",
+        action="append",
+        choices=tuple(ENGINES) + tuple(FINAL_ENGINES),
+        help="engines to check (default: all)",
+    )
+    parser.add_argument("--out", help="directory for reproducers (default: print them)")
+    args = parser.parse_args(argv)
+
+    engines = tuple(args.engine or tuple(ENGINES) + tuple(FINAL_ENGINES))
+
+    batches = [
+        (args.seed, batch, min(DEFAULT__BATCH, args.programs - start), engines, args.steps, args.every)
+        for (batch, start) in enumerate(range(0, args.programs, DEFAULT__BATCH))
+    ]
+
+    start = time.perf_counter()
+    programs = 0
+    failures = 0
+
+    if args.jobs > 1:
+        from concurrent.futures import ProcessPoolExecutor
+        pool = ProcessPoolExecutor(args.jobs)
+        results = pool.map(fuzz_batch, *zip(*batches))
+    else:
+        pool = None
+        results = (fuzz_batch(*batch) for batch in batches)
+
+    for (count, batch_failures) in results:
+
+        programs += count
+
+        for (case, divergence) in batch_failures:
+            failures += 1
+            report(case, divergence, args.out, failures)
+
+    if pool is not None:
+        pool.shutdown()
+
+    elapsed = time.perf_counter() - start
+
+    print(
+        f"{programs} programs, {failures} divergences, in {elapsed:.1f} s"
+        f" ({programs / elapsed * 3600:,.0f} programs/hour on {args.jobs} jobs)"
+    )
+
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
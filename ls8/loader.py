@@ -0,0 +1,392 @@
+"""
+Read LS-8 programs from byte streams, in the formats programs come in.
+
+A `ProgramReader` reads a stream a chunk at a time, and yields runs of
+words with their load address as soon as they are parsed, so a program can
+be piped straight from the assembler (or any generator) into memory. The
+format is one of
+
+    ls8     `.ls8` text: a word in binary per line, `#` comments
+    hex     hexadecimal text: words separated by whitespace, `#` or `;`
+            comments
+    ihex    Intel HEX records, with load addresses and maybe a start address
+    raw     raw bytes: a word per byte, or little-endian words for the
+            16-bit CPU
+
+and is detected from the stream unless it is given. A stream holding NUL or
+other control bytes is raw. Text is told apart by its first line that holds
+anything: `:` starts Intel HEX, a word of binary digits longer than a hex
+word starts `.ls8` text, and anything else must be hex words.
+
+Intel HEX addresses are byte addresses; for the 16-bit CPU, records hold
+whole little-endian words.
+"""
+
+############################################################
+
+import sys
+
+############################################################
+
+FORMAT__LS8 = "ls8"
+FORMAT__HEX = "hex"
+FORMAT__IHEX = "ihex"
+FORMAT__RAW = "raw"
+
+FORMATS = (FORMAT__LS8, FORMAT__HEX, FORMAT__IHEX, FORMAT__RAW)
+
+STDIN = "-"
+
+CHUNK_SIZE = 1 << 16    # bytes
+DETECT_SIZE = 512    # bytes
+
+# Intel HEX record types
+IHEX__DATA = 0x00
+IHEX__END_OF_FILE = 0x01
+IHEX__EXTENDED_SEGMENT_ADDRESS = 0x02
+IHEX__START_SEGMENT_ADDRESS = 0x03
+IHEX__EXTENDED_LINEAR_ADDRESS = 0x04
+IHEX__START_LINEAR_ADDRESS = 0x05
+
+TEXT_CONTROLS = frozenset(b"\t\n\v\f\r")
+
+############################################################
+
+
+def open_program(program):
+    """
+    Open `program` for reading bytes: a path, `-` for stdin, or a binary
+    stream (which is left open).
+    """
+
+    if isinstance(program, (str, bytes)) or hasattr(program, "__fspath__"):
+
+        if program == STDIN:
+            return Borrowed(sys.stdin.buffer)
+
+        return open(program, "rb")
+
+    return Borrowed(program)
+
+
+class Borrowed:
+    """
+    A stream that someone else closes, for `with`.
+    """
+
+    def __init__(self, stream):
+
+        self.stream = stream
+
+        return
+
+    def __str__(self):
+
+        return str(self.__dict__)
+
+    def __enter__(self):
+
+        return self.stream
+
+    def __exit__(self, *exc_info):
+
+        return
+
+
+def is_text(head):
+
+    return not any(byte < 0x20 and byte not in TEXT_CONTROLS for byte in head)
+
+
+def chunks(stream, head=b""):
+
+    # `read1` returns what a pipe has, rather than waiting for a full chunk
+    read = getattr(stream, "read1", stream.read)
+
+    if head:
+        yield head
+
+    while True:
+
+        chunk = read(CHUNK_SIZE)
+
+        if not chunk:
+            return
+
+        yield chunk
+
+
+def lines(chunks):
+
+    rest = b""
+
+    for chunk in chunks:
+
+        parts = (rest + chunk).split(b"\n")
+        rest = parts.pop()
+
+        yield from parts
+
+    if rest:
+        yield rest
+
+    return
+
+
+############################################################
+
+
+class ProgramReader:
+    """
+    Reads programs for a CPU with `constants`, in `format` (or in the
+    format the stream holds). After a read, `format` is the format that was
+    read, `start` the start address (if an Intel HEX record gave one), and
+    `size` one past the highest address loaded.
+    """
+
+    def __init__(self, constants, format=None):
+
+        if format is not None and format not in FORMATS:
+            raise ValueError(f"unknown program format: {format!r}")
+
+        self.word_size = constants.WORD_SIZE
+        self.word_mask = constants.WORD_SIZE - 1
+        self.word_bytes = (constants.BIT_COUNT + 7) // 8
+        self.hex_width = constants.HEX_WIDTH
+
+        self.given_format = format
+        self.format = format
+        self.start = None
+        self.size = 0
+
+        return
+
+    def __str__(self):
+
+        return str(self.__dict__)
+
+    #-----------------------------------------------------------
+
+    def read(self, stream, head=b""):
+        """
+        Read the program in the binary `stream` (after `head`, what was
+        already read from it), yielding `(address, words)` for each run of
+        words parsed.
+        """
+
+        self.format = self.given_format
+        self.start = None
+        self.size = 0
+
+        if self.format is None:
+
+            # read what there is, up to `DETECT_SIZE`, to tell raw bytes from text
+            while len(head) < DETECT_SIZE:
+                chunk = stream.read(DETECT_SIZE - len(head))
+                if not chunk:
+                    break
+                head += chunk
+
+            if not is_text(head):
+                self.format = FORMAT__RAW
+
+        if self.format == FORMAT__RAW:
+            runs = self.read_raw(chunks(stream, head))
+        else:
+            runs = self.read_text(lines(chunks(stream, head)))
+
+        for (address, words) in runs:
+
+            stop = address + len(words)
+
+            if stop > self.word_size:
+                raise ValueError(f"the program does not fit in memory: {len(words)} words at {address}")
+
+            self.size = max(self.size, stop)
+
+            yield (address, words)
+
+        return
+
+    def read_raw(self, chunks):
+
+        address = 0
+        rest = b""
+
+        for chunk in chunks:
+
+            data = rest + chunk
+            end = len(data) - len(data) % self.word_bytes
+            rest = data[end:]
+
+            if self.word_bytes == 1:
+                words = data[:end]
+            else:
+                # imported here, since only raw 16-bit programs need it
+                from array import array
+                words = array("H", data[:end])
+                if sys.byteorder == "big":
+                    words.byteswap()
+
+            if words:
+                yield (address, words)
+                address += len(words)
+
+        if rest:
+            raise ValueError("the raw program ends in the middle of a word")
+
+        return
+
+    def read_text(self, lines):
+
+        parse = None
+        address = 0
+
+        for (line_num, line) in enumerate(lines, start=1):
+
+            line_str = line.split(b"#")[0].strip()
+
+            if not line_str:
+                continue
+
+            try:
+
+                if parse is None:
+                    parse = self.text_parser(line_str)
+
+                for (run_address, words) in parse(line_str, address):
+
+                    if run_address is None:
+                        # the end-of-file record
+                        return
+
+                    yield (run_address, words)
+                    address = run_address + len(words)
+
+            except ValueError as exception:
+                raise ValueError(f"line {line_num}: {exception}") from None
+
+        return
+
+    def text_parser(self, line_str):
+        """
+        Get the parser for the format the first line `line_str` is in.
+        """
+
+        if self.format is None:
+
+            first = line_str.split()[0]
+
+            if line_str.startswith(b":"):
+                self.format = FORMAT__IHEX
+            elif len(first) > self.hex_width and not first.strip(b"01"):
+                self.format = FORMAT__LS8
+            else:
+                self.format = FORMAT__HEX
+
+        return {
+            FORMAT__LS8: self.parse_ls8,
+            FORMAT__HEX: self.parse_hex,
+            FORMAT__IHEX: IntelHexParser(self).parse,
+        }[self.format]
+
+    #-----------------------------------------------------------
+
+    def parse_ls8(self, line_str, address):
+
+        yield (address, [int(line_str, base=2) & self.word_mask])
+
+        return
+
+    def parse_hex(self, line_str, address):
+
+        words = [int(token, base=16) for token in line_str.split(b";")[0].split()]
+
+        for word in words:
+            if not 0 <= word <= self.word_mask:
+                raise ValueError(f"word out of range: {word:#x}")
+
+        if words:
+            yield (address, words)
+
+        return
+
+
+class IntelHexParser:
+    """
+    Parses Intel HEX records, one line at a time. Yields `(address, words)`
+    for data records, and `(None, [])` for the end-of-file record.
+    """
+
+    def __init__(self, reader):
+
+        self.reader = reader
+        self.base = 0
+
+        return
+
+    def __str__(self):
+
+        return str(self.__dict__)
+
+    def parse(self, line_str, address):
+
+        if not line_str.startswith(b":"):
+            raise ValueError("an Intel HEX record starts with `:`")
+
+        record = bytes.fromhex(line_str[1:].decode("ascii"))
+
+        if len(record) < 5 or len(record) != 5 + record[0]:
+            raise ValueError("Intel HEX record of the wrong length")
+
+        if sum(record) & 0xFF:
+            raise ValueError("Intel HEX record with a bad checksum")
+
+        (count, offset, kind, data) = (record[0], int.from_bytes(record[1:3], "big"), record[3], record[4:-1])
+
+        if kind == IHEX__DATA:
+            if count:
+                yield (self.word_address(self.base + offset, count), self.words(data))
+
+        elif kind == IHEX__END_OF_FILE:
+            yield (None, [])
+
+        elif kind == IHEX__EXTENDED_SEGMENT_ADDRESS:
+            self.base = int.from_bytes(data, "big") << 4
+
+        elif kind == IHEX__EXTENDED_LINEAR_ADDRESS:
+            self.base = int.from_bytes(data, "big") << 16
+
+        elif kind == IHEX__START_SEGMENT_ADDRESS:
+            segment = int.from_bytes(data[:2], "big")
+            offset = int.from_bytes(data[2:], "big")
+            self.reader.start = self.word_address((segment << 4) + offset)
+
+        elif kind == IHEX__START_LINEAR_ADDRESS:
+            self.reader.start = self.word_address(int.from_bytes(data, "big"))
+
+        else:
+            raise ValueError(f"unknown Intel HEX record type: {kind:#04x}")
+
+        return
+
+    def word_address(self, byte_address, count=0):
+
+        word_bytes = self.reader.word_bytes
+
+        if byte_address % word_bytes or count % word_bytes:
+            raise ValueError("Intel HEX record that does not hold whole words")
+
+        address = byte_address // word_bytes
+
+        if address >= self.reader.word_size:
+            raise ValueError(f"Intel HEX address out of memory: {byte_address:#x}")
+
+        return address
+
+    def words(self, data):
+
+        if self.reader.word_bytes == 1:
+            return list(data)
+
+        return [int.from_bytes(data[i:i + 2], "little") for i in range(0, len(data), 2)]
@@ -1,6 +1,13 @@
 #!/usr/bin/env python3
 """
 Main.
+
+Usage: python -m ls8.ls8 [--cfg] [--debug] [--wide] [--table-alu] [--aot] [--timer [SECONDS]] [--keyboard]
+                         [--trace FILE] [--profile [N]] [--pipeline [N]] [--pipeline-config KEY=VALUE,...]
+                         [--cache [DIR]] [--cores N]
+                         [--format FORMAT] (PROGRAM | - | --example NAME)
+       python -m ls8.ls8 serve SOCKET [--workers N]    (see `serve`)
+       python -m ls8.ls8 cluster (PROGRAM | --example NAME) --nodes N [--workers N]    (see `cluster`)
 """
 
 ############################################################
@@ -8,7 +15,11 @@ Main.
 import os
 import sys
 
-from .cpu import CPU
+from types import SimpleNamespace as Namespace
+
+from .cpu import CPU, WideCPU
+from .cpu__results import REASON__BREAKPOINT, REASON__UNKNOWN_OPERATION
+from .loader import FORMATS, STDIN
 
 ############################################################
 
@@ -19,44 +30,424 @@ def normpath_join(*args):
 
 ############################################################
 
-args = sys.argv
-# print(args)
-
-current_dir = os.getcwd()
-# print(current_dir)
-project_dir = normpath_join(args[0], "../../")
-# print(project_dir)
+project_dir = normpath_join(os.path.abspath(__file__), "../../")
 examples_dir = normpath_join(project_dir, "./ls8/examples")
-# print(examples_dir)
 examples_ext = ".ls8"
-# print(examples_ext)
-program_file = None
-# print(program_file)
 
-if args[1] == "--example" or args[1] == "-e":
+#-----------------------------------------------------------
 
-    try:
+# what `parse_commandline_full` gives when only a program or example is named
+COMMANDLINE__DEFAULTS = {
+    "program": None,
+    "example": None,
+    "format": None,
+    "cfg": False,
+    "debug": False,
+    "wide": False,
+    "table_alu": False,
+    "memoize": False,
+    "aot": False,
+    "timer": None,
+    "keyboard": False,
+    "watch": None,
+    "breakpoint": None,
+    "trace": None,
+    "profile": None,
+    "pipeline": None,
+    "pipeline_config": None,
+    "cache": None,
+    "cores": None,
+    "metrics": None,
+    "metrics_format": "json",
+    "metrics_interval": 1.0,
+}
+
+
+def parse_commandline(argv):
+    """
+    Parse the command line. The plain `program` and `--example NAME` forms
+    are handled directly, since importing `argparse` (and `re` with it) is a
+    large share of startup for short programs; anything else uses argparse.
+    """
+
+    args = argv[1:]
+
+    if len(args) == 1 and not args[0].startswith("-"):
+        return Namespace(**dict(COMMANDLINE__DEFAULTS, program=args[0]))
+
+    if len(args) == 2 and args[0] in ("-e", "--example"):
+        return Namespace(**dict(COMMANDLINE__DEFAULTS, example=args[1]))
+
+    return parse_commandline_full(argv)
+
+
+def parse_commandline_full(argv):
+
+    import argparse
 
-        example_name = args[2]
+    parser = argparse.ArgumentParser(prog="ls8", description="Run an LS-8 program.")
+
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("program", nargs="?", help="path to a program, or `-` to read it from stdin")
+    source.add_argument("-e", "--example", help="name of a program in `ls8/examples`")
+
+    parser.add_argument(
+        "--format",
+        choices=FORMATS,
+        help="the program's format: `.ls8` text, hex text, Intel HEX or raw bytes (default: detected)",
+    )
+    parser.add_argument("--cfg", action="store_true", help="print the control-flow graph and exit")
+    parser.add_argument("--debug", action="store_true", help="print what the CPU is doing")
+    parser.add_argument("--wide", action="store_true", help="run on the 16-bit CPU (`asm.py --wide` output)")
+    parser.add_argument("--table-alu", action="store_true", help="run ALU operations from lookup tables (8-bit only)")
+    parser.add_argument("--memoize", action="store_true", help="memoize calls to pure subroutines")
+    parser.add_argument("--aot", action="store_true", help="run a cached Python translation of the program")
+    parser.add_argument(
+        "--timer",
+        type=float,
+        nargs="?",
+        const=1.0,
+        metavar="SECONDS",
+        help="raise the timer interrupt every SECONDS (default: 1)",
+    )
+    parser.add_argument("--keyboard", action="store_true", help="raise the keyboard interrupt for each byte on stdin")
+    parser.add_argument(
+        "--watch",
+        action="append",
+        type=parse_watch,
+        metavar="START[-END][:read]",
+        help="stop when the program writes (or reads) an address in a hex range",
+    )
+    parser.add_argument(
+        "--break",
+        dest="breakpoint",
+        action="append",
+        type=lambda text: int(text, base=16),
+        metavar="ADDRESS",
+        help="print the registers each time the program reaches a hex address",
+    )
+    parser.add_argument(
+        "--trace",
+        metavar="FILE",
+        help="record each instruction run to a trace file, for `ls8.disasm`",
+    )
+    parser.add_argument(
+        "--profile",
+        type=int,
+        nargs="?",
+        const=10,
+        metavar="N",
+        help="count instructions, and print the N busiest source lines and labels (default: 10)",
+    )
+    parser.add_argument(
+        "--pipeline",
+        type=int,
+        nargs="?",
+        const=10,
+        metavar="N",
+        help="model cycles on a pipeline with an L1 cache, and print the N costliest labels and source lines "
+        "(default: 10)",
+    )
+    parser.add_argument(
+        "--pipeline-config",
+        metavar="KEY=VALUE,...",
+        help="settings of the --pipeline model: stages, taken_penalty, cache_size, ways, line_size, miss_penalty, "
+        "or a code name for its latency (e.g. MUL=8); see `ls8.pipeline`",
+    )
+    parser.add_argument(
+        "--cache",
+        nargs="?",
+        const="",
+        metavar="DIR",
+        help="reuse the results of deterministic runs, kept in DIR (default: ~/.cache/ls8/results)",
+    )
+    parser.add_argument(
+        "--cores",
+        type=int,
+        metavar="N",
+        help="run on N cores sharing memory, each in its own process (see `ls8.smp`)",
+    )
+    parser.add_argument(
+        "--metrics",
+        metavar="TARGET",
+        help="publish CPU metrics to a file, or to `unix:PATH`",
+    )
+    parser.add_argument("--metrics-format", choices=("json", "prometheus"), default="json")
+    parser.add_argument("--metrics-interval", type=float, default=1.0, metavar="SECONDS")
+
+    return parser.parse_args(argv[1:])
+
+
+def parse_watch(text):
+    """
+    Parse `START[-END][:read|:write]`, with hex addresses and END inclusive,
+    as `(range, on)`.
+    """
+
+    (addresses, _, on) = text.partition(":")
+    (start, _, end) = addresses.partition("-")
+
+    start = int(start, base=16)
+    end = start if not end else int(end, base=16)
+
+    return (range(start, end + 1), on or "write")
+
+
+def find_program_file(args):
+
+    if args.example is not None:
+
+        example_name = args.example
 
         if example_name.endswith(examples_ext):
             example_name = example_name[:-len(examples_ext)]
 
-        program_file = normpath_join(examples_dir, example_name + examples_ext)
+        return normpath_join(examples_dir, example_name + examples_ext)
+
+    if args.program == STDIN:
+        return STDIN
+
+    return normpath_join(project_dir, args.program)
 
-    except IndexError:
 
-        raise Exception("MissingExampleName")
+def print_breakpoint(cpu):
 
-else:
+    print(
+        "breakpoint: at {}: {}".format(
+            cpu.format_address(cpu.program_pointer),
+            " ".join(cpu.format_iterable(*cpu.register)),
+        ),
+        file=sys.stderr,
+    )
 
-    program_file = args[1]
-    program_file = normpath_join(project_dir, program_file)
+    return
+
+
+def print_watch_hit(cpu, hit):
+
+    print(
+        "watchpoint: {} of {} at {}: {} -> {}".format(
+            hit.watchpoint.on,
+            cpu.format_value(hit.address),
+            cpu.format_address(hit.program_pointer),
+            *cpu.format_iterable(hit.old_value, hit.new_value),
+        ),
+        file=sys.stderr,
+    )
+
+    return
+
+
+def print_unknown_operation(cpu):
+
+    print(
+        "error: unknown operation {} at {}".format(
+            cpu.format_value(cpu.memory[cpu.program_pointer]),
+            cpu.format_address(cpu.program_pointer),
+        ),
+        file=sys.stderr,
+    )
+
+    return
+
+
+def run_cores(args, program_file):
+    """
+    Run the program on a machine of `args.cores` cores (see `smp`).
+    """
+
+    uses_devices = args.timer is not None or args.keyboard
+    observed = args.watch or args.breakpoint or args.trace or args.profile is not None or args.pipeline is not None
+
+    if args.debug or args.aot or uses_devices or observed or args.cache is not None or args.metrics:
+        print("error: --cores runs without debugging, devices, tracing, profiling, caching or metrics", file=sys.stderr)
+        return 2
+
+    from .smp import Machine
+
+    try:
+        machine = Machine(args.cores, wide=args.wide, table_alu=args.table_alu)
+    except ValueError as exception:
+        print(f"error: {exception}", file=sys.stderr)
+        return 2
+
+    with machine:
+
+        try:
+            machine.load(program_file, args.format)
+        except ValueError as exception:
+            program_name = "stdin" if program_file == STDIN else program_file
+            print(f"error: cannot load {program_name}: {exception}", file=sys.stderr)
+            return 1
+
+        machine.run()
+
+        for core in machine.cores:
+            if core.halt_reason == REASON__UNKNOWN_OPERATION:
+                print(f"core {core.core_id}: ", end="", file=sys.stderr)
+                print_unknown_operation(core)
+
+    return 0
 
-# print(program_file)
 
 #-----------------------------------------------------------
 
-cpu = CPU(debug=False)
-cpu.load(program_file)
-cpu.run()
+
+def main(argv):
+
+    if len(argv) > 1 and argv[1] == "serve":
+
+        from .serve import main as serve
+
+        return serve(argv[1:])
+
+    if len(argv) > 1 and argv[1] == "cluster":
+
+        from .cluster import main as cluster
+
+        return cluster(argv[1:])
+
+    args = parse_commandline(argv)
+    program_file = find_program_file(args)
+
+    if args.cores is not None:
+        return run_cores(args, program_file)
+
+    cpu_class = WideCPU if args.wide else CPU
+
+    cpu = cpu_class(debug=args.debug, table_alu=args.table_alu, memoize=args.memoize)
+    if program_file == STDIN and args.keyboard:
+        print("error: --keyboard reads stdin, so the program cannot come from it", file=sys.stderr)
+        return 2
+
+    try:
+        cpu.load(program_file, args.format)
+    except ValueError as exception:
+        program_name = "stdin" if program_file == STDIN else program_file
+        print(f"error: cannot load {program_name}: {exception}", file=sys.stderr)
+        return 1
+
+    # `asm.py` writes `program.ls8.map` next to the programs it assembles
+    if program_file != STDIN:
+
+        from .sourcemap import find_source_map
+
+        cpu.source_map = find_source_map(program_file, cpu.CONSTANTS.WORD_SIZE)
+
+    if args.cfg:
+
+        from .analysis import build_cfg, format_cfg
+
+        cfg = build_cfg(cpu.memory, operations=cpu.OPERATIONS, constants=cpu.CONSTANTS)
+        print(format_cfg(cfg, cpu.source_map))
+
+        return 0
+
+    if args.timer is not None or args.keyboard:
+
+        from .devices import KeyboardDevice, TimerDevice
+
+        if args.timer is not None:
+            cpu.map_device(TimerDevice(args.timer))
+
+        if args.keyboard:
+            cpu.map_device(KeyboardDevice(cpu.CONSTANTS.ADDRESS_OF_KEY_PRESSED, stdin=True))
+
+    for (address_range, on) in args.watch or ():
+        cpu.watch(address_range, on)
+
+    for address in args.breakpoint or ():
+        cpu.add_breakpoint(address)
+
+    recorder = None
+
+    if args.trace is not None:
+
+        from .trace import TraceRecorder
+
+        recorder = TraceRecorder(cpu, args.trace)
+        recorder.start()
+
+    profiler = None
+
+    if args.profile is not None:
+
+        from .profiler import Profiler
+
+        profiler = Profiler(cpu)
+        profiler.start()
+
+    model = None
+
+    if args.pipeline is not None or args.pipeline_config is not None:
+
+        from .pipeline import PipelineModel, parse_config
+
+        try:
+            model = PipelineModel(cpu, **parse_config(args.pipeline_config or ""))
+        except ValueError as exception:
+            print(f"error: {exception}", file=sys.stderr)
+            return 2
+
+        model.start()
+
+    publisher = None
+
+    if args.metrics is not None:
+
+        from .metrics import MetricsPublisher
+
+        publisher = MetricsPublisher(cpu, args.metrics, args.metrics_format, args.metrics_interval)
+        publisher.start()
+
+    try:
+
+        # breakpoints and watchpoints stop `run`, and traces, profiles and
+        # the pipeline model needs its hooks, so they run on the interpreter
+        if args.aot and not (args.breakpoint or args.watch or args.trace or profiler or model):
+
+            from .aot import run_aot
+
+            result = run_aot(cpu)
+
+        elif args.cache is not None:
+
+            from .cache import DEFAULT__DIRECTORY, ResultCache
+
+            result = ResultCache(args.cache or DEFAULT__DIRECTORY).run(cpu)
+
+        else:
+
+            result = cpu.run()
+
+        while result.reason == REASON__BREAKPOINT:
+            print_breakpoint(cpu)
+            result = cpu.run()
+
+        if result.watch_hit is not None:
+            print_watch_hit(cpu, result.watch_hit)
+
+        if result.reason == REASON__UNKNOWN_OPERATION:
+            print_unknown_operation(cpu)
+
+    finally:
+
+        if publisher is not None:
+            publisher.stop()
+
+        if recorder is not None:
+            recorder.stop()
+
+        if profiler is not None:
+            profiler.stop()
+            print(profiler.format_report(cpu.source_map, args.profile), file=sys.stderr)
+
+        if model is not None:
+            model.stop()
+            print(model.format_report(cpu.source_map, args.pipeline or 10), file=sys.stderr)
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,209 @@
+"""
+Publish the counters of a running CPU.
+
+A `MetricsPublisher` thread takes `CPU.metrics()` every `interval` seconds,
+adds the rate of instructions since the last snapshot, and publishes it as
+a JSON line or as Prometheus text. The CPU only bumps counters; all the
+formatting and I/O happens on the publisher's thread.
+
+A target of `unix:PATH` sends each snapshot to the Unix stream socket at
+`PATH`, reconnecting as needed. Any other target is a file: JSON lines are
+appended to it, and Prometheus text replaces it, for a textfile collector.
+
+Instructions are counted once per slice of `run`, so at short intervals
+the rate moves in steps. The ahead-of-time translation keeps the
+instruction and output counters, but not the branch and call counters.
+"""
+
+############################################################
+
+import json
+import os
+import socket
+import threading
+import time
+
+############################################################
+
+FORMATS = ("json", "prometheus")
+
+DEFAULT__FORMAT = "json"
+DEFAULT__INTERVAL = 1.0    # seconds
+
+SOCKET_PREFIX = "unix:"
+
+PROMETHEUS_PREFIX = "ls8_"
+
+# name: (type, help)
+PROMETHEUS_METRICS = {
+    "instructions": ("counter", "Instructions retired."),
+    "dispatches": ("counter", "Dispatches, counting each fused pair once."),
+    "branches_taken": ("counter", "Jumps taken."),
+    "max_call_depth": ("gauge", "Deepest nesting of CALL."),
+    "interrupts_serviced": ("counter", "Interrupts serviced."),
+    "interrupt_latency_seconds": ("counter", "Seconds from raising interrupts to servicing them."),
+    "max_interrupt_latency_seconds": ("gauge", "Longest wait from raising an interrupt to servicing it."),
+    "output_bytes": ("counter", "Bytes printed by PRN and PRA."),
+    "halted": ("gauge", "1 once the CPU has halted."),
+    "instructions_per_second": ("gauge", "Instructions retired per second, since the last snapshot."),
+}
+
+############################################################
+
+
+def format_json(snapshot):
+
+    return json.dumps(snapshot, sort_keys=True) + "\n"
+
+
+def format_prometheus(snapshot):
+
+    lines = []
+
+    for (name, (kind, help_text)) in PROMETHEUS_METRICS.items():
+
+        metric = PROMETHEUS_PREFIX + name + ("_total" if kind == "counter" else "")
+
+        lines.append(f"# HELP {metric} {help_text}")
+        lines.append(f"# TYPE {metric} {kind}")
+        lines.append(f"{metric} {snapshot[name]}")
+
+    return "\n".join(lines) + "\n"
+
+
+FORMATTERS = {
+    "json": format_json,
+    "prometheus": format_prometheus,
+}
+
+############################################################
+
+
+class MetricsPublisher:
+
+    def __init__(self, cpu, target, format=DEFAULT__FORMAT, interval=DEFAULT__INTERVAL):
+
+        if format not in FORMATS:
+            raise ValueError(f"unknown metrics format: {format!r}")
+
+        self.cpu = cpu
+        self.target = target
+        self.format = format
+        self.interval = interval
+
+        self.connection = None
+        self.stopped = None
+        self.thread = None
+
+        self.last_time = None
+        self.last_instructions = None
+
+        return
+
+    def __str__(self):
+
+        return str(self.__dict__)
+
+    #-----------------------------------------------------------
+
+    def start(self):
+
+        self.last_time = time.perf_counter()
+        self.last_instructions = self.cpu.instruction_count
+
+        self.stopped = threading.Event()
+
+        self.thread = threading.Thread(target=self.loop, args=(self.stopped, ), daemon=True)
+        self.thread.start()
+
+        return
+
+    def stop(self):
+        """
+        Stop the thread, then publish a last snapshot.
+        """
+
+        self.stopped.set()
+        self.thread.join()
+
+        self.publish()
+
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+        return
+
+    def loop(self, stopped):
+
+        while not stopped.wait(self.interval):
+            self.publish()
+
+        return
+
+    #-----------------------------------------------------------
+
+    def snapshot(self):
+        """
+        Get `CPU.metrics()` with `time` and `instructions_per_second` added.
+        """
+
+        snapshot = self.cpu.metrics()
+
+        now = time.perf_counter()
+        elapsed = now - self.last_time
+
+        snapshot["time"] = time.time()
+        snapshot["instructions_per_second"] = (
+            (snapshot["instructions"] - self.last_instructions) / elapsed if elapsed > 0 else 0.0
+        )
+
+        self.last_time = now
+        self.last_instructions = snapshot["instructions"]
+
+        return snapshot
+
+    def publish(self):
+
+        text = FORMATTERS[self.format](self.snapshot())
+
+        if self.target.startswith(SOCKET_PREFIX):
+            self.send(text)
+        elif self.format == "prometheus":
+            self.replace(text)
+        else:
+            with open(self.target, "a") as file:
+                file.write(text)
+
+        return
+
+    def replace(self, text):
+
+        # write then rename, so a collector never reads half a snapshot
+        temporary = f"{self.target}.{os.getpid()}.tmp"
+        with open(temporary, "w") as file:
+            file.write(text)
+        os.replace(temporary, self.target)
+
+        return
+
+    def send(self, text):
+        """
+        Send `text` to the socket, dropping it if nobody is listening.
+        """
+
+        try:
+
+            if self.connection is None:
+                self.connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                self.connection.connect(self.target[len(SOCKET_PREFIX):])
+
+            self.connection.sendall(text.encode())
+
+        except OSError:
+
+            if self.connection is not None:
+                self.connection.close()
+                self.connection = None
+
+        return
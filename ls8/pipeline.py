@@ -0,0 +1,367 @@
+"""
+Estimate the cycles a program takes on a simple microarchitecture.
+
+A `PipelineModel` follows a run through the CPU's hooks, as `Profiler`
+does: `on_read` and `on_write` note the memory an instruction touches, and
+`on_instruction` charges its cycles. It runs only when asked for, so the
+interpreter's plain path does not change. The model is
+
+    an in-order pipeline of `stages` stages, which takes `stages - 1`
+        cycles to fill, then finishes one instruction per cycle, except
+    `latencies`, the cycles an operation takes, by code name (`MUL`, ...;
+        every other operation takes 1);
+    `taken_penalty` cycles for every jump, call or return that does not go
+        on to the next instruction, and for entering an interrupt handler:
+        the pipeline fetches on as if nothing was taken, then flushes;
+    an L1 cache, unified, of `cache_size` words in lines of `line_size`
+        words, `ways`-way set associative with LRU replacement, allocating
+        on reads and writes; fetching an instruction reads each line its
+        words are in, and every miss costs `miss_penalty` cycles.
+
+The report gives the cycles, the CPI and the cache hit rate, overall and by
+label and source line when there is a source map (see `sourcemap`), or by
+address when there is not.
+"""
+
+############################################################
+
+DEFAULT__STAGES = 5
+DEFAULT__TAKEN_PENALTY = 2    # cycles
+DEFAULT__CACHE_SIZE = 64    # words
+DEFAULT__WAYS = 2
+DEFAULT__LINE_SIZE = 4    # words
+DEFAULT__MISS_PENALTY = 10    # cycles
+DEFAULT__LATENCIES = {"MUL": 4, "DIV": 20, "MOD": 20}    # cycles
+
+DEFAULT__TOP = 10    # rows per table
+
+SETTINGS = ("stages", "taken_penalty", "cache_size", "ways", "line_size", "miss_penalty")
+
+############################################################
+
+
+def parse_config(text):
+    """
+    Parse `KEY=VALUE,...` into keyword arguments for `PipelineModel`: keys
+    are `SETTINGS`, or code names (`MUL=8`) for latencies.
+    """
+
+    config = {}
+    latencies = {}
+
+    for item in text.split(","):
+
+        if not item.strip():
+            continue
+
+        (key, separator, value) = item.partition("=")
+        key = key.strip()
+
+        if not separator:
+            raise ValueError(f"pipeline setting without a value: {item.strip()!r}")
+
+        try:
+            value = int(value)
+        except ValueError:
+            raise ValueError(f"pipeline setting {key} is not a whole number: {value.strip()!r}") from None
+
+        if key in SETTINGS:
+            config[key] = value
+        elif key.isupper():
+            latencies[key] = value
+        else:
+            raise ValueError(f"unknown pipeline setting: {key!r}")
+
+    if latencies:
+        config["latencies"] = {**DEFAULT__LATENCIES, **latencies}
+
+    return config
+
+
+def is_power_of_two(number):
+
+    return number > 0 and not number & (number - 1)
+
+
+############################################################
+
+
+class L1Cache:
+    """
+    A set-associative cache with LRU replacement, that keeps only tags.
+    """
+
+    def __init__(self, size=DEFAULT__CACHE_SIZE, ways=DEFAULT__WAYS, line_size=DEFAULT__LINE_SIZE):
+
+        if not (is_power_of_two(size) and is_power_of_two(ways) and is_power_of_two(line_size)):
+            raise ValueError("cache size, ways and line size are powers of two")
+
+        if ways * line_size > size:
+            raise ValueError(f"a cache of {size} words cannot hold {ways} ways of {line_size}-word lines")
+
+        self.size = size
+        self.ways = ways
+        self.line_size = line_size
+
+        self.line_shift = line_size.bit_length() - 1
+        self.set_count = size // (ways * line_size)
+        self.set_mask = self.set_count - 1
+
+        # each set holds its tags, least recently used first
+        self.sets = [[] for _ in range(self.set_count)]
+
+        return
+
+    def __str__(self):
+
+        return str({"size": self.size, "ways": self.ways, "line_size": self.line_size})
+
+    def access_line(self, line):
+        """
+        Access the line number `line`. Gets whether it was a hit.
+        """
+
+        tags = self.sets[line & self.set_mask]
+
+        if line in tags:
+            if tags[-1] != line:
+                tags.remove(line)
+                tags.append(line)
+            return True
+
+        tags.append(line)
+
+        if len(tags) > self.ways:
+            del tags[0]
+
+        return False
+
+
+############################################################
+
+
+class PipelineModel:
+
+    def __init__(
+        self,
+        cpu,
+        stages=DEFAULT__STAGES,
+        taken_penalty=DEFAULT__TAKEN_PENALTY,
+        cache_size=DEFAULT__CACHE_SIZE,
+        ways=DEFAULT__WAYS,
+        line_size=DEFAULT__LINE_SIZE,
+        miss_penalty=DEFAULT__MISS_PENALTY,
+        latencies=None,
+    ):
+
+        latencies = DEFAULT__LATENCIES if latencies is None else latencies
+
+        if stages < 1 or taken_penalty < 0 or miss_penalty < 0:
+            raise ValueError("a pipeline has at least 1 stage, and no negative penalties")
+
+        for (code_name, cycles) in latencies.items():
+            if code_name not in cpu.OPERATIONS.CODES:
+                raise ValueError(f"latency for an unknown operation: {code_name}")
+            if cycles < 1:
+                raise ValueError(f"an operation takes at least 1 cycle, not {cycles} ({code_name})")
+
+        self.cpu = cpu
+
+        self.stages = stages
+        self.taken_penalty = taken_penalty
+        self.miss_penalty = miss_penalty
+
+        self.cache = L1Cache(cache_size, ways, line_size)
+
+        # per opcode: cycles, and width in words (unknown opcodes take 1 of each)
+        operations = cpu.OPERATIONS
+        self.cycles_of = [
+            latencies.get(operations.CODE_NAME[code], 1) if code in operations else 1
+            for code in range(cpu.CONSTANTS.WORD_SIZE)
+        ]
+        self.width_of = [
+            operations.WIDTH[code] if code in operations else 1
+            for code in range(cpu.CONSTANTS.WORD_SIZE)
+        ]
+
+        # the memory the running instruction touched, and cycles owed by
+        # what came before it (entering an interrupt handler)
+        self.touched = []
+        self.owed = 0
+
+        word_size = cpu.CONSTANTS.WORD_SIZE
+
+        # per address of an instruction
+        self.counts = [0] * word_size
+        self.cycles = [0] * word_size
+        self.accesses = [0] * word_size
+        self.hits = [0] * word_size
+
+        return
+
+    def __str__(self):
+
+        return str({"cpu": self.cpu, "cache": self.cache, "instructions": sum(self.counts)})
+
+    #-----------------------------------------------------------
+
+    def start(self):
+
+        cpu = self.cpu
+
+        cpu.add_hook("on_read", self.record_access)
+        cpu.add_hook("on_write", self.record_access)
+        cpu.add_hook("on_interrupt", self.record_interrupt)
+        cpu.add_hook("on_instruction", self.record)
+
+        return
+
+    def stop(self):
+
+        cpu = self.cpu
+
+        cpu.remove_hook("on_read", self.record_access)
+        cpu.remove_hook("on_write", self.record_access)
+        cpu.remove_hook("on_interrupt", self.record_interrupt)
+        cpu.remove_hook("on_instruction", self.record)
+
+        return
+
+    def record_access(self, cpu, address, value):
+        """
+        The `on_read` and `on_write` hook.
+        """
+
+        self.touched.append(address)
+
+        return
+
+    def record_interrupt(self, cpu, number):
+        """
+        The `on_interrupt` hook.
+        """
+
+        self.owed += self.taken_penalty
+
+        return
+
+    def record(self, cpu, address, code):
+        """
+        The `on_instruction` hook: charge the instruction that just ran.
+        """
+
+        if code == cpu.CODE_OF_BREAKPOINT and address in cpu.breakpoints:
+
+            # stopped before the instruction: it has not run yet
+            if cpu.step_over == address:
+                return
+
+            code = cpu.breakpoints[address]
+
+        access_line = self.cache.access_line
+        line_shift = self.cache.line_shift
+
+        width = self.width_of[code]
+        cycles = self.cycles_of[code] + self.owed
+
+        accesses = 0
+        hits = 0
+
+        for line in range(address >> line_shift, ((address + width - 1) >> line_shift) + 1):
+            accesses += 1
+            hits += access_line(line)
+
+        touched = self.touched
+
+        if touched:
+            for touched_address in touched:
+                accesses += 1
+                hits += access_line(touched_address >> line_shift)
+            touched.clear()
+
+        cycles += (accesses - hits) * self.miss_penalty
+
+        if cpu.program_pointer != address + width and not cpu.halted:
+            cycles += self.taken_penalty
+
+        self.owed = 0
+
+        self.counts[address] += 1
+        self.cycles[address] += cycles
+        self.accesses[address] += accesses
+        self.hits[address] += hits
+
+        return
+
+    #-----------------------------------------------------------
+
+    def totals(self, key=None):
+        """
+        Sum the instructions, cycles, accesses and hits by `key[address]`,
+        or by address.
+        """
+
+        totals = {}
+
+        for (address, count) in enumerate(self.counts):
+            if count:
+                group = address if key is None else key[address]
+                total = totals.setdefault(group, [0, 0, 0, 0])
+                total[0] += count
+                total[1] += self.cycles[address]
+                total[2] += self.accesses[address]
+                total[3] += self.hits[address]
+
+        return totals
+
+    def total_cycles(self):
+
+        instructions = sum(self.counts)
+
+        return sum(self.cycles) + (self.stages - 1 if instructions else 0)
+
+    def format_report(self, source_map=None, top=DEFAULT__TOP):
+
+        instructions = sum(self.counts)
+        cycles = self.total_cycles()
+        accesses = sum(self.accesses)
+        hits = sum(self.hits)
+
+        lines = [
+            f"pipeline: {cycles} cycles, {instructions} instructions,"
+            f" CPI {ratio(cycles, instructions):.2f}, L1 hit rate {100 * ratio(hits, accesses):.1f}%",
+            f"  ({self.stages} stages, taken branch {self.taken_penalty} cycles,"
+            f" L1 {self.cache.size} words {self.cache.ways}-way in {self.cache.line_size}-word lines,"
+            f" miss {self.miss_penalty} cycles)",
+        ]
+
+        if source_map is None:
+            tables = [("address", None, self.cpu.format_value)]
+        else:
+            tables = [
+                ("label", source_map.label, lambda index: source_map.labels[index - 1][0] if index else "(no label)"),
+                ("source line", source_map.line, lambda line: f"{source_map.source}:{line}" if line else "(no source)"),
+            ]
+
+        for (title, key, name) in tables:
+
+            totals = self.totals(key)
+
+            lines.append(f"  by {title}:")
+            lines.append(f"    {'cycles':>12}  {'share':>6}  {'instructions':>12}  {'CPI':>6}  {'L1 hits':>7}")
+
+            costliest = sorted(totals.items(), key=lambda item: -item[1][1])[:top]
+
+            for (group, (count, group_cycles, group_accesses, group_hits)) in costliest:
+                lines.append(
+                    f"    {group_cycles:>12}  {100 * ratio(group_cycles, cycles):5.1f}%  {count:>12}"
+                    f"  {ratio(group_cycles, count):6.2f}"
+                    f"  {100 * ratio(group_hits, group_accesses):6.1f}%  {name(group)}"
+                )
+
+        return "\n".join(lines)
+
+
+def ratio(numerator, denominator):
+
+    return numerator / denominator if denominator else 0.0
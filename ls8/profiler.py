@@ -0,0 +1,95 @@
+"""
+Count the instructions a program runs, by address.
+
+A `Profiler` is an `on_instruction` hook that bumps a counter per address.
+Its report sums the counters by source line and by label when there is a
+source map (see `sourcemap`), through the map's per-address arrays, and by
+address when there is not.
+"""
+
+############################################################
+
+DEFAULT__TOP = 10    # rows per table
+
+############################################################
+
+
+class Profiler:
+
+    def __init__(self, cpu):
+
+        self.cpu = cpu
+        self.counts = [0] * cpu.CONSTANTS.WORD_SIZE
+
+        return
+
+    def __str__(self):
+
+        return str({"cpu": self.cpu, "instructions": sum(self.counts)})
+
+    #-----------------------------------------------------------
+
+    def start(self):
+
+        self.cpu.add_hook("on_instruction", self.record)
+
+        return
+
+    def stop(self):
+
+        self.cpu.remove_hook("on_instruction", self.record)
+
+        return
+
+    def record(self, cpu, address, code):
+        """
+        The `on_instruction` hook.
+        """
+
+        # stopped before the instruction at a breakpoint: it has not run yet
+        if code == cpu.CODE_OF_BREAKPOINT and cpu.step_over == address:
+            return
+
+        self.counts[address] += 1
+
+        return
+
+    #-----------------------------------------------------------
+
+    def totals(self, key=None):
+        """
+        Sum the counts by `key[address]`, or by address.
+        """
+
+        totals = {}
+
+        for (address, count) in enumerate(self.counts):
+            if count:
+                group = address if key is None else key[address]
+                totals[group] = totals.get(group, 0) + count
+
+        return totals
+
+    def format_report(self, source_map=None, top=DEFAULT__TOP):
+
+        total = sum(self.counts)
+        lines = [f"profile: {total} instructions"]
+
+        if source_map is None:
+            tables = [("address", None, self.cpu.format_value)]
+        else:
+            tables = [
+                ("source line", source_map.line, lambda line: f"{source_map.source}:{line}" if line else "(no source)"),
+                ("label", source_map.label, lambda index: source_map.labels[index - 1][0] if index else "(no label)"),
+            ]
+
+        for (title, key, name) in tables:
+
+            totals = self.totals(key)
+
+            lines.append(f"  by {title}:")
+
+            for (group, count) in sorted(totals.items(), key=lambda item: -item[1])[:top]:
+                lines.append(f"    {count:>12}  {100 * count / total:5.1f}%  {name(group)}")
+
+        return "\n".join(lines)
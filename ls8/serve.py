@@ -0,0 +1,410 @@
+#!/usr/bin/env python3
+"""
+Serve LS-8 program runs over a Unix domain socket, from warm workers.
+
+`ls8 serve SOCKET` forks a pool of worker processes once, after the CPU
+classes and their dispatch tables are built. Each worker accepts
+connections on the shared socket, and runs every job on a CPU it keeps and
+`reset`s in place, so a job pays for none of Python's startup, imports or
+table construction.
+
+A connection carries any number of jobs: each request is one line of JSON,
+and gets one line of JSON back. A request holds the program as one of
+
+    "image": [word, ...]    words, loaded from address 0
+    "ls8": "..."    `.ls8` text
+    "hex": "..."    hexadecimal text
+    "ihex": "..."    Intel HEX records
+    "asm": "..."    assembly source, for `asm.py`
+
+and may set "wide" (run on the 16-bit CPU), "max_instructions" and
+"wall_timeout" (seconds), which the server caps at its own limits. A
+response holds "ok" and, for a run, "reason", "halted", "output",
+"instructions", "program_pointer", "register", "flags" and "elapsed", with
+"error" for what the CPU reported (like a division by zero) or null; for a
+job that could not run, "error".
+
+Usage: python -m ls8.ls8 serve SOCKET [--workers N] [--max-instructions N] [--wall-timeout SECONDS]
+"""
+
+############################################################
+
+import argparse
+import contextlib
+import io
+import json
+import multiprocessing
+import multiprocessing.connection
+import os
+import signal
+import socket
+import sys
+
+from .cpu import CPU, WideCPU
+from .loader import FORMAT__HEX, FORMAT__IHEX, FORMAT__LS8
+
+############################################################
+
+DEFAULT__WORKERS = os.cpu_count() or 1
+DEFAULT__MAX_INSTRUCTIONS = 100_000_000
+DEFAULT__WALL_TIMEOUT = 10.0    # seconds
+
+BACKLOG = 64
+
+PROGRAM_KEYS = ("image", "ls8", "hex", "ihex", "asm")
+
+TEXT_FORMATS = {"ls8": FORMAT__LS8, "hex": FORMAT__HEX, "ihex": FORMAT__IHEX}
+
+############################################################
+#   JOBS
+############################################################
+
+
+def assemble(source, width):
+    """
+    Assemble `source` with `asm.py`, in-process, to `.ls8` text. Its
+    errors (which exit) become a `ValueError` with what it printed.
+    """
+
+    from asm.asm import pass1, pass2
+
+    sym = {}
+    code = []
+    output = io.StringIO()
+    errors = io.StringIO()
+
+    try:
+        with contextlib.redirect_stderr(errors):
+            pass1(io.StringIO(source), sym, code, width)
+            pass2(output, sym, code, width)
+    except SystemExit:
+        raise ValueError(errors.getvalue().strip() or "the source does not assemble")
+
+    return output.getvalue()
+
+
+def load_program(cpu, job):
+    """
+    Load the program in `job` into `cpu`.
+    """
+
+    keys = [key for key in PROGRAM_KEYS if key in job]
+
+    if len(keys) != 1:
+        raise ValueError(f"a job holds exactly one of {PROGRAM_KEYS}")
+
+    if keys[0] == "image":
+        cpu.load_words([int(word) for word in job["image"]])
+
+    elif keys[0] == "asm":
+        text = assemble(job["asm"], cpu.CONSTANTS.BIT_COUNT)
+        cpu.load(io.BytesIO(text.encode()), FORMAT__LS8)
+
+    else:
+        cpu.load(io.BytesIO(job[keys[0]].encode()), TEXT_FORMATS[keys[0]])
+
+    return
+
+
+def capped(value, cap):
+
+    return cap if value is None else min(value, cap)
+
+
+class Worker:
+    """
+    Runs jobs on CPUs that it keeps and resets in place.
+    """
+
+    def __init__(self, max_instructions=DEFAULT__MAX_INSTRUCTIONS, wall_timeout=DEFAULT__WALL_TIMEOUT):
+
+        self.max_instructions = max_instructions
+        self.wall_timeout = wall_timeout
+
+        self.cpus = {}    # CPU class: CPU
+
+        return
+
+    def __str__(self):
+
+        return str(self.__dict__)
+
+    def cpu(self, cpu_class):
+
+        cpu = self.cpus.get(cpu_class)
+
+        if cpu is None:
+            cpu = self.cpus[cpu_class] = cpu_class()
+        else:
+            cpu.reset()
+
+        return cpu
+
+    def run(self, job):
+        """
+        Run the `job` (a request, decoded), and get its response.
+        """
+
+        try:
+
+            cpu = self.cpu(WideCPU if job.get("wide") else CPU)
+
+            load_program(cpu, job)
+
+            result = cpu.run(
+                max_instructions=capped(job.get("max_instructions"), self.max_instructions),
+                wall_timeout=capped(job.get("wall_timeout"), self.wall_timeout),
+                capture_output=True,
+            )
+
+        except Exception as exception:
+
+            return {"ok": False, "error": f"{type(exception).__name__}: {exception}"}
+
+        return {
+            "ok": True,
+            "reason": result.reason,
+            "error": result.errors.rstrip("\n") or None,
+            "halted": result.halted,
+            "output": result.output,
+            "instructions": result.instruction_count,
+            "program_pointer": result.program_pointer,
+            "register": result.register,
+            "flags": result.flags,
+            "elapsed": result.elapsed,
+        }
+
+    def serve_connection(self, connection):
+
+        with connection, connection.makefile("rwb") as stream:
+
+            for line in stream:
+
+                try:
+                    job = json.loads(line)
+                    if not isinstance(job, dict):
+                        raise ValueError("a job is a JSON object")
+                except ValueError as exception:
+                    response = {"ok": False, "error": f"bad request: {exception}"}
+                else:
+                    response = self.run(job)
+
+                stream.write(json.dumps(response).encode() + b"\n")
+                stream.flush()
+
+        return
+
+    def serve(self, listener):
+        """
+        Accept connections on `listener` until killed, one at a time.
+        """
+
+        # the server stops its workers; a Ctrl-C is for the server alone
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+
+        while True:
+
+            (connection, _) = listener.accept()
+
+            try:
+                self.serve_connection(connection)
+            except OSError:
+                # the client went away mid-job
+                pass
+
+
+############################################################
+#   SERVER
+############################################################
+
+
+class Server:
+
+    def __init__(
+        self,
+        path,
+        workers=DEFAULT__WORKERS,
+        max_instructions=DEFAULT__MAX_INSTRUCTIONS,
+        wall_timeout=DEFAULT__WALL_TIMEOUT,
+    ):
+
+        self.path = path
+        self.worker_count = workers
+        self.max_instructions = max_instructions
+        self.wall_timeout = wall_timeout
+
+        self.listener = None
+        self.workers = []
+
+        return
+
+    def __str__(self):
+
+        return str(self.__dict__)
+
+    def start(self):
+        """
+        Bind the socket and fork the workers.
+        """
+
+        # build the dispatch tables and import the assembler before forking,
+        # so workers start warm
+        CPU.dispatch_tables()
+        WideCPU.dispatch_tables()
+
+        import asm.asm    # noqa: F401
+
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+        self.listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.listener.bind(self.path)
+        self.listener.listen(BACKLOG)
+
+        self.workers = [self.start_worker() for _ in range(self.worker_count)]
+
+        return
+
+    def start_worker(self):
+
+        worker = Worker(self.max_instructions, self.wall_timeout)
+
+        process = multiprocessing.get_context("fork").Process(
+            target=worker.serve,
+            args=(self.listener, ),
+            daemon=True,
+        )
+        process.start()
+
+        return process
+
+    def supervise(self):
+        """
+        Replace workers that die, until interrupted.
+        """
+
+        while True:
+
+            sentinels = [process.sentinel for process in self.workers]
+            ready = multiprocessing.connection.wait(sentinels)
+
+            for (index, process) in enumerate(self.workers):
+                if process.sentinel in ready:
+                    process.join()
+                    self.workers[index] = self.start_worker()
+
+    def stop(self):
+
+        for process in self.workers:
+            process.terminate()
+
+        for process in self.workers:
+            process.join()
+
+        self.listener.close()
+
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+        return
+
+
+############################################################
+#   CLIENT
+############################################################
+
+
+class Client:
+    """
+    Send jobs to a server, over one connection.
+    """
+
+    def __init__(self, path):
+
+        self.connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.connection.connect(path)
+
+        self.stream = self.connection.makefile("rwb")
+
+        return
+
+    def __str__(self):
+
+        return str(self.__dict__)
+
+    def __enter__(self):
+
+        return self
+
+    def __exit__(self, *exc_info):
+
+        self.close()
+
+        return
+
+    def run(self, **job):
+        """
+        Run a job, e.g. `run(asm="...", max_instructions=1000)`, and get the
+        response.
+        """
+
+        self.stream.write(json.dumps(job).encode() + b"\n")
+        self.stream.flush()
+
+        line = self.stream.readline()
+
+        if not line:
+            raise ConnectionError("the server closed the connection")
+
+        return json.loads(line)
+
+    def close(self):
+
+        self.stream.close()
+        self.connection.close()
+
+        return
+
+
+############################################################
+#   MAIN
+############################################################
+
+
+def parse_commandline(argv):
+
+    parser = argparse.ArgumentParser(prog="ls8 serve", description="Serve LS-8 program runs over a Unix socket.")
+
+    parser.add_argument("socket", help="path of the Unix socket to listen on")
+    parser.add_argument("--workers", type=int, default=DEFAULT__WORKERS)
+    parser.add_argument("--max-instructions", type=int, default=DEFAULT__MAX_INSTRUCTIONS)
+    parser.add_argument("--wall-timeout", type=float, default=DEFAULT__WALL_TIMEOUT, metavar="SECONDS")
+
+    return parser.parse_args(argv[1:])
+
+
+def main(argv):
+
+    args = parse_commandline(argv)
+
+    server = Server(args.socket, args.workers, args.max_instructions, args.wall_timeout)
+    server.start()
+
+    print(f"serving on {args.socket} with {args.workers} workers", file=sys.stderr)
+
+    # stop cleanly on SIGTERM, as on Ctrl-C
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+
+    try:
+        server.supervise()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,282 @@
+"""
+Run LS-8 programs on several cores that share one memory.
+
+A `Machine` holds N cores, each with its own registers, program pointer and
+flags, and one memory in a `multiprocessing.shared_memory` block. `run`
+forks a host process per core, so cores run in parallel on the host's
+cores, each in its own interpreter.
+
+The guest sees two operations for this: `CID` loads the ID of its core
+(0 to N-1), and `TAS` is an atomic test-and-set for locks. Every core
+boots with the number of cores in R0, and its own stack: core `i`'s SP
+starts `i * stack_size` words below the usual stack start.
+
+Each core predecodes fused pairs on its own, so code must not change while
+other cores run it. Cores map no devices.
+"""
+
+############################################################
+
+import multiprocessing
+import os
+import sys
+
+from multiprocessing.shared_memory import SharedMemory
+
+from .cpu import CPU, WideCPU
+
+############################################################
+
+DEFAULT__CORES = os.cpu_count() or 1
+
+############################################################
+#   CORES
+############################################################
+
+
+class SharedMemoryCore:
+    """
+    Makes a CPU class run on memory shared with the other cores of a
+    `Machine`: a view of its `SharedMemory` buffer.
+    """
+
+    def __init__(self, buffer, lock, core_id=0, **kwargs):
+
+        super().__init__(**kwargs)
+
+        # the buffer is zeroed (or loaded) by the machine, not by `reset`
+        self.memory = memoryview(buffer).cast(self.MEMORY_TYPECODE)
+
+        self.lock = lock
+        self.core_id = core_id
+
+        return
+
+    def TEST_AND_SET(self):
+
+        # every core takes the same host lock, so no other `TAS` comes
+        # between the load and the store
+        with self.lock:
+            super().TEST_AND_SET()
+
+        return
+
+
+class Core(SharedMemoryCore, CPU):
+
+    MEMORY_TYPECODE = "B"
+
+
+class WideCore(SharedMemoryCore, WideCPU):
+
+    pass
+
+
+#-----------------------------------------------------------
+
+
+def run_core(core, connection, max_instructions, wall_timeout, capture_output):
+    """
+    Run `core`, in the process forked for it, and send back its result.
+    """
+
+    # print whole lines at a time, so the lines of cores printing at once
+    # do not mix (even with stdout unbuffered)
+    if core.output is None and not capture_output:
+        try:
+            core.output = open(sys.stdout.fileno(), "w", buffering=1, closefd=False)
+        except (AttributeError, OSError, ValueError):
+            pass
+
+    try:
+        result = core.run(max_instructions, wall_timeout=wall_timeout, capture_output=capture_output)
+    except Exception as exception:
+        result = exception
+    finally:
+        if core.output is not None:
+            core.output.flush()
+
+    connection.send(result)
+    connection.close()
+
+    return
+
+
+############################################################
+#   MACHINE
+############################################################
+
+
+class Machine:
+
+    def __init__(self, cores=DEFAULT__CORES, wide=False, stack_size=None, fuse=True, table_alu=False):
+
+        core_class = WideCore if wide else Core
+
+        self.constants = core_class.CONSTANTS
+        self.stack_size = self.constants.WORD_SIZE // 16 if stack_size is None else stack_size
+
+        if cores < 1:
+            raise ValueError(f"a machine has at least 1 core, not {cores}")
+
+        if (cores - 1) * self.stack_size >= self.constants.ADDRESS_OF_STACK_START:
+            raise ValueError(f"memory cannot hold {cores} stacks of {self.stack_size} words")
+
+        itemsize = 1 if core_class.MEMORY_TYPECODE == "B" else 2
+        self.shared = SharedMemory(create=True, size=self.constants.WORD_SIZE * itemsize)
+
+        self.context = multiprocessing.get_context("fork")
+        self.lock = self.context.Lock()
+
+        self.cores = [
+            core_class(self.shared.buf, self.lock, core_id, fuse=fuse, table_alu=table_alu)
+            for core_id in range(cores)
+        ]
+
+        self.memory = self.cores[0].memory
+
+        self.boot()
+
+        return
+
+    def __str__(self):
+
+        return str({"cores": len(self.cores), "shared": self.shared.name})
+
+    def __enter__(self):
+
+        return self
+
+    def __exit__(self, *exc_info):
+
+        self.close()
+
+        return
+
+    def boot(self):
+        """
+        Put every core in its power-on state, with the number of cores in
+        R0 and a stack of its own.
+        """
+
+        for core in self.cores:
+            core.register[0] = len(self.cores)
+            core.stack_pointer = self.constants.ADDRESS_OF_STACK_START - core.core_id * self.stack_size
+
+        return
+
+    def close(self):
+
+        for core in self.cores:
+            core.memory.release()
+
+        self.memory = None
+
+        self.shared.close()
+        self.shared.unlink()
+
+        return
+
+    #-----------------------------------------------------------
+
+    def load(self, program, format=None):
+        """
+        Load a program into the shared memory (see `CPU.load`), and
+        predecode it on every core.
+        """
+
+        (first, *others) = self.cores
+
+        first.load(program, format)
+
+        for core in others:
+            core.predecode()
+            core.program_pointer = first.program_pointer
+
+        return
+
+    def load_words(self, words, start=0):
+        """
+        Like `load`, for words (see `CPU.load_words`).
+        """
+
+        (first, *others) = self.cores
+
+        first.load_words(words, start)
+
+        for core in others:
+            core.predecode(start - core.FUSIONS.MAX_WIDTH + 1, start + len(words))
+
+        return
+
+    def run(self, max_instructions=None, wall_timeout=None, capture_output=False):
+        """
+        Run every core in a process of its own until all of them stop, each
+        as `CPU.run` would (with its limits per core). Gets the
+        `ProcessorRunResult` of each core. The cores here take on their
+        final states. Cores print to the stdout file itself, not to a
+        redirected `sys.stdout`; `capture_output` keeps each core's output
+        in its result.
+        """
+
+        # what is buffered now would be printed once by each process
+        sys.stdout.flush()
+        sys.stderr.flush()
+
+        runs = []
+
+        for core in self.cores:
+
+            (receiver, sender) = self.context.Pipe(duplex=False)
+
+            process = self.context.Process(
+                target=run_core,
+                args=(core, sender, max_instructions, wall_timeout, capture_output),
+                daemon=True,
+            )
+            process.start()
+
+            sender.close()
+
+            runs.append((core, process, receiver))
+
+        results = []
+        failure = None
+
+        for (core, process, receiver) in runs:
+
+            try:
+                result = receiver.recv()
+            except EOFError:
+                result = RuntimeError(f"core {core.core_id} died with exit code {process.exitcode}")
+
+            receiver.close()
+            process.join()
+
+            if isinstance(result, Exception):
+                failure = failure or result
+            else:
+                self.finish(core, result)
+                results.append(result)
+
+        if failure is not None:
+            raise failure
+
+        return results
+
+    def finish(self, core, result):
+        """
+        Give `core` the final state its process ran to.
+        """
+
+        core.register[:] = result.register
+        core.flags = result.flags
+        core.program_pointer = result.program_pointer
+
+        core.halted = result.halted
+        core.halt_reason = result.reason if result.halted else None
+
+        core.instruction_count += result.instruction_count
+        core.dispatch_count += result.dispatch_count
+
+        return
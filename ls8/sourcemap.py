@@ -0,0 +1,150 @@
+"""
+Map the addresses of an assembled program back to its source.
+
+`asm.py` writes a source map next to each `.ls8` image it writes: the
+source file, the first address of the words of each source line, and the
+symbol table. Loading a map precomputes, for every address, its source line
+and the label it falls under, so reports attribute addresses by indexing
+arrays rather than by searching or parsing anything.
+"""
+
+############################################################
+
+import os
+
+# `json` and `array` are imported where maps are read, written and built, so
+# that looking for a map next to every program run costs nothing when there
+# is none.
+
+############################################################
+
+VERSION = 1
+EXTENSION = ".map"
+
+############################################################
+
+
+def source_map_path(program_file):
+
+    return program_file + EXTENSION
+
+
+def format_source_map(source, width, size, lines, symbols):
+    """
+    Format a source map as compact JSON. `lines` holds `(address, line)`
+    for the first word of each source line that emits words; each runs up
+    to the next, or to `size`.
+    """
+
+    import json
+
+    return json.dumps(
+        {
+            "version": VERSION,
+            "source": source,
+            "width": width,
+            "size": size,
+            "lines": [list(pair) for pair in lines],
+            "symbols": symbols,
+        },
+        separators=(",", ":"),
+    )
+
+
+def load_source_map(path, word_size):
+
+    import json
+
+    with open(path) as file:
+        data = json.load(file)
+
+    if data.get("version") != VERSION:
+        raise ValueError(f"unsupported source map version: {data.get('version')!r}")
+
+    return SourceMap(data["source"], data["size"], data["lines"], data["symbols"], word_size)
+
+
+def find_source_map(program_file, word_size):
+    """
+    Load the source map next to `program_file`, or get `None` if there is
+    none.
+    """
+
+    path = source_map_path(program_file)
+
+    if not os.path.exists(path):
+        return None
+
+    return load_source_map(path, word_size)
+
+
+############################################################
+
+
+class SourceMap:
+
+    def __init__(self, source, size, lines, symbols, word_size):
+
+        import array
+
+        self.source = source
+        self.symbols = dict(symbols)    # name: address
+
+        # for each address: its source line (0 for none), the label it is
+        # under (an index into `labels`, plus one; 0 for none), and the name
+        # of the label right at it
+        self.line = array.array("I", bytes(4 * word_size))
+        self.label = array.array("I", bytes(4 * word_size))
+        self.name = [None] * word_size
+
+        ends = [address for (address, _) in lines[1:]] + [size]
+
+        for ((start, line), end) in zip(lines, ends):
+            self.line[start:end] = array.array("I", [line]) * (end - start)
+
+        # the last of several labels at an address names it
+        self.labels = sorted(self.symbols.items(), key=lambda item: item[1])
+
+        for (index, (name, start)) in enumerate(self.labels):
+
+            self.name[start] = name
+
+            end = self.labels[index + 1][1] if index + 1 < len(self.labels) else size
+            if end > start:
+                self.label[start:end] = array.array("I", [index + 1]) * (end - start)
+
+        return
+
+    def __str__(self):
+
+        return str({"source": self.source, "symbols": self.symbols})
+
+    def where(self, address):
+        """
+        Describe `address` as `source:line` (if it came from a line).
+        """
+
+        line = self.line[address]
+
+        return f"{self.source}:{line}" if line else None
+
+    def within(self, address):
+        """
+        Describe `address` as `LABEL` or `LABEL+offset` (if it is under one).
+        """
+
+        index = self.label[address]
+
+        if not index:
+            return None
+
+        (name, start) = self.labels[index - 1]
+
+        return name if address == start else f"{name}+{address - start}"
+
+    def describe(self, address):
+        """
+        Describe `address` as `source:line, LABEL+offset`, with what is known.
+        """
+
+        return ", ".join(part for part in (self.where(address), self.within(address)) if part)
@@ -0,0 +1,164 @@
+"""
+Record and read instruction traces.
+
+A trace is a short header, then one fixed-size record per instruction run:
+`(address, code, operand_a, operand_b)`, as little-endian words of the
+CPU's width, with unused operands zero. Records are buffered and written in
+chunks, and read back the same way, so neither side ever holds more than a
+chunk of a trace, however long the run.
+"""
+
+############################################################
+
+import array
+import sys
+
+############################################################
+
+MAGIC = b"LS8T"
+VERSION = 1
+
+HEADER_SIZE = len(MAGIC) + 2    # magic, version, bit count
+RECORD_WIDTH = 4    # words
+
+DEFAULT__CHUNK = 1 << 14    # records
+
+############################################################
+
+
+def typecode(bit_count):
+
+    return "B" if bit_count <= 8 else "H"
+
+
+def format_header(bit_count):
+
+    return MAGIC + bytes((VERSION, bit_count))
+
+
+def parse_header(header):
+    """
+    Get the bit count from a trace `header`, or `None` if it is not one.
+    """
+
+    if len(header) != HEADER_SIZE or not header.startswith(MAGIC):
+        return None
+
+    (version, bit_count) = header[len(MAGIC):]
+
+    if version != VERSION:
+        raise ValueError(f"unsupported trace version: {version}")
+
+    return bit_count
+
+
+def read_trace(file, bit_count, chunk=DEFAULT__CHUNK):
+    """
+    Yield arrays of flat records from the binary `file`, positioned just
+    after the header. Each array holds a whole number of records.
+    """
+
+    words = array.array(typecode(bit_count))
+    size = words.itemsize * RECORD_WIDTH * chunk
+
+    while True:
+
+        data = file.read(size)
+        if not data:
+            break
+
+        # a truncated trace (from a killed run) ends at its last whole record
+        data = data[:len(data) - len(data) % (words.itemsize * RECORD_WIDTH)]
+
+        words = array.array(words.typecode, data)
+        if sys.byteorder == "big":
+            words.byteswap()
+
+        yield words
+
+    return
+
+
+############################################################
+
+
+class TraceRecorder:
+
+    def __init__(self, cpu, path, chunk=DEFAULT__CHUNK):
+
+        self.cpu = cpu
+        self.path = path
+        self.limit = chunk * RECORD_WIDTH
+
+        self.file = None
+        self.buffer = None
+
+        return
+
+    def __str__(self):
+
+        return str(self.__dict__)
+
+    #-----------------------------------------------------------
+
+    def start(self):
+
+        bit_count = self.cpu.CONSTANTS.BIT_COUNT
+
+        self.file = open(self.path, "wb")
+        self.file.write(format_header(bit_count))
+
+        self.buffer = array.array(typecode(bit_count))
+
+        self.cpu.add_hook("on_instruction", self.record)
+
+        return
+
+    def stop(self):
+
+        self.cpu.remove_hook("on_instruction", self.record)
+
+        self.flush()
+        self.file.close()
+
+        return
+
+    def flush(self):
+
+        buffer = self.buffer
+
+        if sys.byteorder == "big":
+            buffer.byteswap()
+
+        buffer.tofile(self.file)
+        del buffer[:]
+
+        return
+
+    def record(self, cpu, address, code):
+        """
+        The `on_instruction` hook.
+        """
+
+        if code == cpu.CODE_OF_BREAKPOINT and address in cpu.breakpoints:
+
+            # stopped before the instruction: it has not run yet
+            if cpu.step_over == address:
+                return
+
+            code = cpu.breakpoints[address]
+
+        args = cpu.OPERATIONS.ARGS[code] if code < cpu.CONSTANTS.OPERATION_CODE_COUNT else 0
+        memory = cpu.memory
+
+        self.buffer.extend((
+            address,
+            code,
+            memory[address + 1] if args > 0 else 0,
+            memory[address + 2] if args > 1 else 0,
+        ))
+
+        if len(self.buffer) >= self.limit:
+            self.flush()
+
+        return